@@ -1,42 +1,62 @@
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, Optional, Sequence
 from config import *
+from jalali import jalali_period
 from utils import convert_to_jalali, format_duration
 
+ROLLUP_COLUMNS = ['user_id', 'priority', 'status', 'day', 'task_count', 'duration_sum', 'duration_count',
+                  'delay_sum', 'delay_count', 'on_time_count', 'efficiency_sum', 'efficiency_count']
+
+def _ratio(numerator, denominator):
+    """میانگین از روی مجموع و تعداد؛ برای تعداد صفر مانند mean در pandas مقدار NaN"""
+    if isinstance(numerator, pd.Series):
+        return numerator / denominator.where(denominator != 0)
+    return numerator / denominator if denominator else np.nan
+
 class TaskAnalytics:
-    def __init__(self, tasks_data: List[Dict[str, Any]]):
-        self.df = pd.DataFrame(tasks_data)
+    """آمار وظایف از روی جدول تجمیعی task_rollups؛ هزینه هر گزارش به تعداد گروه‌ها بستگی دارد نه تعداد وظایف"""
+    
+    def __init__(self, rollups: Iterable[Sequence[Any]]):
+        self.df = pd.DataFrame(list(rollups), columns=ROLLUP_COLUMNS)
         self._prepare_data()
     
+    @classmethod
+    def from_database(cls, db, since: Optional[date] = None) -> 'TaskAnalytics':
+        """ساخت تحلیل از روی Database.get_task_rollups"""
+        return cls(db.get_task_rollups(since))
+    
     def _prepare_data(self) -> None:
         """آماده‌سازی داده‌ها برای تحلیل"""
-        # تبدیل تاریخ‌ها
-        self.df['created_at'] = pd.to_datetime(self.df['created_at'])
-        self.df['completed_at'] = pd.to_datetime(self.df['completed_at'])
-        
-        # محاسبه مدت زمان انجام
-        self.df['duration'] = (self.df['completed_at'] - self.df['created_at']).dt.total_seconds() / 3600
-        
-        # محاسبه تاخیر
-        self.df['delay'] = (self.df['completed_at'] - self.df['created_at']).dt.total_seconds() / 3600 - self.df['estimated_duration']
+        self.df['day'] = pd.to_datetime(self.df['day'])
+    
+    def _summarize(self, grouped) -> pd.DataFrame:
+        """تعداد و میانگین مدت انجام و تاخیر برای هر گروه"""
+        sums = grouped[['task_count', 'duration_sum', 'duration_count', 'delay_sum', 'delay_count']].sum()
+        return pd.DataFrame({
+            'total_tasks': sums['task_count'],
+            'avg_duration': _ratio(sums['duration_sum'], sums['duration_count']),
+            'avg_delay': _ratio(sums['delay_sum'], sums['delay_count'])
+        })
     
     def get_basic_stats(self) -> Dict[str, Any]:
         """محاسبه آمار پایه"""
+        total = int(self.df['task_count'].sum())
+        completed = int(self.df.loc[self.df['status'] == 'completed', 'task_count'].sum())
         return {
-            'total_tasks': len(self.df),
-            'completed_tasks': len(self.df[self.df['status'] == 'completed']),
-            'pending_tasks': len(self.df[self.df['status'] == 'pending']),
-            'completion_rate': len(self.df[self.df['status'] == 'completed']) / len(self.df) if len(self.df) > 0 else 0,
-            'avg_duration': self.df['duration'].mean(),
-            'avg_delay': self.df['delay'].mean()
+            'total_tasks': total,
+            'completed_tasks': completed,
+            'pending_tasks': int(self.df.loc[self.df['status'] == 'pending', 'task_count'].sum()),
+            'completion_rate': completed / total if total > 0 else 0,
+            'avg_duration': _ratio(self.df['duration_sum'].sum(), self.df['duration_count'].sum()),
+            'avg_delay': _ratio(self.df['delay_sum'].sum(), self.df['delay_count'].sum())
         }
     
     def get_priority_stats(self) -> Dict[str, Any]:
         """آمار مربوط به اولویت‌ها"""
-        priority_counts = self.df['priority'].value_counts()
-        priority_completion = self.df[self.df['status'] == 'completed']['priority'].value_counts()
+        priority_counts = self.df.groupby('priority')['task_count'].sum()
+        priority_completion = self.df[self.df['status'] == 'completed'].groupby('priority')['task_count'].sum()
         
         return {
             'distribution': priority_counts.to_dict(),
@@ -46,51 +66,36 @@ class TaskAnalytics:
     
     def get_user_stats(self) -> Dict[str, Any]:
         """آمار مربوط به کاربران"""
-        user_stats = self.df.groupby('assignee').agg({
-            'id': 'count',
-            'duration': 'mean',
-            'delay': 'mean'
-        }).rename(columns={
-            'id': 'total_tasks',
-            'duration': 'avg_duration',
-            'delay': 'avg_delay'
-        })
-        
-        return user_stats.to_dict('index')
+        return self._summarize(self.df.groupby('user_id')).to_dict('index')
     
     def get_trend_analysis(self, days: int = 30) -> Dict[str, Any]:
-        """تحلیل روند در بازه زمانی مشخص"""
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=days)
-        
-        mask = (self.df['created_at'] >= start_date) & (self.df['created_at'] <= end_date)
-        period_df = self.df[mask]
-        
-        daily_stats = period_df.groupby(period_df['created_at'].dt.date).agg({
-            'id': 'count',
-            'duration': 'mean',
-            'delay': 'mean'
-        }).rename(columns={
-            'id': 'tasks_count',
-            'duration': 'avg_duration',
-            'delay': 'avg_delay'
-        })
+        """تحلیل روند روزانه وظایف ایجاد شده در days روز اخیر"""
+        start_date = pd.Timestamp(datetime.now().date() - timedelta(days=days))
+        period_df = self.df[self.df['day'] >= start_date]
         
-        return daily_stats.to_dict('index')
+        daily_stats = self._summarize(period_df.groupby(jalali_period(period_df['day'])))
+        return daily_stats.rename(columns={'total_tasks': 'tasks_count'}).to_dict('index')
+    
+    def get_monthly_stats(self) -> Dict[str, Any]:
+        """آمار وظایف به تفکیک ماه شمسی"""
+        monthly_stats = self._summarize(self.df.groupby(jalali_period(self.df['day'], freq='month')))
+        return monthly_stats.rename(columns={'total_tasks': 'tasks_count'}).to_dict('index')
     
     def get_performance_metrics(self) -> Dict[str, Any]:
         """محاسبه شاخص‌های عملکرد"""
+        total = self.df['task_count'].sum()
+        
         # محاسبه نرخ تکمیل به موقع
-        on_time_completion = len(self.df[self.df['delay'] <= 0])
-        on_time_rate = on_time_completion / len(self.df) if len(self.df) > 0 else 0
+        on_time_rate = self.df['on_time_count'].sum() / total if total > 0 else 0
         
         # محاسبه میانگین زمان تاخیر
-        avg_delay = self.df['delay'].mean()
+        avg_delay = _ratio(self.df['delay_sum'].sum(), self.df['delay_count'].sum())
         
         # محاسبه نرخ تکمیل وظایف با اولویت بالا
-        high_priority_tasks = self.df[self.df['priority'] == 'high']
-        high_priority_completion = len(high_priority_tasks[high_priority_tasks['status'] == 'completed'])
-        high_priority_rate = high_priority_completion / len(high_priority_tasks) if len(high_priority_tasks) > 0 else 0
+        high_priority = self.df[self.df['priority'] == 'high']
+        high_priority_total = high_priority['task_count'].sum()
+        high_priority_completion = high_priority.loc[high_priority['status'] == 'completed', 'task_count'].sum()
+        high_priority_rate = high_priority_completion / high_priority_total if high_priority_total > 0 else 0
         
         return {
             'on_time_completion_rate': on_time_rate,
@@ -99,15 +104,11 @@ class TaskAnalytics:
         }
     
     def get_efficiency_analysis(self) -> Dict[str, Any]:
-        """تحلیل کارایی"""
-        # محاسبه نسبت زمان واقعی به زمان تخمینی
-        self.df['efficiency_ratio'] = self.df['estimated_duration'] / self.df['duration']
-        
-        # محاسبه میانگین کارایی
-        avg_efficiency = self.df['efficiency_ratio'].mean()
+        """تحلیل کارایی (نسبت زمان تخمینی به زمان واقعی)"""
+        avg_efficiency = _ratio(self.df['efficiency_sum'].sum(), self.df['efficiency_count'].sum())
         
-        # محاسبه کارایی به تفکیک اولویت
-        efficiency_by_priority = self.df.groupby('priority')['efficiency_ratio'].mean()
+        sums = self.df.groupby('priority')[['efficiency_sum', 'efficiency_count']].sum()
+        efficiency_by_priority = _ratio(sums['efficiency_sum'], sums['efficiency_count'])
         
         return {
             'average_efficiency': avg_efficiency,
@@ -0,0 +1,206 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+from sqlalchemy import Column, DateTime, MetaData, Table, bindparam, event, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import CreateTable
+from config import *
+from migrations import Migration, rebuild_sqlite_table
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SCHEMA = 'archive'
+
+class ArchivePolicy(NamedTuple):
+    """قاعده انتقال سطرهای قدیمی یک جدول به دیتابیس بایگانی
+    
+    condition یک شرط SQL روی ستون‌های جدول با پارامتر :cutoff است و children
+    جفت‌های (جدول، ستون کلید خارجی) سطرهای وابسته‌ای است که همراه سطر اصلی منتقل می‌شوند.
+    """
+    table: Table
+    condition: str
+    retention_days: int
+    children: Tuple[Tuple[Table, str], ...] = ()
+
+def _archive_table(table: Table, metadata: MetaData) -> Table:
+    """کپی ساختار جدول در اسکیمای بایگانی بدون کلید خارجی"""
+    columns = [Column(c.name, c.type, primary_key=c.primary_key) for c in table.columns]
+    return Table(table.name, metadata, *columns, schema=ARCHIVE_SCHEMA)
+
+def _union_table(table: Table, metadata: MetaData) -> Table:
+    """جدول مجازی متناظر با نمای all_<name> برای ساخت کوئری روی داده داغ و بایگانی"""
+    return Table(f'all_{table.name}', metadata, *[Column(c.name, c.type) for c in table.columns])
+
+class Archiver:
+    """انتقال دسته‌ای سطرهای قدیمی از دیتابیس اصلی به یک فایل SQLite پیوست شده
+    
+    دیتابیس بایگانی روی هر اتصال با ATTACH در دسترس است و برای هر جدول بایگانی شده
+    یک نمای موقت all_<name> ساخته می‌شود که داده داغ و بایگانی را برای گزارش‌ها یکجا نشان می‌دهد.
+    """
+    
+    def __init__(self, engine: Engine, policies: Iterable[ArchivePolicy],
+                 path: str = ARCHIVE_DB_PATH, batch_size: int = ARCHIVE_BATCH_SIZE):
+        self.engine = engine
+        self.policies: List[ArchivePolicy] = list(policies)
+        self.path = path
+        self.batch_size = batch_size
+        self.moved: Dict[str, int] = {}
+        self.runs = 0
+        self.last_run = None
+        
+        tables = []
+        for policy in self.policies:
+            tables.extend(child for child, _ in policy.children)
+            tables.append(policy.table)
+        self.tables: List[Table] = list(dict.fromkeys(tables))
+        for table in self.tables:
+            if not table.dialect_options['sqlite']['autoincrement']:
+                raise ValueError(f"جدول {table.name} برای بایگانی باید sqlite_autoincrement داشته باشد")
+        
+        self._metadata = MetaData()
+        self.views: Dict[str, Table] = {}
+        for table in self.tables:
+            _archive_table(table, self._metadata)
+            self.views[table.name] = _union_table(table, MetaData())
+        
+        event.listen(engine, 'connect', self._attach)
+    
+    def view(self, table: Table) -> Table:
+        """جدول نمای all_<name> برای استفاده در select"""
+        return self.views[table.name]
+    
+    def _ddl(self, dialect) -> List[str]:
+        statements = []
+        for table in self._metadata.sorted_tables:
+            statements.append(str(CreateTable(table, if_not_exists=True).compile(dialect=dialect)))
+            # گزارش‌های بازه‌ای روی بایگانی بر اساس created_at فیلتر می‌شوند
+            if 'created_at' in table.c:
+                statements.append(
+                    f'CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.ix_archive_{table.name}_created '
+                    f'ON {table.name} (created_at)'
+                )
+        return statements
+    
+    def _attach(self, dbapi_connection, connection_record):
+        """پیوست دیتابیس بایگانی، ساخت جداول نبوده و نماهای موقت روی هر اتصال جدید"""
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(f'ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}', (self.path,))
+            cursor.execute(f'PRAGMA {ARCHIVE_SCHEMA}.journal_mode=WAL')
+            for statement in self._ddl(self.engine.dialect):
+                cursor.execute(statement)
+            
+            for table in self.tables:
+                existing = {row[1] for row in cursor.execute(f'PRAGMA {ARCHIVE_SCHEMA}.table_info({table.name})')}
+                for column in table.columns:
+                    if column.name not in existing:
+                        column_type = column.type.compile(dialect=self.engine.dialect)
+                        cursor.execute(f'ALTER TABLE {ARCHIVE_SCHEMA}.{table.name} ADD COLUMN {column.name} {column_type}')
+                
+                # سطری که در هر دو فایل باشد (انتقال نیمه‌کاره) فقط از دیتابیس اصلی خوانده می‌شود
+                names = ', '.join(column.name for column in table.columns)
+                key = table.primary_key.columns.values()[0].name
+                cursor.execute(
+                    f'CREATE TEMP VIEW IF NOT EXISTS all_{table.name} AS '
+                    f'SELECT {names} FROM main.{table.name} UNION ALL '
+                    f'SELECT {names} FROM {ARCHIVE_SCHEMA}.{table.name} AS a '
+                    f'WHERE NOT EXISTS (SELECT 1 FROM main.{table.name} AS m WHERE m.{key} = a.{key})'
+                )
+        finally:
+            cursor.close()
+    
+    def autoincrement_migration(self, name: str) -> Migration:
+        """مهاجرت افزودن AUTOINCREMENT به جداول موجود و رساندن شمارنده شناسه به بیشینه بایگانی
+        
+        SQLite بدون AUTOINCREMENT شناسه سطر جدید را MAX(rowid) + 1 می‌گذارد؛ وقتی بزرگ‌ترین
+        سطرها به بایگانی منتقل شوند همان شناسه دوباره داده می‌شود و در نماهای all_* و انتقال
+        بعدی تداخل می‌کند. با AUTOINCREMENT بیشینه در sqlite_sequence می‌ماند، پس همه جداول
+        قاعده‌ها باید sqlite_autoincrement داشته باشند و این مهاجرت جداول قدیمی را بازسازی می‌کند.
+        """
+        def upgrade(connection: Connection) -> None:
+            for table in self.tables:
+                created = connection.exec_driver_sql(
+                    "SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?", (table.name,)
+                ).scalar()
+                if created is None:
+                    continue
+                if 'AUTOINCREMENT' not in created.upper():
+                    rebuild_sqlite_table(connection, table)
+                
+                key = table.primary_key.columns.values()[0].name
+                floor = connection.exec_driver_sql(
+                    f'SELECT MAX(id) FROM (SELECT MAX({key}) AS id FROM main.{table.name} '
+                    f'UNION ALL SELECT MAX({key}) FROM {ARCHIVE_SCHEMA}.{table.name})'
+                ).scalar()
+                if floor is None:
+                    continue
+                current = connection.exec_driver_sql(
+                    'SELECT seq FROM main.sqlite_sequence WHERE name = ?', (table.name,)
+                ).scalar()
+                if current is None:
+                    connection.exec_driver_sql(
+                        'INSERT INTO main.sqlite_sequence (name, seq) VALUES (?, ?)', (table.name, floor)
+                    )
+                elif current < floor:
+                    connection.exec_driver_sql(
+                        'UPDATE main.sqlite_sequence SET seq = ? WHERE name = ?', (floor, table.name)
+                    )
+        return Migration(name, upgrade)
+    
+    def _move(self, connection: Connection, table: Table, column: str, ids: list) -> int:
+        """کپی سطرها به بایگانی و حذف از دیتابیس اصلی در همان تراکنش
+        
+        شناسه تکراری در بایگانی خطای IntegrityError می‌دهد و کل دسته برگردانده می‌شود.
+        """
+        names = ', '.join(c.name for c in table.columns)
+        params = {'ids': ids}
+        copied = connection.execute(text(
+            f'INSERT INTO {ARCHIVE_SCHEMA}.{table.name} ({names}) '
+            f'SELECT {names} FROM main.{table.name} WHERE {column} IN :ids'
+        ).bindparams(bindparam('ids', expanding=True)), params).rowcount
+        deleted = connection.execute(text(
+            f'DELETE FROM main.{table.name} WHERE {column} IN :ids'
+        ).bindparams(bindparam('ids', expanding=True)), params).rowcount
+        if deleted != copied:
+            raise RuntimeError(f"بایگانی {table.name}: {copied} سطر کپی و {deleted} سطر حذف شد")
+        return deleted
+    
+    def archive_policy(self, policy: ArchivePolicy, now: datetime = None) -> int:
+        """انتقال همه سطرهای مشمول یک قاعده در تراکنش‌های batch_size تایی"""
+        cutoff = (now or datetime.now()) - timedelta(days=policy.retention_days)
+        table = policy.table
+        key = table.primary_key.columns.values()[0].name
+        select_batch = text(
+            f'SELECT {key} FROM main.{table.name} WHERE {policy.condition} ORDER BY {key} LIMIT :limit'
+        ).bindparams(bindparam('cutoff', type_=DateTime))
+        
+        total = 0
+        while True:
+            # هر دسته تراکنش کوتاه خودش را دارد تا نویسنده‌های ربات مدت زیادی منتظر نمانند
+            with self.engine.begin() as connection:
+                ids = list(connection.execute(select_batch, {'cutoff': cutoff, 'limit': self.batch_size}).scalars())
+                if not ids:
+                    break
+                for child, column in policy.children:
+                    self.moved[child.name] = self.moved.get(child.name, 0) + self._move(connection, child, column, ids)
+                total += self._move(connection, table, key, ids)
+            if len(ids) < self.batch_size:
+                break
+        
+        self.moved[table.name] = self.moved.get(table.name, 0) + total
+        return total
+    
+    def run(self, now: datetime = None) -> Dict[str, int]:
+        """اجرای همه قاعده‌ها؛ پس از حذف‌های زیاد آمار برنامه‌ریز کوئری به‌روز می‌شود"""
+        result = {policy.table.name: self.archive_policy(policy, now) for policy in self.policies}
+        if any(result.values()):
+            with self.engine.connect() as connection:
+                connection.exec_driver_sql('PRAGMA optimize')
+            logger.info("بایگانی: %s", result)
+        self.runs += 1
+        self.last_run = datetime.now()
+        return result
+    
+    def get_stats(self) -> Dict[str, object]:
+        """تعداد سطرهای منتقل شده به تفکیک جدول از زمان راه‌اندازی"""
+        return {'runs': self.runs, 'last_run': self.last_run, 'moved': dict(self.moved)}
@@ -0,0 +1,89 @@
+"""مقایسه توان عملیاتی Database و AsyncDatabase زیر بار همزمان
+
+هر کارگر به تعداد مشخص یک درخواست نمونه (خواندن کاربر، ثبت اعلان و خواندن
+شمارنده اعلان‌ها) اجرا می‌کند. علاوه بر توان عملیاتی، بیشترین تاخیر حلقه
+رویداد هم گزارش می‌شود که نشان می‌دهد هندلرهای دیگر چقدر منتظر مانده‌اند.
+
+اجرا:
+    python benchmarks/bench_async_db.py [--workers 50] [--requests 20]
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import sys
+import tempfile
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+
+async def measure_lag(stop: asyncio.Event, interval: float = 0.005) -> float:
+    """بیشترین تاخیر بیدار شدن یک تایمر دوره‌ای در حلقه رویداد"""
+    worst = 0.0
+    while not stop.is_set():
+        start = perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, perf_counter() - start - interval)
+    return worst
+
+async def run(label: str, request, workers: int, requests: int):
+    stop = asyncio.Event()
+    lag = asyncio.create_task(measure_lag(stop))
+    start = perf_counter()
+    await asyncio.gather(*[
+        request(worker, number) for worker in range(workers) for number in range(requests)
+    ])
+    elapsed = perf_counter() - start
+    stop.set()
+    worst_lag = await lag
+    total = workers * requests
+    print(f"{label:<16} {total / elapsed:>8,.0f} درخواست/ثانیه   "
+          f"بیشترین تاخیر حلقه {worst_lag * 1000:7.1f}ms")
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=20)
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as directory:
+        config.DATABASE_URL = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+        import database
+        database.DATABASE_URL = config.DATABASE_URL
+        
+        sync_db = database.Database()
+        for worker in range(args.workers):
+            sync_db.add_user(f'u{worker}', f'user{worker}', 'employee')
+        async_db = await database.AsyncDatabase().initialize()
+        ids = itertools.count()
+        
+        def sync_request(worker: int, number: int):
+            user_id = f'u{worker}'
+            sync_db.get_user(user_id)
+            sync_db.add_notification(f'n{next(ids)}', user_id, 'یادآوری', 'متن', 'reminder')
+            return sync_db.get_unread_count(user_id)
+        
+        async def blocking(worker: int, number: int):
+            return sync_request(worker, number)
+        
+        async def threaded(worker: int, number: int):
+            return await asyncio.to_thread(sync_request, worker, number)
+        
+        async def native(worker: int, number: int):
+            user_id = f'u{worker}'
+            await async_db.get_user(user_id)
+            await async_db.add_notification(f'n{next(ids)}', user_id, 'یادآوری', 'متن', 'reminder')
+            return await async_db.get_unread_count(user_id)
+        
+        print(f"{args.workers} کارگر × {args.requests} درخواست:")
+        await run('sync (blocking)', blocking, args.workers, args.requests)
+        await run('sync (threads)', threaded, args.workers, args.requests)
+        await run('async', native, args.workers, args.requests)
+        
+        await async_db.close()
+        sync_db.engine.dispose()
+
+if __name__ == '__main__':
+    asyncio.run(main())
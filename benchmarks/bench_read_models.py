@@ -0,0 +1,64 @@
+"""مقایسه سرعت و حافظه خواندن لیست‌ها با ORM و با مدل‌های فقط‌خواندنی Database
+
+اجرا:
+    python benchmarks/bench_read_models.py [--rows 20000] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import tracemalloc
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+
+def measure(label: str, func, rows: int, repeat: int):
+    func()  # گرم کردن کش صفحات SQLite
+    start = perf_counter()
+    for _ in range(repeat):
+        func()
+    elapsed = (perf_counter() - start) / repeat
+    
+    tracemalloc.start()
+    result = func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(result) == rows
+    print(f"{label:<12} {rows / elapsed:>12,.0f} سطر/ثانیه   حافظه بیشینه {peak / 1024 / 1024:6.1f}MB")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as directory:
+        config.DATABASE_URL = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+        import database
+        database.DATABASE_URL = config.DATABASE_URL
+        
+        db = database.Database()
+        db.add_user('u1', 'bench', 'employee')
+        db.add_task('t1', 'bench', '', 'u1')
+        db.add_notifications_bulk({
+            'id': f'n{i}', 'user_id': 'u1', 'title': 'اعلان', 'message': 'متن اعلان ' * 5,
+            'type': 'task', 'action_data': {'task_id': 't1'}
+        } for i in range(args.rows))
+        
+        def orm_path():
+            session = db.get_session()
+            try:
+                return session.query(database.Notification)\
+                    .filter(database.Notification.user_id == 'u1').all()
+            finally:
+                session.close()
+        
+        print(f"اعلان‌های یک کاربر ({args.rows} سطر):")
+        measure('ORM', orm_path, args.rows, args.repeat)
+        measure('NamedTuple', lambda: db.get_user_notifications('u1'), args.rows, args.repeat)
+        db.engine.dispose()
+
+if __name__ == '__main__':
+    main()
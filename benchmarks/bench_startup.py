@@ -0,0 +1,53 @@
+"""بنچمارک زمان راه‌اندازی سرد و مصرف حافظه هنگام import ماژول bot
+
+اجرا:
+    python benchmarks/bench_startup.py [--runs 10]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# هر اجرا در یک فرآیند تازه انجام می‌شود تا کش ماژول‌های پایتون اثری نداشته باشد
+PROBE = '''
+import json, resource, sys, time
+start = time.perf_counter()
+import bot
+elapsed = time.perf_counter() - start
+heavy = sorted(m for m in ('pandas', 'numpy', 'sklearn', 'plotly') if m in sys.modules)
+print(json.dumps({
+    'import_s': elapsed,
+    'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'heavy_modules': heavy
+}))
+'''
+
+def run_probe() -> dict:
+    env = dict(os.environ, ADMIN_TELEGRAM_ID=os.getenv('ADMIN_TELEGRAM_ID', '0'))
+    result = subprocess.run(
+        [sys.executable, '-c', PROBE],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+    
+    samples = [run_probe() for _ in range(args.runs)]
+    times = [s['import_s'] * 1000 for s in samples]
+    rss = [s['rss_mb'] for s in samples]
+    
+    print(f"اجراها: {args.runs}")
+    print(f"زمان import bot: میانه {statistics.median(times):.0f}ms، "
+          f"کمینه {min(times):.0f}ms، بیشینه {max(times):.0f}ms")
+    print(f"حافظه (RSS بیشینه): میانه {statistics.median(rss):.1f}MB")
+    print(f"کتابخانه‌های سنگین بارگذاری شده: {', '.join(samples[0]['heavy_modules']) or 'هیچ'}")
+
+if __name__ == '__main__':
+    main()
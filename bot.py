@@ -1,22 +1,45 @@
 import os
 import logging
-from datetime import datetime
-from typing import Optional, List, Dict
+import asyncio
+import hashlib
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, time
+from textwrap import shorten
+from functools import partial
+from typing import Optional, List, Dict, NamedTuple, Tuple, TYPE_CHECKING
 from dotenv import load_dotenv
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ParseMode
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, CallbackQuery
+from telegram.constants import MessageLimit, ParseMode
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters, ContextTypes
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, ForeignKey, Enum, Text, Float, JSON
+from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, ForeignKey, Enum, Text, Float, JSON, Index, func, or_, select, tuple_
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import sessionmaker, relationship, contains_eager
 import enum
 from jdatetime import datetime as jdatetime
 from jdatetime import date as jdate
-import pandas as pd
-import numpy as np
-from sklearn.ensemble import RandomForestRegressor
-import plotly.graph_objects as go
-import io
-import json
+from config import MAX_CONCURRENT_REQUESTS, USER_CACHE_SIZE, TASKS_PAGE_SIZE, TASK_TITLE_PREVIEW, TASK_DESCRIPTION_PREVIEW, CALENDAR_MAX_TASKS, SEARCH_PAGE_SIZE
+from config import CHART_WORKERS, REPORT_CACHE_SIZE, REPORT_UPDATE_INTERVAL, REPORT_FORMATS, DEFAULT_REPORT_FORMAT, EXPORT_BATCH_SIZE
+from config import ANALYTICS_UPDATE_INTERVAL, MAX_TASK_HISTORY, MIN_TASKS_FOR_PREDICTION
+from config import ARCHIVE_INTERVAL, TASK_RETENTION_DAYS, MESSAGE_RETENTION_DAYS, NOTIFICATION_RETENTION_DAYS
+from config import BOT_MODE, TELEGRAM_API_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_URL, WEBHOOK_SECRET
+from archive import Archiver, ArchivePolicy
+from cache import TTLCache
+from export import EXPORT_EXTENSIONS, export_rows
+from jalali import format_jalali
+from migrations import configure_sqlite, index_migration, run_migrations
+from persistence import ConversationPersistence
+from processor import PerUserUpdateProcessor
+from router import Router
+from search import match_query, python_index_migration, ranked_tasks, register_search_index, search_migration
+from sender import SendQueue, PRIORITY_URGENT, PRIORITY_HIGH, PRIORITY_NORMAL
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+    from sklearn.ensemble import RandomForestRegressor
 
 # تنظیمات لاگینگ
 logging.basicConfig(
@@ -94,11 +117,16 @@ class User(Base):
     is_approved = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.now)
     
-    tasks = relationship("Task", back_populates="user")
+    tasks = relationship("Task", back_populates="user", foreign_keys="Task.user_id")
     comments = relationship("Comment", back_populates="user")
     notifications = relationship("Notification", back_populates="user")
     work_hours = relationship("WorkHour", back_populates="user")
-    transferred_tasks = relationship("Task", back_populates="transferred_to")
+    transferred_tasks = relationship("Task", back_populates="transferred_to", foreign_keys="Task.transferred_to_id")
+    
+    __table_args__ = (
+        Index('ix_users_role', 'role', 'id'),
+        Index('ix_users_username', 'username'),
+    )
 
 class Task(Base):
     __tablename__ = 'tasks'
@@ -127,6 +155,15 @@ class Task(Base):
     progress_logs = relationship("ProgressLog", back_populates="task")
     shares = relationship("TaskShare", back_populates="task")
     analytics = Column(JSON, default=dict)
+    
+    __table_args__ = (
+        Index('ix_tasks_user_created', 'user_id', 'created_at', 'id'),
+        Index('ix_tasks_user_scheduled', 'user_id', 'scheduled_for'),
+        Index('ix_tasks_created', 'created_at', 'id'),
+        Index('ix_tasks_status_completed', 'status', 'completed_at'),
+        Index('ix_tasks_deadline', 'deadline', 'status'),
+        {'sqlite_autoincrement': True}
+    )
 
 class Comment(Base):
     __tablename__ = 'comments'
@@ -139,6 +176,11 @@ class Comment(Base):
     
     task = relationship("Task", back_populates="comments")
     user = relationship("User", back_populates="comments")
+    
+    __table_args__ = (
+        Index('ix_comments_task_created', 'task_id', 'created_at'),
+        {'sqlite_autoincrement': True}
+    )
 
 class Attachment(Base):
     __tablename__ = 'attachments'
@@ -151,7 +193,9 @@ class Attachment(Base):
     file_size = Column(Integer)
     uploaded_at = Column(DateTime, default=datetime.now)
     
-    task = relationship("Task", back_populates="attachments")
+    task = relationship("Task")
+    
+    __table_args__ = {'sqlite_autoincrement': True}
 
 class ProgressLog(Base):
     __tablename__ = 'progress_logs'
@@ -163,6 +207,11 @@ class ProgressLog(Base):
     logged_at = Column(DateTime, default=datetime.now)
     
     task = relationship("Task", back_populates="progress_logs")
+    
+    __table_args__ = (
+        Index('ix_progress_logs_task_logged', 'task_id', 'logged_at'),
+        {'sqlite_autoincrement': True}
+    )
 
 class TaskShare(Base):
     __tablename__ = 'task_shares'
@@ -173,6 +222,8 @@ class TaskShare(Base):
     shared_at = Column(DateTime, default=datetime.now)
     
     task = relationship("Task", back_populates="shares")
+    
+    __table_args__ = {'sqlite_autoincrement': True}
 
 class Notification(Base):
     __tablename__ = 'notifications'
@@ -185,6 +236,11 @@ class Notification(Base):
     created_at = Column(DateTime, default=datetime.now)
     
     user = relationship("User", back_populates="notifications")
+    
+    __table_args__ = (
+        Index('ix_notifications_user_read', 'user_id', 'is_read', 'created_at'),
+        {'sqlite_autoincrement': True}
+    )
 
 class WorkHour(Base):
     __tablename__ = 'work_hours'
@@ -208,6 +264,8 @@ class Analytics(Base):
     quality_score = Column(Float)
     efficiency_score = Column(Float)
     created_at = Column(DateTime, default=datetime.now)
+    
+    __table_args__ = {'sqlite_autoincrement': True}
 
 class ChatGroup(Base):
     __tablename__ = 'chat_groups'
@@ -229,18 +287,208 @@ class ChatMessage(Base):
     created_at = Column(DateTime, default=datetime.now)
     group = relationship("ChatGroup", back_populates="messages")
     user = relationship("User")
+    
+    __table_args__ = (
+        Index('ix_chat_messages_group_created', 'group_id', 'created_at'),
+        {'sqlite_autoincrement': True}
+    )
 
 # ایجاد اتصال به دیتابیس
-engine = create_engine('sqlite:///tasks.db')
-Base.metadata.create_all(engine)
-Session = sessionmaker(bind=engine)
+engine = configure_sqlite(create_engine('sqlite:///tasks.db', connect_args={'check_same_thread': False}))
+register_search_index(Task, Comment)
+Session = sessionmaker(bind=engine, expire_on_commit=False)
+
+# داده‌های قدیمی به فایل بایگانی پیوست شده منتقل می‌شوند؛ گزارش‌ها از نماهای all_* می‌خوانند
+archiver = Archiver(engine, [
+    ArchivePolicy(
+        Task.__table__,
+        "status IN ('COMPLETED', 'CANCELLED') AND COALESCE(completed_at, created_at) < :cutoff",
+        TASK_RETENTION_DAYS,
+        children=(
+            (Comment.__table__, 'task_id'),
+            (Attachment.__table__, 'task_id'),
+            (ProgressLog.__table__, 'task_id'),
+            (TaskShare.__table__, 'task_id'),
+            (Analytics.__table__, 'task_id'),
+        )
+    ),
+    ArchivePolicy(ChatMessage.__table__, 'created_at < :cutoff', MESSAGE_RETENTION_DAYS),
+    ArchivePolicy(Notification.__table__, 'is_read = 1 AND created_at < :cutoff', NOTIFICATION_RETENTION_DAYS),
+])
+
+# مهاجرت‌ها به ترتیب اجرا می‌شوند؛ نام مهاجرت اعمال شده نباید تغییر کند
+MIGRATIONS = [
+    index_migration(
+        'bot_0001_query_indexes',
+        User.__table__, Task.__table__, Comment.__table__, ProgressLog.__table__,
+        Notification.__table__, ChatMessage.__table__
+    ),
+    search_migration('bot_0002_search_index'),
+    archiver.autoincrement_migration('bot_0003_archive_autoincrement'),
+    python_index_migration('bot_0004_search_python_index'),
+]
+
+def init_db():
+    """ایجاد جداول جدید و اجرای مهاجرت‌های اعمال نشده؛ یک بار هنگام راه‌اندازی"""
+    Base.metadata.create_all(engine)
+    run_migrations(engine, MIGRATIONS)
+
+# استخر محدود نخ‌ها برای اجرای کوئری‌ها خارج از حلقه رویداد
+db_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS, thread_name_prefix='db')
+
+# نخ جداگانه برای آموزش مدل تا استخر دیتابیس اشغال نشود
+training_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='training')
+
+# یک خروجی گزارش در هر لحظه تا حافظه و دیسک موقت محدود بماند
+export_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='export')
+
+# نخ جداگانه برای بایگانی دوره‌ای داده‌های قدیمی
+archive_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='archive')
+
+# استخر فرآیندها برای رندر نمودارها تا رندر kaleido حلقه رویداد را مسدود نکند
+chart_executor = ProcessPoolExecutor(max_workers=CHART_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+
+def encode_task_cursor(task: 'Task') -> str:
+    """ساخت نشانگر صفحه‌بندی از (created_at, id) برای داده callback"""
+    return f"{task.created_at.strftime('%Y%m%d%H%M%S%f')}_{task.id}"
+
+def parse_task_cursor(value: str):
+    """بازیابی (created_at, id) از نشانگر صفحه‌بندی"""
+    stamp, task_id = value.split('_')
+    return datetime.strptime(stamp, '%Y%m%d%H%M%S%f'), int(task_id)
+
+def keyset_page(query, cursor, direction: str, page_size: int):
+    """واکشی یک صفحه از وظایف با صفحه‌بندی keyset روی (created_at, id)"""
+    key = tuple_(Task.created_at, Task.id)
+    if direction == 'newer':
+        if cursor is not None:
+            query = query.filter(key > tuple_(*cursor))
+        query = query.order_by(Task.created_at.asc(), Task.id.asc())
+    else:
+        if cursor is not None:
+            query = query.filter(key < tuple_(*cursor))
+        query = query.order_by(Task.created_at.desc(), Task.id.desc())
+    
+    rows = query.limit(page_size + 1).all()
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if direction == 'newer':
+        rows.reverse()
+    return rows, has_more
+
+def jalali_month_range(year: int, month: int):
+    """بازه میلادی [ابتدای ماه، ابتدای ماه بعد) برای یک ماه شمسی"""
+    next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+    start = jdate(year, month, 1).togregorian()
+    end = jdate(next_year, next_month, 1).togregorian()
+    return datetime.combine(start, time.min), datetime.combine(end, time.min)
+
+# ستون‌های فایل خروجی گزارش دوره‌ای به ترتیب select در TaskBot._export_tasks
+REPORT_HEADERS = [
+    'شناسه', 'عنوان', 'مسئول', 'بخش', 'وضعیت', 'اولویت', 'تاریخ ایجاد',
+    'مهلت', 'تاریخ تکمیل', 'پیشرفت (%)', 'ساعت برآوردی', 'ساعت واقعی'
+]
+
+def jalali_year_range(year: int):
+    """بازه میلادی [ابتدای سال، ابتدای سال بعد) برای یک سال شمسی"""
+    start = jdate(year, 1, 1).togregorian()
+    end = jdate(year + 1, 1, 1).togregorian()
+    return datetime.combine(start, time.min), datetime.combine(end, time.min)
+
+def parse_report_format(value: str) -> str:
+    """اعتبارسنجی قالب گزارش در داده callback خروجی"""
+    if value not in REPORT_FORMATS:
+        raise ValueError(value)
+    return value
+
+def parse_jalali_month(value: str):
+    """بازیابی (سال، ماه) شمسی از داده callback تقویم"""
+    year, month = (int(part) for part in value.split('_'))
+    if not 1 <= month <= 12:
+        raise ValueError(value)
+    return year, month
+
+# اولویت ارسال اعلان وظیفه در صف پیام‌ها؛ وظایف فوری و با اولویت زیاد پیش از بقیه تحویل می‌شوند
+TASK_SEND_PRIORITIES = {
+    TaskPriority.LOW: PRIORITY_NORMAL,
+    TaskPriority.MEDIUM: PRIORITY_NORMAL,
+    TaskPriority.HIGH: PRIORITY_URGENT,
+    TaskPriority.URGENT: PRIORITY_URGENT
+}
+
+# وزن عددی اولویت‌ها به عنوان ویژگی مدل (مقدار enum رشته فارسی است)
+PRIORITY_WEIGHTS = {
+    TaskPriority.LOW: 1,
+    TaskPriority.MEDIUM: 2,
+    TaskPriority.HIGH: 3,
+    TaskPriority.URGENT: 4
+}
+
+def build_duration_features(df: 'pd.DataFrame') -> 'np.ndarray':
+    """ساخت ماتریس ویژگی‌های مدل زمان انجام به صورت برداری"""
+    import numpy as np
+    import pandas as pd
+    
+    created_at = pd.to_datetime(df['created_at'])
+    return np.column_stack([
+        df['estimated_hours'].fillna(0).astype(float),
+        df['description'].fillna('').str.split().str.len(),
+        df['comment_count'].astype(float),
+        df['priority'].map(PRIORITY_WEIGHTS).fillna(PRIORITY_WEIGHTS[TaskPriority.MEDIUM]),
+        created_at.dt.hour,
+        created_at.dt.weekday
+    ]).astype(float)
+
+@contextmanager
+def session_scope():
+    """ایجاد یک جلسه دیتابیس مستقل برای یک واحد کار"""
+    session = Session()
+    try:
+        yield session
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+class CachedUser(NamedTuple):
+    """نمای سبک کاربر برای کش هویت"""
+    id: int
+    telegram_id: int
+    username: Optional[str]
+    first_name: Optional[str]
+    last_name: Optional[str]
+    role: Optional[UserRole]
+    department: Optional[Department]
+    is_approved: bool
+
+    @classmethod
+    def from_user(cls, user: User) -> 'CachedUser':
+        return cls(
+            id=user.id,
+            telegram_id=user.telegram_id,
+            username=user.username,
+            first_name=user.first_name,
+            last_name=user.last_name,
+            role=user.role,
+            department=user.department,
+            is_approved=user.is_approved
+        )
+
+# نشانگر نبود کلید در کش (کاربر ثبت‌نام نشده با None ذخیره می‌شود)
+_MISSING = object()
 
 class TaskBot:
     def __init__(self):
-        self.session = Session()
         self.admin_id = int(os.getenv('ADMIN_TELEGRAM_ID'))
-        self.model = RandomForestRegressor()
-        self.is_model_trained = False
+        # فقط کش محلی؛ get_user روی حلقه رویداد اجرا می‌شود و نباید منتظر شبکه Redis بماند
+        self.user_cache = TTLCache(maxsize=USER_CACHE_SIZE)
+        self.report_cache = TTLCache(maxsize=REPORT_CACHE_SIZE, ttl=REPORT_UPDATE_INTERVAL)
+        self.model: Optional['RandomForestRegressor'] = None
+        self.background_tasks: List[asyncio.Task] = []
+        self.sender = SendQueue()
+        self.update_processor = PerUserUpdateProcessor()
+        self.persistence = ConversationPersistence()
         
         # تعریف نقش‌های دارای دسترسی تایید
         self.approval_roles = {
@@ -293,9 +541,37 @@ class TaskBot:
                 UserRole.WEBSITE_IT
             ]
         }
+        self.subordinate_roles = self._build_supervision_closure()
+        
+        self._build_routers()
+    
+    async def run_db(self, func, *args):
+        """اجرای یک واحد کار دیتابیس در استخر نخ‌ها بدون مسدود کردن حلقه رویداد"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(db_executor, partial(self._run_in_session, func, *args))
+    
+    @staticmethod
+    def _run_in_session(func, *args):
+        with session_scope() as session:
+            return func(session, *args)
+    
+    def _get_user_by_telegram_id(self, session, telegram_id: int) -> Optional[User]:
+        return session.query(User).filter_by(telegram_id=telegram_id).first()
+    
+    def _load_cached_user(self, session, telegram_id: int) -> Optional[CachedUser]:
+        db_user = self._get_user_by_telegram_id(session, telegram_id)
+        return CachedUser.from_user(db_user) if db_user else None
+    
+    async def get_user(self, telegram_id: int) -> Optional[CachedUser]:
+        """دریافت کاربر از کش هویت و در صورت نبود، از دیتابیس"""
+        cached = self.user_cache.get(telegram_id, _MISSING)
+        if cached is _MISSING:
+            cached = await self.run_db(self._load_cached_user, telegram_id)
+            self.user_cache.set(telegram_id, cached)
+        return cached
     
     def get_jalali_date(self, date):
-        return jdatetime.fromgregorian(datetime=date).strftime('%Y/%m/%d %H:%M')
+        return format_jalali(date, with_time=True)
     
     def create_role_keyboard(self, department: Department = None) -> InlineKeyboardMarkup:
         keyboard = []
@@ -353,6 +629,20 @@ class TaskBot:
         ]
         return InlineKeyboardMarkup(keyboard)
     
+    def create_export_keyboard(self) -> InlineKeyboardMarkup:
+        labels = {'pdf': 'PDF', 'excel': 'Excel'}
+        # قالب پیش‌فرض اول نمایش داده می‌شود
+        formats = sorted(REPORT_FORMATS, key=lambda report_format: report_format != DEFAULT_REPORT_FORMAT)
+        keyboard = [
+            [InlineKeyboardButton(f"📅 ماه جاری ({labels.get(report_format, report_format)})",
+                                  callback_data=f'export_month_{report_format}'),
+             InlineKeyboardButton(f"🗓 سال جاری ({labels.get(report_format, report_format)})",
+                                  callback_data=f'export_year_{report_format}')]
+            for report_format in formats
+        ]
+        keyboard.append([InlineKeyboardButton("🔙 بازگشت", callback_data='reports')])
+        return InlineKeyboardMarkup(keyboard)
+    
     def create_collaboration_keyboard(self) -> InlineKeyboardMarkup:
         keyboard = [
             [InlineKeyboardButton("💬 پیام‌های خصوصی", callback_data='private_messages')],
@@ -375,9 +665,29 @@ class TaskBot:
     def can_approve_tasks(self, role: UserRole) -> bool:
         return role in self.approval_roles
     
+    def _build_supervision_closure(self) -> Dict[UserRole, frozenset]:
+        """محاسبه یک‌باره همه نقش‌های زیرمجموعه (مستقیم و غیرمستقیم) هر نقش"""
+        closure: Dict[UserRole, frozenset] = {}
+        
+        def descendants(role: UserRole, path: frozenset) -> frozenset:
+            if role in closure:
+                return closure[role]
+            if role in path:
+                raise ValueError(f"چرخه در سلسله مراتب نظارت: {role.name}")
+            result = set()
+            for child in self.supervision_hierarchy.get(role, []):
+                result.add(child)
+                result |= descendants(child, path | {role})
+            closure[role] = frozenset(result)
+            return closure[role]
+        
+        for role in UserRole:
+            descendants(role, frozenset())
+        return closure
+    
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user = update.effective_user
-        db_user = self.session.query(User).filter_by(telegram_id=user.id).first()
+        db_user = await self.get_user(user.id)
         
         if not db_user:
             await update.message.reply_text(
@@ -391,342 +701,664 @@ class TaskBot:
         else:
             await self.show_main_menu(update, context)
     
+    def _build_routers(self):
+        """ثبت مسیرهای callback و وضعیت‌های گفتگو در جدول‌های ارسال"""
+        self.callback_router = Router()
+        callbacks = self.callback_router
+        callbacks.add_prefix('approve_user_', self._on_approve_user, int)
+        callbacks.add_prefix('reject_user_', self._on_reject_user, int)
+        callbacks.add_prefix('dept_', self._on_department, Department.__getitem__)
+        callbacks.add_prefix('role_', self._on_role, UserRole.__getitem__)
+        callbacks.add_prefix('priority_', self._on_priority, TaskPriority.__getitem__)
+        callbacks.add_prefix('log_progress_', self._on_log_progress, int)
+        callbacks.add_prefix('add_comment_', self._on_add_comment, int)
+        callbacks.add_prefix('add_attachment_', self._on_add_attachment, int)
+        callbacks.add_prefix('tasks_older_', self._on_tasks_older, parse_task_cursor)
+        callbacks.add_prefix('tasks_newer_', self._on_tasks_newer, parse_task_cursor)
+        callbacks.add_prefix('sub_older_', self._on_subordinate_older, parse_task_cursor)
+        callbacks.add_prefix('sub_newer_', self._on_subordinate_newer, parse_task_cursor)
+        # پیشوندی جدا از calendar_ تا دکمه‌های ثابتی مثل calendar_settings را نگیرد
+        callbacks.add_prefix('calmonth_', self._on_calendar_month, parse_jalali_month)
+        callbacks.add_prefix('search_page_', self._on_search_page, int)
+        callbacks.add_prefix('export_month_', self._on_export_month, parse_report_format)
+        callbacks.add_prefix('export_year_', self._on_export_year, parse_report_format)
+        callbacks.add('add_task', self._on_add_task)
+        callbacks.add('schedule_now', self._on_schedule_now)
+        callbacks.add('schedule_future', self._on_schedule_future)
+        callbacks.add('assign_subordinates', self._on_assign_subordinates)
+        callbacks.add('my_tasks', self._on_my_tasks)
+        callbacks.add('subordinate_tasks', self._on_subordinate_tasks)
+        callbacks.add('reports', self._on_reports)
+        callbacks.add('report_periodic', self._on_report_periodic)
+        callbacks.add('task_calendar', self._on_task_calendar)
+        callbacks.add('collaboration', self._on_collaboration)
+        callbacks.add('settings', self._on_settings)
+        callbacks.add('back_to_main', self.show_main_menu)
+        callbacks.add('analytics', self._on_analytics)
+        callbacks.add('chat_group', self._on_chat_group)
+        callbacks.add('share_file', self._on_share_file)
+        callbacks.add('tag_user', self._on_tag_user)
+        
+        self.state_router = Router()
+        states = self.state_router
+        states.add('waiting_for_first_name', self._on_first_name)
+        states.add('waiting_for_last_name', self._on_last_name)
+        states.add('waiting_for_task_title', self._on_task_title)
+        states.add('waiting_for_task_description', self._on_task_description)
+        states.add('waiting_for_schedule_date', self._on_schedule_date)
+        states.add('waiting_for_chat_group_name', self._on_chat_group_name)
+        states.add('waiting_for_file', self._on_file)
+        states.add('waiting_for_user_tag', self._on_user_tag)
+        states.add('waiting_for_progress', self._on_progress)
+        states.add('waiting_for_comment', self._on_comment)
+    
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         if 'state' not in context.user_data:
             return
-            
-        if context.user_data['state'] == 'waiting_for_first_name':
-            context.user_data['registration']['first_name'] = update.message.text
-            await update.message.reply_text('لطفاً نام خانوادگی خود را وارد کنید:')
-            context.user_data['state'] = 'waiting_for_last_name'
-            
-        elif context.user_data['state'] == 'waiting_for_last_name':
-            reg_data = context.user_data['registration']
-            reg_data['last_name'] = update.message.text
-            
-            db_user = User(
-                telegram_id=reg_data['telegram_id'],
-                username=reg_data['username'],
-                first_name=reg_data['first_name'],
-                last_name=reg_data['last_name'],
-                role=reg_data['role'],
-                department=reg_data['department']
-            )
-            self.session.add(db_user)
-            self.session.commit()
-            
-            # ارسال درخواست به مدیر برای تایید
-            admin_message = (
-                f'درخواست ثبت‌نام جدید:\n'
-                f'نام: {reg_data["first_name"]}\n'
-                f'نام خانوادگی: {reg_data["last_name"]}\n'
-                f'نام کاربری: {reg_data["username"]}\n'
-                f'نقش: {reg_data["role"].value}\n'
-                f'بخش: {reg_data["department"].value}'
-            )
-            
-            keyboard = [
-                [InlineKeyboardButton("✅ تایید", callback_data=f'approve_user_{db_user.id}')],
-                [InlineKeyboardButton("❌ رد", callback_data=f'reject_user_{db_user.id}')]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            await context.bot.send_message(
-                chat_id=self.admin_id,
-                text=admin_message,
-                reply_markup=reply_markup
-            )
-            
-            await update.message.reply_text(
-                'اطلاعات شما ثبت شد و در انتظار تایید مدیر است.'
-            )
-            context.user_data.clear()
-            
-        elif context.user_data['state'] == 'waiting_for_task_title':
-            context.user_data['task'] = {'title': update.message.text}
-            await update.message.reply_text('لطفاً توضیحات وظیفه را وارد کنید:')
-            context.user_data['state'] = 'waiting_for_task_description'
-            
-        elif context.user_data['state'] == 'waiting_for_task_description':
-            context.user_data['task']['description'] = update.message.text
-            await update.message.reply_text(
-                'لطفاً اولویت وظیفه را انتخاب کنید:',
-                reply_markup=self.create_task_priority_keyboard()
-            )
-            context.user_data['state'] = 'waiting_for_task_priority'
-            
-        elif context.user_data['state'] == 'waiting_for_schedule_date':
-            try:
-                date_str = update.message.text
-                scheduled_date = jdatetime.strptime(date_str, '%Y/%m/%d %H:%M').togregorian()
-                context.user_data['task']['scheduled_for'] = scheduled_date
-                
-                user = update.effective_user
-                db_user = self.session.query(User).filter_by(telegram_id=user.id).first()
-                
-                task = Task(
-                    title=context.user_data['task']['title'],
-                    description=context.user_data['task']['description'],
-                    user_id=db_user.id,
-                    scheduled_for=scheduled_date,
-                    priority=context.user_data['task']['priority']
-                )
-                self.session.add(task)
-                self.session.commit()
-                
-                # ایجاد اعلان برای یادآوری
-                notification = Notification(
-                    title="وظیفه جدید",
-                    content=f"وظیفه جدید '{task.title}' برای شما ثبت شد.",
-                    user_id=db_user.id
-                )
-                self.session.add(notification)
-                self.session.commit()
-                
-                await update.message.reply_text(
-                    'وظیفه با موفقیت ثبت شد!',
-                    reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 بازگشت", callback_data='back_to_main')]])
-                )
-                context.user_data.clear()
-                await self.show_main_menu(update, context)
-                
-            except ValueError:
-                await update.message.reply_text(
-                    'فرمت تاریخ نامعتبر است. لطفاً به فرمت YYYY/MM/DD HH:MM وارد کنید:'
-                )
-            
-        elif context.user_data['state'] == 'waiting_for_chat_group_name':
-            group_name = update.message.text
-            user = update.effective_user
-            db_user = self.session.query(User).filter_by(telegram_id=user.id).first()
-            
-            chat_group = ChatGroup(
-                name=group_name,
-                members=[db_user.id]
-            )
-            self.session.add(chat_group)
-            self.session.commit()
-            
-            await update.message.reply_text(
-                f'گروه چت "{group_name}" با موفقیت ایجاد شد.',
-                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 بازگشت", callback_data='back_to_main')]])
-            )
-            context.user_data.clear()
-            
-        elif context.user_data['state'] == 'waiting_for_file':
-            file = update.message.document
-            if file:
-                file_path = await context.bot.get_file(file.file_id)
-                file_name = file.file_name
-                
-                # ذخیره اطلاعات فایل در دیتابیس
-                task_id = context.user_data.get('current_task_id')
-                if task_id:
-                    task = self.session.query(Task).get(task_id)
-                    if task:
-                        task.attachments.append({
-                            'name': file_name,
-                            'file_id': file.file_id
-                        })
-                        self.session.commit()
-                
-                await update.message.reply_text(
-                    'فایل با موفقیت آپلود شد.',
-                    reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 بازگشت", callback_data='back_to_main')]])
-                )
-                context.user_data.clear()
-                
-        elif context.user_data['state'] == 'waiting_for_user_tag':
-            username = update.message.text
-            user = self.session.query(User).filter_by(username=username).first()
-            
-            if user:
-                task_id = context.user_data.get('current_task_id')
-                if task_id:
-                    task = self.session.query(Task).get(task_id)
-                    if task:
-                        task.tags.append(user.id)
-                        self.session.commit()
-                        
-                        await update.message.reply_text(
-                            f'کاربر {user.first_name} {user.last_name} با موفقیت تگ شد.',
-                            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 بازگشت", callback_data='back_to_main')]])
-                        )
-            else:
-                await update.message.reply_text(
-                    'کاربر مورد نظر یافت نشد.',
-                    reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 بازگشت", callback_data='back_to_main')]])
-                )
-            context.user_data.clear()
+        await self.state_router.dispatch(context.user_data['state'], update, context)
     
     async def handle_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         query = update.callback_query
         await query.answer()
         
-        if query.data.startswith('approve_user_'):
-            user_id = int(query.data.split('_')[2])
-            db_user = self.session.query(User).get(user_id)
-            if db_user:
-                db_user.is_approved = True
-                self.session.commit()
-                await query.message.reply_text('کاربر مورد نظر تایید شد.')
-                await context.bot.send_message(
-                    chat_id=db_user.telegram_id,
-                    text='ثبت‌نام شما تایید شد. می‌توانید از ربات استفاده کنید.'
-                )
-                
-        elif query.data.startswith('reject_user_'):
-            user_id = int(query.data.split('_')[2])
-            db_user = self.session.query(User).get(user_id)
-            if db_user:
-                self.session.delete(db_user)
-                self.session.commit()
-                await query.message.reply_text('کاربر مورد نظر رد شد.')
-                await context.bot.send_message(
-                    chat_id=db_user.telegram_id,
-                    text='متاسفانه ثبت‌نام شما رد شد. لطفاً دوباره تلاش کنید.'
+        if not await self.callback_router.dispatch(query.data, update, context):
+            logger.warning("callback ناشناخته: %s", query.data)
+    
+    async def show_route_stats(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """نمایش آمار تعداد و زمان اجرای مسیرها برای مدیر"""
+        if update.effective_user.id != self.admin_id:
+            return
+        
+        lines = ['📊 آمار مسیرها:\n']
+        for title, router in (('callback', self.callback_router), ('وضعیت', self.state_router)):
+            for name, stats in router.get_stats().items():
+                lines.append(
+                    f"{title} {name}: {stats['count']} بار، "
+                    f"میانگین {stats['avg_ms']:.1f}ms، بیشینه {stats['max_ms']:.1f}ms، "
+                    f"خطا {stats['errors']}"
                 )
-                
-        elif query.data.startswith('dept_'):
-            department = Department[query.data.split('_')[1]]
-            context.user_data['registration'] = {
-                'department': department,
-                'telegram_id': query.from_user.id,
-                'username': query.from_user.username
-            }
-            await query.message.edit_text(
-                'لطفاً نقش خود را انتخاب کنید:',
-                reply_markup=self.create_role_keyboard(department)
-            )
+        
+        processor_stats = self.update_processor.get_stats()
+        lines.append(
+            f"\n⚙️ پردازش همزمان: {processor_stats['processed']} به‌روزرسانی، "
+            f"بیشینه همزمانی {processor_stats['max_active']}، "
+            f"{processor_stats['serialized']} مورد در انتظار نوبت کاربر"
+        )
+        
+        state_stats = self.persistence.get_stats()
+        lines.append(
+            f"💾 وضعیت گفتگو: {state_stats['cached_users']} کاربر بارگذاری شده، "
+            f"{state_stats['restored']} بازیابی، {state_stats['written']} نوشتن در {state_stats['flushes']} تراکنش"
+        )
+        
+        sender_stats = self.sender.get_stats()
+        lines.append(
+            f"\n📤 صف ارسال: {sender_stats['depth']} در صف، {sender_stats['sent']} ارسال شده، "
+            f"{sender_stats['failed']} ناموفق، {sender_stats['flood_waits']} توقف flood، "
+            f"میانگین انتظار {sender_stats['avg_wait']:.2f}s"
+        )
+        
+        cache_stats = self.user_cache.get_stats()
+        lines.append(
+            f"🗂 کش هویت: {cache_stats['size']} مورد، "
+            f"نسبت برخورد {cache_stats['hit_ratio']:.0%}"
+            + (f" (Redis {cache_stats['l2']['hit_ratio']:.0%})" if 'l2' in cache_stats else '')
+        )
+        
+        archive_stats = archiver.get_stats()
+        moved = '، '.join(f"{name} {count}" for name, count in archive_stats['moved'].items() if count)
+        lines.append(f"🗄 بایگانی: {archive_stats['runs']} اجرا، منتقل شده: {moved or 'هیچ'}")
+        await update.message.reply_text('\n'.join(lines))
+    
+    # هندلرهای وضعیت گفتگو
+    
+    async def _on_first_name(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        context.user_data['registration']['first_name'] = update.message.text
+        await update.message.reply_text('لطفاً نام خانوادگی خود را وارد کنید:')
+        context.user_data['state'] = 'waiting_for_last_name'
+    
+    async def _on_last_name(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        reg_data = context.user_data['registration']
+        reg_data['last_name'] = update.message.text
+        
+        db_user = await self.run_db(self._register_user, reg_data)
+        self.user_cache.invalidate(reg_data['telegram_id'])
+        
+        # ارسال درخواست به مدیر برای تایید
+        admin_message = (
+            f'درخواست ثبت‌نام جدید:\n'
+            f'نام: {reg_data["first_name"]}\n'
+            f'نام خانوادگی: {reg_data["last_name"]}\n'
+            f'نام کاربری: {reg_data["username"]}\n'
+            f'نقش: {reg_data["role"].value}\n'
+            f'بخش: {reg_data["department"].value}'
+        )
+        
+        keyboard = [
+            [InlineKeyboardButton("✅ تایید", callback_data=f'approve_user_{db_user.id}')],
+            [InlineKeyboardButton("❌ رد", callback_data=f'reject_user_{db_user.id}')]
+        ]
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        
+        await self.sender.send_message(
+            chat_id=self.admin_id,
+            text=admin_message,
+            reply_markup=reply_markup,
+            priority=PRIORITY_HIGH
+        )
+        
+        await update.message.reply_text(
+            'اطلاعات شما ثبت شد و در انتظار تایید مدیر است.'
+        )
+        context.user_data.clear()
+    
+    async def _on_task_title(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        context.user_data['task'] = {'title': update.message.text}
+        await update.message.reply_text('لطفاً توضیحات وظیفه را وارد کنید:')
+        context.user_data['state'] = 'waiting_for_task_description'
+    
+    async def _on_task_description(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        context.user_data['task']['description'] = update.message.text
+        await update.message.reply_text(
+            'لطفاً اولویت وظیفه را انتخاب کنید:',
+            reply_markup=self.create_task_priority_keyboard()
+        )
+        context.user_data['state'] = 'waiting_for_task_priority'
+    
+    async def _on_schedule_date(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        try:
+            date_str = update.message.text
+            scheduled_date = jdatetime.strptime(date_str, '%Y/%m/%d %H:%M').togregorian()
+            context.user_data['task']['scheduled_for'] = scheduled_date
             
-        elif query.data.startswith('role_'):
-            role = UserRole[query.data.split('_')[1]]
-            context.user_data['registration']['role'] = role
-            await query.message.edit_text(
-                'لطفاً نام خود را وارد کنید:',
-                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 بازگشت", callback_data='back_to_main')]])
-            )
-            context.user_data['state'] = 'waiting_for_first_name'
+            db_user = await self.get_user(update.effective_user.id)
+            await self.run_db(self._create_task, db_user.id, context.user_data['task'], scheduled_date)
+            self.report_cache.invalidate(db_user.id)
             
-        elif query.data == 'add_task':
-            await query.message.edit_text(
-                'لطفاً عنوان وظیفه را وارد کنید:',
+            await update.message.reply_text(
+                'وظیفه با موفقیت ثبت شد!',
                 reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 بازگشت", callback_data='back_to_main')]])
             )
-            context.user_data['state'] = 'waiting_for_task_title'
-            
-        elif query.data.startswith('priority_'):
-            priority = TaskPriority[query.data.split('_')[1]]
-            context.user_data['task']['priority'] = priority
-            keyboard = [
-                [InlineKeyboardButton("⏰ همین الان", callback_data='schedule_now')],
-                [InlineKeyboardButton("📅 برای آینده", callback_data='schedule_future')]
-            ]
-            await query.message.edit_text(
-                'زمان اجرای وظیفه را انتخاب کنید:',
-                reply_markup=InlineKeyboardMarkup(keyboard)
-            )
-            context.user_data['state'] = 'waiting_for_schedule_choice'
-            
-        elif query.data == 'schedule_now':
-            user = query.from_user
-            db_user = self.session.query(User).filter_by(telegram_id=user.id).first()
+            context.user_data.clear()
+            await self.show_main_menu(update, context)
             
-            task = Task(
-                title=context.user_data['task']['title'],
-                description=context.user_data['task']['description'],
-                user_id=db_user.id,
-                scheduled_for=datetime.now(),
-                priority=context.user_data['task']['priority']
+        except ValueError:
+            await update.message.reply_text(
+                'فرمت تاریخ نامعتبر است. لطفاً به فرمت YYYY/MM/DD HH:MM وارد کنید:'
             )
-            self.session.add(task)
-            self.session.commit()
+    
+    async def _on_chat_group_name(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        group_name = update.message.text
+        db_user = await self.get_user(update.effective_user.id)
+        await self.run_db(self._create_chat_group, db_user.id, group_name)
+        
+        await update.message.reply_text(
+            f'گروه چت "{group_name}" با موفقیت ایجاد شد.',
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 بازگشت", callback_data='back_to_main')]])
+        )
+        context.user_data.clear()
+    
+    async def _on_file(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        file = update.message.document
+        if file:
+            file_name = file.file_name
             
-            # ایجاد اعلان برای یادآوری
-            notification = Notification(
-                title="وظیفه جدید",
-                content=f"وظیفه جدید '{task.title}' برای شما ثبت شد.",
-                user_id=db_user.id
-            )
-            self.session.add(notification)
-            self.session.commit()
+            # ذخیره اطلاعات فایل در دیتابیس
+            task_id = context.user_data.get('current_task_id')
+            if task_id:
+                await self.run_db(self._attach_file, task_id, {
+                    'name': file_name,
+                    'file_id': file.file_id
+                })
             
-            await query.message.edit_text(
-                'وظیفه با موفقیت ثبت شد!',
+            await update.message.reply_text(
+                'فایل با موفقیت آپلود شد.',
                 reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 بازگشت", callback_data='back_to_main')]])
             )
             context.user_data.clear()
-            await self.show_main_menu(query, context)
-            
-        elif query.data == 'schedule_future':
-            await query.message.edit_text(
-                'لطفاً تاریخ اجرای وظیفه را به فرمت YYYY/MM/DD HH:MM وارد کنید:',
+    
+    async def _on_user_tag(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        username = update.message.text
+        task_id = context.user_data.get('current_task_id')
+        user, tagged = await self.run_db(self._tag_user, username, task_id)
+        
+        if user:
+            if tagged:
+                await update.message.reply_text(
+                    f'کاربر {user.first_name} {user.last_name} با موفقیت تگ شد.',
+                    reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 بازگشت", callback_data='back_to_main')]])
+                )
+        else:
+            await update.message.reply_text(
+                'کاربر مورد نظر یافت نشد.',
                 reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 بازگشت", callback_data='back_to_main')]])
             )
-            context.user_data['state'] = 'waiting_for_schedule_date'
-            
-        elif query.data == 'my_tasks':
-            await self.show_user_tasks(query)
-            
-        elif query.data == 'reports':
-            await query.message.edit_text(
-                'گزارش‌گیری:',
-                reply_markup=self.create_reports_keyboard()
-            )
-            
-        elif query.data == 'task_calendar':
-            await self.show_task_calendar(query)
-            
-        elif query.data == 'collaboration':
-            await query.message.edit_text(
-                'همکاری:',
-                reply_markup=self.create_collaboration_keyboard()
-            )
-            
-        elif query.data == 'settings':
-            await query.message.edit_text(
-                'تنظیمات:',
-                reply_markup=self.create_settings_keyboard()
-            )
-            
-        elif query.data == 'back_to_main':
-            await self.show_main_menu(query, context)
-            
-        elif query.data == 'analytics':
-            user = query.from_user
-            db_user = self.session.query(User).filter_by(telegram_id=user.id).first()
-            report, img_bytes = self.generate_analytics_report(db_user.id)
-            
-            await query.message.reply_photo(
-                photo=img_bytes,
-                caption=report,
-                parse_mode=ParseMode.MARKDOWN
-            )
-            
-        elif query.data == 'chat_group':
-            await query.message.edit_text(
-                'لطفاً نام گروه چت را وارد کنید:',
-                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 بازگشت", callback_data='back_to_main')]])
+        context.user_data.clear()
+    
+    async def _on_progress(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        try:
+            progress = int(update.message.text)
+        except ValueError:
+            progress = -1
+        if not 0 <= progress <= 100:
+            await update.message.reply_text('لطفاً درصد پیشرفت را به صورت عددی بین ۰ تا ۱۰۰ وارد کنید:')
+            return
+        
+        owner_id = await self.run_db(self._log_progress, context.user_data['current_task_id'], progress)
+        if owner_id:
+            self.report_cache.invalidate(owner_id)
+        await update.message.reply_text(
+            'پیشرفت وظیفه ثبت شد.',
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 بازگشت", callback_data='back_to_main')]])
+        )
+        context.user_data.clear()
+    
+    async def _on_comment(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        db_user = await self.get_user(update.effective_user.id)
+        await self.run_db(self._add_comment, context.user_data['current_task_id'], db_user.id, update.message.text)
+        await update.message.reply_text(
+            'کامنت شما ثبت شد.',
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 بازگشت", callback_data='back_to_main')]])
+        )
+        context.user_data.clear()
+    
+    # هندلرهای callback
+    
+    async def _on_approve_user(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
+        query = update.callback_query
+        db_user = await self.run_db(self._approve_user, user_id)
+        if db_user:
+            self.user_cache.invalidate(db_user.telegram_id)
+            await query.message.reply_text('کاربر مورد نظر تایید شد.')
+            await self.sender.send_message(
+                chat_id=db_user.telegram_id,
+                text='ثبت‌نام شما تایید شد. می‌توانید از ربات استفاده کنید.',
+                priority=PRIORITY_HIGH
             )
-            context.user_data['state'] = 'waiting_for_chat_group_name'
-            
-        elif query.data == 'share_file':
-            await query.message.edit_text(
-                'لطفاً فایل مورد نظر را ارسال کنید:',
-                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 بازگشت", callback_data='back_to_main')]])
+    
+    async def _on_reject_user(self, update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int):
+        query = update.callback_query
+        db_user = await self.run_db(self._reject_user, user_id)
+        if db_user:
+            self.user_cache.invalidate(db_user.telegram_id)
+            await query.message.reply_text('کاربر مورد نظر رد شد.')
+            await self.sender.send_message(
+                chat_id=db_user.telegram_id,
+                text='متاسفانه ثبت‌نام شما رد شد. لطفاً دوباره تلاش کنید.',
+                priority=PRIORITY_HIGH
             )
-            context.user_data['state'] = 'waiting_for_file'
-            
-        elif query.data == 'tag_user':
-            await query.message.edit_text(
-                'لطفاً نام کاربری را که می‌خواهید تگ کنید وارد کنید:',
-                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 بازگشت", callback_data='back_to_main')]])
+    
+    async def _on_department(self, update: Update, context: ContextTypes.DEFAULT_TYPE, department: Department):
+        query = update.callback_query
+        context.user_data['registration'] = {
+            'department': department,
+            'telegram_id': query.from_user.id,
+            'username': query.from_user.username
+        }
+        await query.message.edit_text(
+            'لطفاً نقش خود را انتخاب کنید:',
+            reply_markup=self.create_role_keyboard(department)
+        )
+    
+    async def _on_role(self, update: Update, context: ContextTypes.DEFAULT_TYPE, role: UserRole):
+        query = update.callback_query
+        context.user_data['registration']['role'] = role
+        await query.message.edit_text(
+            'لطفاً نام خود را وارد کنید:',
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 بازگشت", callback_data='back_to_main')]])
+        )
+        context.user_data['state'] = 'waiting_for_first_name'
+    
+    async def _on_add_task(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        await update.callback_query.message.edit_text(
+            'لطفاً عنوان وظیفه را وارد کنید:',
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 بازگشت", callback_data='back_to_main')]])
+        )
+        context.user_data['state'] = 'waiting_for_task_title'
+    
+    async def _on_priority(self, update: Update, context: ContextTypes.DEFAULT_TYPE, priority: TaskPriority):
+        context.user_data['task']['priority'] = priority
+        keyboard = [
+            [InlineKeyboardButton("⏰ همین الان", callback_data='schedule_now')],
+            [InlineKeyboardButton("📅 برای آینده", callback_data='schedule_future')]
+        ]
+        db_user = await self.get_user(update.callback_query.from_user.id)
+        if db_user and self.subordinate_roles.get(db_user.role):
+            keyboard.append([InlineKeyboardButton("👥 واگذاری به همه زیرمجموعه", callback_data='assign_subordinates')])
+        await update.callback_query.message.edit_text(
+            'زمان اجرای وظیفه را انتخاب کنید:',
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+        context.user_data['state'] = 'waiting_for_schedule_choice'
+    
+    async def _on_schedule_now(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        query = update.callback_query
+        db_user = await self.get_user(query.from_user.id)
+        await self.run_db(self._create_task, db_user.id, context.user_data['task'], datetime.now())
+        self.report_cache.invalidate(db_user.id)
+        
+        await query.message.edit_text(
+            'وظیفه با موفقیت ثبت شد!',
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 بازگشت", callback_data='back_to_main')]])
+        )
+        context.user_data.clear()
+        await self.show_main_menu(update, context)
+    
+    async def _on_assign_subordinates(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        query = update.callback_query
+        db_user = await self.get_user(query.from_user.id)
+        roles = self.subordinate_roles.get(db_user.role) if db_user else None
+        if not roles or 'task' not in context.user_data:
+            return
+        user_ids = await self.run_db(self._get_subordinate_user_ids, roles)
+        tasks = await self.assign_tasks(user_ids, context.user_data['task'])
+        
+        await query.message.edit_text(
+            f'وظیفه برای {len(tasks)} نفر از زیرمجموعه شما ثبت شد.',
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 بازگشت", callback_data='back_to_main')]])
+        )
+        context.user_data.clear()
+    
+    async def _on_schedule_future(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        await update.callback_query.message.edit_text(
+            'لطفاً تاریخ اجرای وظیفه را به فرمت YYYY/MM/DD HH:MM وارد کنید:',
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 بازگشت", callback_data='back_to_main')]])
+        )
+        context.user_data['state'] = 'waiting_for_schedule_date'
+    
+    async def _on_my_tasks(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        await self.show_user_tasks(update.callback_query)
+    
+    async def _on_tasks_older(self, update: Update, context: ContextTypes.DEFAULT_TYPE, cursor):
+        await self.show_user_tasks(update.callback_query, cursor, 'older')
+    
+    async def _on_tasks_newer(self, update: Update, context: ContextTypes.DEFAULT_TYPE, cursor):
+        await self.show_user_tasks(update.callback_query, cursor, 'newer')
+    
+    async def _on_subordinate_tasks(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        await self.show_subordinate_tasks(update.callback_query)
+    
+    async def _on_subordinate_older(self, update: Update, context: ContextTypes.DEFAULT_TYPE, cursor):
+        await self.show_subordinate_tasks(update.callback_query, cursor, 'older')
+    
+    async def _on_subordinate_newer(self, update: Update, context: ContextTypes.DEFAULT_TYPE, cursor):
+        await self.show_subordinate_tasks(update.callback_query, cursor, 'newer')
+    
+    async def _on_search_page(self, update: Update, context: ContextTypes.DEFAULT_TYPE, page: int):
+        query = update.callback_query
+        await self.show_search_results(query.from_user.id, context, query.message.edit_text, page)
+    
+    async def _on_reports(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        await update.callback_query.message.edit_text(
+            'گزارش‌گیری:',
+            reply_markup=self.create_reports_keyboard()
+        )
+    
+    async def _on_task_calendar(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        await self.show_task_calendar(update.callback_query)
+    
+    async def _on_calendar_month(self, update: Update, context: ContextTypes.DEFAULT_TYPE, month):
+        await self.show_task_calendar(update.callback_query, month)
+    
+    async def _on_report_periodic(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        await update.callback_query.message.edit_text(
+            'بازه و قالب گزارش دوره‌ای را انتخاب کنید:',
+            reply_markup=self.create_export_keyboard()
+        )
+    
+    async def _on_export_month(self, update: Update, context: ContextTypes.DEFAULT_TYPE, report_format: str):
+        today = jdate.today()
+        start, end = jalali_month_range(today.year, today.month)
+        title = f'گزارش وظایف {jdate.j_months_fa[today.month - 1]} {today.year}'
+        await self.send_periodic_report(update.callback_query, start, end, report_format, title)
+    
+    async def _on_export_year(self, update: Update, context: ContextTypes.DEFAULT_TYPE, report_format: str):
+        year = jdate.today().year
+        start, end = jalali_year_range(year)
+        await self.send_periodic_report(update.callback_query, start, end, report_format, f'گزارش وظایف سال {year}')
+    
+    async def _on_collaboration(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        await update.callback_query.message.edit_text(
+            'همکاری:',
+            reply_markup=self.create_collaboration_keyboard()
+        )
+    
+    async def _on_settings(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        await update.callback_query.message.edit_text(
+            'تنظیمات:',
+            reply_markup=self.create_settings_keyboard()
+        )
+    
+    async def _on_analytics(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        query = update.callback_query
+        db_user = await self.get_user(query.from_user.id)
+        report, img_bytes = await self.generate_analytics_report(db_user.id)
+        
+        await query.message.reply_photo(
+            photo=img_bytes,
+            caption=report,
+            parse_mode=ParseMode.MARKDOWN
+        )
+    
+    async def _on_chat_group(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        await update.callback_query.message.edit_text(
+            'لطفاً نام گروه چت را وارد کنید:',
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 بازگشت", callback_data='back_to_main')]])
+        )
+        context.user_data['state'] = 'waiting_for_chat_group_name'
+    
+    async def _on_share_file(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        await update.callback_query.message.edit_text(
+            'لطفاً فایل مورد نظر را ارسال کنید:',
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 بازگشت", callback_data='back_to_main')]])
+        )
+        context.user_data['state'] = 'waiting_for_file'
+    
+    async def _on_tag_user(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        await update.callback_query.message.edit_text(
+            'لطفاً نام کاربری را که می‌خواهید تگ کنید وارد کنید:',
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 بازگشت", callback_data='back_to_main')]])
+        )
+        context.user_data['state'] = 'waiting_for_user_tag'
+    
+    async def _on_log_progress(self, update: Update, context: ContextTypes.DEFAULT_TYPE, task_id: int):
+        await update.callback_query.message.edit_text(
+            'لطفاً درصد پیشرفت وظیفه (۰ تا ۱۰۰) را وارد کنید:',
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 بازگشت", callback_data='back_to_main')]])
+        )
+        context.user_data['current_task_id'] = task_id
+        context.user_data['state'] = 'waiting_for_progress'
+    
+    async def _on_add_comment(self, update: Update, context: ContextTypes.DEFAULT_TYPE, task_id: int):
+        await update.callback_query.message.edit_text(
+            'لطفاً متن کامنت را وارد کنید:',
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 بازگشت", callback_data='back_to_main')]])
+        )
+        context.user_data['current_task_id'] = task_id
+        context.user_data['state'] = 'waiting_for_comment'
+    
+    async def _on_add_attachment(self, update: Update, context: ContextTypes.DEFAULT_TYPE, task_id: int):
+        await update.callback_query.message.edit_text(
+            'لطفاً فایل مورد نظر را ارسال کنید:',
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 بازگشت", callback_data='back_to_main')]])
+        )
+        context.user_data['current_task_id'] = task_id
+        context.user_data['state'] = 'waiting_for_file'
+    
+    def _register_user(self, session, reg_data: Dict) -> User:
+        db_user = User(
+            telegram_id=reg_data['telegram_id'],
+            username=reg_data['username'],
+            first_name=reg_data['first_name'],
+            last_name=reg_data['last_name'],
+            role=reg_data['role'],
+            department=reg_data['department']
+        )
+        session.add(db_user)
+        
+        # اعلان درخواست ثبت‌نام برای مدیر در همان تراکنش
+        admin = session.query(User.id).filter_by(telegram_id=self.admin_id).first()
+        if admin and reg_data['telegram_id'] != self.admin_id:
+            session.add(Notification(
+                title="درخواست ثبت‌نام",
+                content=f"کاربر {reg_data['first_name']} {reg_data['last_name']} در انتظار تایید است.",
+                user_id=admin.id
+            ))
+        session.commit()
+        return db_user
+    
+    def _approve_user(self, session, user_id: int) -> Optional[User]:
+        db_user = session.get(User, user_id)
+        if db_user:
+            db_user.is_approved = True
+            session.commit()
+        return db_user
+    
+    def _reject_user(self, session, user_id: int) -> Optional[User]:
+        db_user = session.get(User, user_id)
+        if db_user:
+            session.delete(db_user)
+            session.commit()
+        return db_user
+    
+    @staticmethod
+    def _add_task_rows(session, user_id: int, task_data: Dict, scheduled_for: datetime) -> Task:
+        """افزودن وظیفه و اعلان آن به نشست بدون commit"""
+        task = Task(
+            title=task_data['title'],
+            description=task_data['description'],
+            user_id=user_id,
+            scheduled_for=scheduled_for,
+            priority=task_data['priority']
+        )
+        # ایجاد اعلان برای یادآوری
+        notification = Notification(
+            title="وظیفه جدید",
+            content=f"وظیفه جدید '{task.title}' برای شما ثبت شد.",
+            user_id=user_id
+        )
+        session.add_all([task, notification])
+        return task
+    
+    def _create_task(self, session, user_id: int, task_data: Dict, scheduled_for: datetime) -> Task:
+        task = self._add_task_rows(session, user_id, task_data, scheduled_for)
+        session.commit()
+        return task
+    
+    def _create_tasks(self, session, user_ids: List[int], task_data: Dict,
+                      scheduled_for: datetime) -> List[Tuple[Task, int]]:
+        """ایجاد یک وظیفه برای چند کاربر در یک تراکنش؛ (وظیفه، شناسه تلگرام) برمی‌گرداند"""
+        telegram_ids = dict(
+            session.query(User.id, User.telegram_id)
+            .filter(User.id.in_(user_ids), User.is_approved == True)
+        )
+        tasks = [
+            (self._add_task_rows(session, user_id, task_data, scheduled_for), telegram_ids[user_id])
+            for user_id in user_ids if user_id in telegram_ids
+        ]
+        session.commit()
+        return tasks
+    
+    async def assign_tasks(self, user_ids: List[int], task_data: Dict,
+                           scheduled_for: Optional[datetime] = None) -> List[Task]:
+        """ثبت گروهی یک وظیفه برای چند کاربر و ارسال اعلان به آن‌ها"""
+        created = await self.run_db(
+            self._create_tasks, user_ids, task_data, scheduled_for or datetime.now()
+        )
+        for task, telegram_id in created:
+            self.report_cache.invalidate(task.user_id)
+            await self.sender.send_message(
+                chat_id=telegram_id,
+                text=f"وظیفه جدید '{task.title}' برای شما ثبت شد.",
+                priority=TASK_SEND_PRIORITIES.get(task.priority, PRIORITY_NORMAL)
             )
-            context.user_data['state'] = 'waiting_for_user_tag'
+        return [task for task, _ in created]
+    
+    def _create_chat_group(self, session, user_id: int, group_name: str) -> ChatGroup:
+        chat_group = ChatGroup(
+            name=group_name,
+            members=[user_id]
+        )
+        session.add(chat_group)
+        session.commit()
+        return chat_group
+    
+    def _attach_file(self, session, task_id: int, attachment: Dict) -> bool:
+        task = session.get(Task, task_id)
+        if not task:
+            return False
+        # ستون JSON تغییرات درجا را ردیابی نمی‌کند؛ لیست جدید جایگزین می‌شود
+        task.attachments = (task.attachments or []) + [attachment]
+        session.commit()
+        return True
+    
+    def _tag_user(self, session, username: str, task_id: Optional[int]):
+        user = session.query(User).filter_by(username=username).first()
+        if not user or not task_id:
+            return user, False
+        task = session.get(Task, task_id)
+        if not task:
+            return user, False
+        task.tags = (task.tags or []) + [user.id]
+        session.commit()
+        return user, True
+    
+    def _log_progress(self, session, task_id: int, progress: int) -> Optional[int]:
+        task = session.get(Task, task_id)
+        if not task:
+            return None
+        task.progress = progress
+        session.add(ProgressLog(task_id=task_id, progress_percentage=progress))
+        session.commit()
+        return task.user_id
+    
+    def _add_comment(self, session, task_id: int, user_id: int, content: str) -> Comment:
+        comment = Comment(task_id=task_id, user_id=user_id, content=content)
+        session.add(comment)
+        session.commit()
+        return comment
+    
+    def _get_tasks_page(self, session, user_id: int, cursor=None, direction: str = 'older'):
+        query = session.query(Task).filter(Task.user_id == user_id)
+        return keyset_page(query, cursor, direction, TASKS_PAGE_SIZE)
+    
+    def _get_subordinate_user_ids(self, session, roles: frozenset) -> List[int]:
+        return [user_id for user_id, in session.query(User.id).filter(User.role.in_(roles), User.is_approved == True)]
+    
+    def _get_subordinate_tasks_page(self, session, roles: frozenset, cursor=None, direction: str = 'older'):
+        query = session.query(Task)\
+            .join(User, Task.user_id == User.id)\
+            .filter(User.role.in_(roles))\
+            .options(contains_eager(Task.user))
+        return keyset_page(query, cursor, direction, TASKS_PAGE_SIZE)
+    
+    def _search_tasks_page(self, session, user_id: int, roles: frozenset, match: str, page: int):
+        """یک صفحه از وظایف منطبق به ترتیب ارتباط؛ فقط وظایف خود کاربر و زیرمجموعه‌اش"""
+        hits = ranked_tasks(match)
+        scope = Task.user_id == user_id
+        if roles:
+            scope = or_(scope, User.role.in_(roles))
+        tasks = session.query(Task)\
+            .join(hits, hits.c.task_id == Task.id)\
+            .join(User, Task.user_id == User.id)\
+            .filter(scope)\
+            .options(contains_eager(Task.user))\
+            .order_by(hits.c.score, Task.id)\
+            .offset(page * SEARCH_PAGE_SIZE)\
+            .limit(SEARCH_PAGE_SIZE + 1)\
+            .all()
+        return tasks[:SEARCH_PAGE_SIZE], len(tasks) > SEARCH_PAGE_SIZE
+    
+    def _get_calendar_tasks(self, session, user_id: int, start: datetime, end: datetime):
+        return session.query(Task.id, Task.title, Task.scheduled_for, Task.status, Task.priority)\
+            .filter(Task.user_id == user_id, Task.scheduled_for >= start, Task.scheduled_for < end)\
+            .order_by(Task.scheduled_for)\
+            .limit(CALENDAR_MAX_TASKS + 1)\
+            .all()
     
     async def show_main_menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user = update.effective_user
-        db_user = self.session.query(User).filter_by(telegram_id=user.id).first()
+        db_user = await self.get_user(user.id)
         
         if isinstance(update.callback_query, CallbackQuery):
             await update.callback_query.message.edit_text(
@@ -739,101 +1371,360 @@ class TaskBot:
                 reply_markup=self.create_main_menu_keyboard(db_user)
             )
     
-    async def show_user_tasks(self, query: CallbackQuery):
-        user = query.from_user
-        db_user = self.session.query(User).filter_by(telegram_id=user.id).first()
-        tasks = self.session.query(Task).filter_by(user_id=db_user.id).all()
+    async def show_user_tasks(self, query: CallbackQuery, cursor=None, direction: str = 'older'):
+        db_user = await self.get_user(query.from_user.id)
+        tasks, has_more = await self.run_db(self._get_tasks_page, db_user.id, cursor, direction)
         
-        if not tasks:
+        if not tasks and cursor is None:
             await query.message.edit_text(
                 'شما هیچ وظیفه‌ای ندارید.',
                 reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 بازگشت", callback_data='back_to_main')]])
             )
             return
-            
-        message = 'وظایف شما:\n\n'
-        for task in tasks:
-            message += f'📝 {task.title}\n'
-            message += f'📄 {task.description}\n'
-            message += f'📅 تاریخ: {self.get_jalali_date(task.created_at)}\n'
-            message += f'🔍 وضعیت: {task.status.value}\n'
-            message += f'⚡️ اولویت: {task.priority.value}\n'
-            if task.deadline:
-                message += f'⏰ مهلت: {self.get_jalali_date(task.deadline)}\n'
-            message += '\n'
-            
-            keyboard = [
-                [InlineKeyboardButton("📊 ثبت پیشرفت", callback_data=f'log_progress_{task.id}')],
-                [InlineKeyboardButton("💬 کامنت", callback_data=f'add_comment_{task.id}')],
-                [InlineKeyboardButton("📎 پیوست", callback_data=f'add_attachment_{task.id}')]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            await query.message.edit_text(message, reply_markup=reply_markup)
+        
+        # در جهت قدیمی‌تر، صفحه جدیدتر فقط وقتی هست که از میانه لیست آمده باشیم و برعکس
+        has_older = has_more if direction == 'older' else True
+        has_newer = cursor is not None if direction == 'older' else has_more
+        predictions = await self.predict_durations(tasks)
+        message, reply_markup = self._render_task_page(tasks, 'وظایف شما:', 'tasks', has_older, has_newer,
+                                                       predictions=predictions)
+        await query.message.edit_text(message, reply_markup=reply_markup)
     
-    async def show_task_calendar(self, query: CallbackQuery):
-        user = query.from_user
-        db_user = self.session.query(User).filter_by(telegram_id=user.id).first()
-        tasks = self.session.query(Task).filter_by(user_id=db_user.id).all()
+    async def show_subordinate_tasks(self, query: CallbackQuery, cursor=None, direction: str = 'older'):
+        db_user = await self.get_user(query.from_user.id)
+        roles = self.subordinate_roles.get(db_user.role) if db_user else None
+        if not roles:
+            await query.message.edit_text(
+                'شما زیرمجموعه‌ای ندارید.',
+                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 بازگشت", callback_data='back_to_main')]])
+            )
+            return
         
-        if not tasks:
+        tasks, has_more = await self.run_db(self._get_subordinate_tasks_page, roles, cursor, direction)
+        if not tasks and cursor is None:
             await query.message.edit_text(
-                'شما هیچ وظیفه‌ای در تقویم ندارید.',
+                'هیچ وظیفه‌ای برای زیرمجموعه شما ثبت نشده است.',
                 reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 بازگشت", callback_data='back_to_main')]])
             )
             return
-            
-        message = 'تقویم وظایف شما:\n\n'
-        for task in tasks:
-            if task.scheduled_for:
-                message += f'📅 {self.get_jalali_date(task.scheduled_for)}\n'
-                message += f'📝 {task.title}\n'
-                message += f'🔍 وضعیت: {task.status.value}\n'
-                message += f'⚡️ اولویت: {task.priority.value}\n\n'
         
-        await query.message.edit_text(
-            message,
-            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 بازگشت", callback_data='back_to_main')]])
+        has_older = has_more if direction == 'older' else True
+        has_newer = cursor is not None if direction == 'older' else has_more
+        predictions = await self.predict_durations(tasks)
+        message, reply_markup = self._render_task_page(
+            tasks, 'وظایف زیرمجموعه:', 'sub', has_older, has_newer, show_owner=True, predictions=predictions
         )
+        await query.message.edit_text(message, reply_markup=reply_markup)
     
-    def train_prediction_model(self):
-        tasks = self.session.query(Task).filter(Task.completed_at.isnot(None)).all()
+    async def search_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """جستجوی متنی در عنوان، توضیحات و نظرات وظایف: /search عبارت"""
+        terms = ' '.join(context.args)
+        if match_query(terms) is None:
+            await update.message.reply_text('لطفاً عبارت جستجو را بعد از دستور وارد کنید، مثلاً:\n/search گزارش ماهانه')
+            return
+        context.user_data['search_query'] = terms
+        await self.show_search_results(update.effective_user.id, context, update.message.reply_text)
+    
+    async def show_search_results(self, telegram_id: int, context: ContextTypes.DEFAULT_TYPE, reply, page: int = 0):
+        db_user = await self.get_user(telegram_id)
+        if not db_user or not db_user.is_approved:
+            await reply('برای جستجو ابتدا باید ثبت‌نام شما تایید شود.')
+            return
+        terms = context.user_data.get('search_query', '')
+        match = match_query(terms)
+        if match is None:
+            await reply('جستجوی فعالی وجود ندارد. از دستور /search استفاده کنید.')
+            return
+        
+        roles = self.subordinate_roles.get(db_user.role)
+        tasks, has_next = await self.run_db(self._search_tasks_page, db_user.id, roles, match, page)
         if not tasks:
+            await reply(
+                f'نتیجه‌ای برای «{terms}» پیدا نشد.',
+                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 بازگشت", callback_data='back_to_main')]])
+            )
             return
-            
-        X = []
-        y = []
-        for task in tasks:
-            features = [
-                task.estimated_hours or 0,
-                len(task.description.split()),
-                len(task.comments),
-                task.priority.value,
-                task.created_at.hour,
-                task.created_at.weekday()
-            ]
-            X.append(features)
-            y.append((task.completed_at - task.created_at).total_seconds() / 3600)
-            
-        self.model.fit(X, y)
-        self.is_model_trained = True
+        
+        navigation = []
+        if page > 0:
+            navigation.append(InlineKeyboardButton("⬅️ قبلی", callback_data=f'search_page_{page - 1}'))
+        if has_next:
+            navigation.append(InlineKeyboardButton("بعدی ➡️", callback_data=f'search_page_{page + 1}'))
+        predictions = await self.predict_durations(tasks)
+        message, reply_markup = self._render_task_page(
+            tasks, f'🔎 نتایج جستجوی «{shorten(terms, TASK_TITLE_PREVIEW)}» (صفحه {page + 1}):', 'search', False, False,
+            show_owner=True, navigation=navigation, predictions=predictions
+        )
+        await reply(message, reply_markup=reply_markup)
     
-    def predict_task_duration(self, task):
-        if not self.is_model_trained:
-            self.train_prediction_model()
+    def _render_task_page(self, tasks: List[Task], header: str, nav_prefix: str,
+                          has_older: bool, has_newer: bool, show_owner: bool = False,
+                          navigation: Optional[List[InlineKeyboardButton]] = None,
+                          predictions: Optional[Dict[int, float]] = None):
+        """ساخت متن و کیبورد یک صفحه از وظایف برای یک بار ویرایش پیام"""
+        predictions = predictions or {}
+        message = f'{header}\n\n'
+        keyboard = []
+        rendered = []
+        for number, task in enumerate(tasks, start=1):
+            entry = f'{number}. 📝 {shorten(task.title or "", TASK_TITLE_PREVIEW)}\n'
+            if show_owner:
+                entry += f'👤 {task.user.first_name} {task.user.last_name} ({task.user.role.value})\n'
+            entry += f'📄 {shorten(task.description or "", TASK_DESCRIPTION_PREVIEW)}\n'
+            entry += f'📅 تاریخ: {self.get_jalali_date(task.created_at)}\n'
+            entry += f'🔍 وضعیت: {task.status.value}\n'
+            entry += f'⚡️ اولویت: {task.priority.value}\n'
+            if task.deadline:
+                entry += f'⏰ مهلت: {self.get_jalali_date(task.deadline)}\n'
+            if task.id in predictions:
+                entry += f'⏳ زمان پیش‌بینی شده: {predictions[task.id]:.1f} ساعت\n'
+            entry += '\n'
+            if len(message) + len(entry) > MessageLimit.MAX_TEXT_LENGTH:
+                # وظایف رسم نشده قدیمی‌ترند و با نشانگر آخرین وظیفه رسم شده در صفحه بعد می‌آیند؛
+                # صفحه‌هایی که ناوبری خودشان را دارند (جستجو) نشانگر keyset ندارند
+                has_older = navigation is None
+                break
+            message += entry
+            rendered.append(task)
             
-        features = [
-            task.estimated_hours or 0,
-            len(task.description.split()),
-            len(task.comments),
-            task.priority.value,
-            task.created_at.hour,
-            task.created_at.weekday()
+            keyboard.append([
+                InlineKeyboardButton(f"📊 {number}", callback_data=f'log_progress_{task.id}'),
+                InlineKeyboardButton(f"💬 {number}", callback_data=f'add_comment_{task.id}'),
+                InlineKeyboardButton(f"📎 {number}", callback_data=f'add_attachment_{task.id}')
+            ])
+        
+        navigation = list(navigation or [])
+        if has_newer and rendered:
+            navigation.append(InlineKeyboardButton("⬅️ جدیدتر", callback_data=f'{nav_prefix}_newer_{encode_task_cursor(rendered[0])}'))
+        if has_older and rendered:
+            navigation.append(InlineKeyboardButton("قدیمی‌تر ➡️", callback_data=f'{nav_prefix}_older_{encode_task_cursor(rendered[-1])}'))
+        if navigation:
+            keyboard.append(navigation)
+        keyboard.append([InlineKeyboardButton("🔙 بازگشت", callback_data='back_to_main')])
+        return message, InlineKeyboardMarkup(keyboard)
+    
+    async def show_task_calendar(self, query: CallbackQuery, month=None):
+        db_user = await self.get_user(query.from_user.id)
+        if month is None:
+            today = jdate.today()
+            month = (today.year, today.month)
+        year, month_number = month
+        start, end = jalali_month_range(year, month_number)
+        tasks = await self.run_db(self._get_calendar_tasks, db_user.id, start, end)
+        
+        # دسته‌بندی وظایف بر اساس روز ماه شمسی؛ ماه از start شروع می‌شود پس روز از اختلاف تاریخ به دست می‌آید
+        days = defaultdict(list)
+        for task in tasks[:CALENDAR_MAX_TASKS]:
+            days[(task.scheduled_for - start).days + 1].append(task)
+        
+        month_name = jdate.j_months_fa[month_number - 1]
+        message = f'تقویم وظایف شما - {month_name} {year}:\n\n'
+        if not days:
+            message += 'در این ماه وظیفه‌ای ندارید.\n'
+        for day in sorted(days):
+            entry = f'📅 {day} {month_name}\n'
+            for task in days[day]:
+                entry += f'  ⏰ {task.scheduled_for.strftime("%H:%M")} 📝 {task.title}\n'
+                entry += f'  🔍 {task.status.value} | ⚡️ {task.priority.value}\n'
+            entry += '\n'
+            if len(message) + len(entry) > MessageLimit.MAX_TEXT_LENGTH - 100:
+                break
+            message += entry
+        if len(tasks) > CALENDAR_MAX_TASKS:
+            message += '... و وظایف بیشتر در این ماه\n'
+        
+        prev_month = (year - 1, 12) if month_number == 1 else (year, month_number - 1)
+        next_month = (year + 1, 1) if month_number == 12 else (year, month_number + 1)
+        keyboard = [
+            [
+                InlineKeyboardButton("⬅️ ماه قبل", callback_data=f'calmonth_{prev_month[0]}_{prev_month[1]}'),
+                InlineKeyboardButton("ماه بعد ➡️", callback_data=f'calmonth_{next_month[0]}_{next_month[1]}')
+            ],
+            [InlineKeyboardButton("🔙 بازگشت", callback_data='back_to_main')]
         ]
-        return self.model.predict([features])[0]
+        await query.message.edit_text(message, reply_markup=InlineKeyboardMarkup(keyboard))
+    
+    def _load_training_data(self, session):
+        # آموزش روی کل سابقه شامل وظایف و نظرات بایگانی شده تا بایگانی داده آموزش را کم نکند؛
+        # تعداد کامنت‌ها با یک GROUP BY به جای بارگذاری تنبل task.comments برای هر وظیفه
+        all_tasks = archiver.view(Task.__table__)
+        all_comments = archiver.view(Comment.__table__)
+        comment_counts = select(all_comments.c.task_id, func.count(all_comments.c.id).label('comment_count'))\
+            .group_by(all_comments.c.task_id)\
+            .subquery()
+        return session.execute(
+            select(
+                all_tasks.c.estimated_hours,
+                all_tasks.c.description,
+                func.coalesce(comment_counts.c.comment_count, 0).label('comment_count'),
+                all_tasks.c.priority,
+                all_tasks.c.created_at,
+                all_tasks.c.completed_at
+            ).outerjoin(comment_counts, comment_counts.c.task_id == all_tasks.c.id)
+            .where(all_tasks.c.completed_at.isnot(None))
+            .order_by(all_tasks.c.completed_at.desc())
+            .limit(MAX_TASK_HISTORY)
+        ).all()
+    
+    def train_prediction_model(self):
+        """آموزش مدل پیش‌بینی زمان انجام و جایگزینی اتمی مدل فعلی"""
+        with session_scope() as session:
+            rows = self._load_training_data(session)
+        if len(rows) < MIN_TASKS_FOR_PREDICTION:
+            return
+        
+        # کتابخانه‌های تحلیلی فقط در اولین آموزش بارگذاری می‌شوند
+        import pandas as pd
+        from sklearn.ensemble import RandomForestRegressor
+        
+        df = pd.DataFrame(rows, columns=['estimated_hours', 'description', 'comment_count',
+                                         'priority', 'created_at', 'completed_at'])
+        X = build_duration_features(df)
+        y = ((df['completed_at'] - df['created_at']).dt.total_seconds() / 3600).to_numpy()
+        
+        model = RandomForestRegressor()
+        model.fit(X, y)
+        # هندلرها همیشه مدل کامل قبلی یا جدید را می‌بینند
+        self.model = model
+        logger.info("مدل پیش‌بینی با %d وظیفه آموزش داده شد", len(rows))
+    
+    async def run_training_job(self):
+        """آموزش دوره‌ای مدل در پس‌زمینه"""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(training_executor, self.train_prediction_model)
+            except Exception:
+                logger.exception("خطا در آموزش مدل پیش‌بینی")
+            await asyncio.sleep(ANALYTICS_UPDATE_INTERVAL)
+    
+    async def run_archive_job(self):
+        """انتقال دوره‌ای وظایف، پیام‌ها و اعلان‌های قدیمی به بایگانی"""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(archive_executor, archiver.run)
+            except Exception:
+                logger.exception("خطا در بایگانی داده‌های قدیمی")
+            await asyncio.sleep(ARCHIVE_INTERVAL)
+    
+    async def predict_durations(self, tasks: List[Task]) -> Dict[int, float]:
+        if self.model is None:
+            return {}
+        return await self.run_db(self._predict_durations, tasks)
+    
+    def _predict_durations(self, session, tasks: List[Task]) -> Dict[int, float]:
+        """پیش‌بینی زمان انجام وظایف ناتمام یک صفحه با یک بار فراخوانی مدل؛ تا پیش از آماده شدن مدل خالی است"""
+        model = self.model
+        pending = [task for task in tasks if task.completed_at is None]
+        if model is None or not pending:
+            return {}
+        
+        import pandas as pd
+        
+        comment_counts = dict(
+            session.query(Comment.task_id, func.count(Comment.id))
+            .filter(Comment.task_id.in_([task.id for task in pending]))
+            .group_by(Comment.task_id)
+        )
+        df = pd.DataFrame([{
+            'estimated_hours': task.estimated_hours,
+            'description': task.description,
+            'comment_count': comment_counts.get(task.id, 0),
+            'priority': task.priority,
+            'created_at': task.created_at
+        } for task in pending])
+        hours = model.predict(build_duration_features(df))
+        return {task.id: float(value) for task, value in zip(pending, hours)}
+    
+    async def post_init(self, application: Application):
+        """راه‌اندازی کارهای پس‌زمینه پس از آماده شدن برنامه"""
+        await self.sender.start(application.bot)
+        self.background_tasks.append(asyncio.create_task(self.run_training_job()))
+        self.background_tasks.append(asyncio.create_task(self.persistence.run_flush_job()))
+        self.background_tasks.append(asyncio.create_task(self.run_archive_job()))
+    
+    async def post_shutdown(self, application: Application):
+        """توقف کارهای پس‌زمینه هنگام خاموش شدن"""
+        for task in self.background_tasks:
+            task.cancel()
+        await asyncio.gather(*self.background_tasks, return_exceptions=True)
+        self.background_tasks.clear()
+        await self.persistence.close()
+        await self.sender.stop()
+    
+    def _get_report_data(self, session, user_id: int):
+        user = session.get(User, user_id)
+        # گزارش کل سابقه کاربر شامل وظایف بایگانی شده است
+        all_tasks = archiver.view(Task.__table__)
+        tasks = session.execute(
+            select(all_tasks.c.status, all_tasks.c.created_at, all_tasks.c.completed_at, all_tasks.c.progress)
+            .where(all_tasks.c.user_id == user_id)
+            .order_by(all_tasks.c.created_at, all_tasks.c.id)
+        ).all()
+        return user, tasks
     
-    def generate_analytics_report(self, user_id: int, period: str = 'month') -> str:
-        user = self.session.query(User).get(user_id)
-        tasks = self.session.query(Task).filter_by(user_id=user_id).all()
+    async def render_chart(self, user_id: int, created_at: List[datetime], progress: List[int]) -> bytes:
+        """رندر نمودار در استخر فرآیندها با کش بر اساس هش داده‌های ورودی"""
+        digest = hashlib.sha1(repr((created_at, progress)).encode()).hexdigest()
+        cached = self.report_cache.get(user_id)
+        if cached and cached[0] == digest:
+            return cached[1]
+        
+        from utils import render_progress_chart
+        
+        loop = asyncio.get_running_loop()
+        png = await loop.run_in_executor(chart_executor, render_progress_chart, created_at, progress)
+        self.report_cache.set(user_id, (digest, png))
+        return png
+    
+    def _export_tasks(self, user_id: int, roles: Optional[frozenset], start: datetime, end: datetime,
+                      report_format: str, title: str):
+        """خروجی وظایف یک بازه (شامل بایگانی) با خواندن دسته‌ای از دیتابیس و نوشتن جریانی در فایل"""
+        all_tasks = archiver.view(Task.__table__)
+        scope = all_tasks.c.user_id == user_id
+        if roles:
+            scope = or_(scope, User.role.in_(roles))
+        statement = select(
+            all_tasks.c.id, all_tasks.c.title,
+            func.coalesce(User.first_name, '') + ' ' + func.coalesce(User.last_name, ''),
+            User.department, all_tasks.c.status, all_tasks.c.priority,
+            all_tasks.c.created_at, all_tasks.c.deadline, all_tasks.c.completed_at,
+            all_tasks.c.progress, all_tasks.c.estimated_hours, all_tasks.c.actual_hours
+        ).join(User, all_tasks.c.user_id == User.id)\
+            .where(scope, all_tasks.c.created_at >= start, all_tasks.c.created_at < end)\
+            .order_by(all_tasks.c.created_at, all_tasks.c.id)\
+            .execution_options(yield_per=EXPORT_BATCH_SIZE)
+        with session_scope() as session:
+            return export_rows(session.execute(statement), REPORT_HEADERS, report_format, title)
+    
+    async def send_periodic_report(self, query: CallbackQuery, start: datetime, end: datetime,
+                                   report_format: str, title: str):
+        db_user = await self.get_user(query.from_user.id)
+        if not db_user or not db_user.is_approved:
+            return
+        roles = self.subordinate_roles.get(db_user.role)
+        await query.message.edit_text('⏳ در حال آماده‌سازی گزارش...')
+        
+        loop = asyncio.get_running_loop()
+        try:
+            document = await loop.run_in_executor(
+                export_executor, self._export_tasks, db_user.id, roles, start, end, report_format, title
+            )
+        except Exception:
+            logger.exception("خطا در ساخت گزارش %s", title)
+            await query.message.edit_text('❌ ساخت گزارش با خطا مواجه شد.', reply_markup=self.create_reports_keyboard())
+            return
+        with document:
+            await query.message.reply_document(
+                document=document,
+                filename=f'{title}.{EXPORT_EXTENSIONS[report_format]}',
+                caption=title
+            )
+        await query.message.edit_text('✅ گزارش ارسال شد.', reply_markup=self.create_reports_keyboard())
+    
+    async def generate_analytics_report(self, user_id: int, period: str = 'month'):
+        user, tasks = await self.run_db(self._get_report_data, user_id)
         
         # محاسبه شاخص‌های کلیدی
         total_tasks = len(tasks)
@@ -842,23 +1733,17 @@ class TaskBot:
         
         # محاسبه میانگین زمان انجام وظایف
         completed_tasks_with_time = [t for t in tasks if t.completed_at and t.created_at]
-        avg_completion_time = np.mean([
+        avg_completion_time = sum(
             (t.completed_at - t.created_at).total_seconds() / 3600
             for t in completed_tasks_with_time
-        ]) if completed_tasks_with_time else 0
+        ) / len(completed_tasks_with_time) if completed_tasks_with_time else 0
         
         # ایجاد نمودار
-        fig = go.Figure()
-        fig.add_trace(go.Bar(
-            x=[t.created_at for t in tasks],
-            y=[t.progress for t in tasks],
-            name='پیشرفت وظایف'
-        ))
-        
-        # ذخیره نمودار
-        img_bytes = io.BytesIO()
-        fig.write_image(img_bytes, format='png')
-        img_bytes.seek(0)
+        img_bytes = await self.render_chart(
+            user_id,
+            [t.created_at for t in tasks],
+            [t.progress for t in tasks]
+        )
         
         report = f"""
 📊 گزارش عملکرد {user.first_name} {user.last_name}
@@ -875,15 +1760,43 @@ class TaskBot:
 """
         return report, img_bytes
 
-def main():
-    bot = TaskBot()
-    application = Application.builder().token(os.getenv('TELEGRAM_BOT_TOKEN')).build()
+def build_application(bot: TaskBot, token: str, base_url: str = TELEGRAM_API_URL) -> Application:
+    """ساخت برنامه با هندلرها و پردازشگر به‌روزرسانی‌ها؛ base_url امکان اجرا روی Bot API محلی یا جعلی را می‌دهد"""
+    application = Application.builder()\
+        .token(token)\
+        .base_url(base_url)\
+        .concurrent_updates(bot.update_processor)\
+        .post_init(bot.post_init)\
+        .post_shutdown(bot.post_shutdown)\
+        .build()
     
+    bot.persistence.register(application)
     application.add_handler(CommandHandler("start", bot.start))
+    application.add_handler(CommandHandler("stats", bot.show_route_stats))
+    application.add_handler(CommandHandler("search", bot.search_command))
     application.add_handler(CallbackQueryHandler(bot.handle_callback))
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, bot.handle_message))
+    application.add_handler(MessageHandler((filters.TEXT & ~filters.COMMAND) | filters.Document.ALL, bot.handle_message))
+    return application
+
+def main():
+    # بدون آدرس عمومی، PTB آدرس وب‌هوک را از LISTEN می‌سازد (مثلاً 0.0.0.0) که تلگرام نمی‌پذیرد
+    if BOT_MODE == 'webhook' and not WEBHOOK_URL:
+        raise RuntimeError("در حالت BOT_MODE=webhook باید WEBHOOK_URL تنظیم شود")
+    init_db()
+    bot = TaskBot()
+    application = build_application(bot, os.getenv('TELEGRAM_BOT_TOKEN'))
     
-    application.run_polling()
+    if BOT_MODE == 'webhook':
+        application.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=WEBHOOK_URL,
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=Update.ALL_TYPES
+        )
+    else:
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,243 @@
+import json
+import logging
+from collections import OrderedDict
+from datetime import date, datetime
+from threading import Lock
+from time import monotonic
+from typing import Any, Dict, Hashable, Iterable, NamedTuple, Optional, Type
+from config import *
+
+try:
+    import redis
+except ImportError:  # Redis اختیاری است؛ بدون آن فقط کش درون‌فرآیندی استفاده می‌شود
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+class TTLCache:
+    """کش درون‌فرآیندی LRU با زمان انقضا"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = CACHE_TIMEOUT):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """دریافت مقدار در صورت وجود و منقضی نشدن"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < monotonic():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """ذخیره مقدار و حذف قدیمی‌ترین مورد در صورت پر شدن کش"""
+        with self._lock:
+            self._data[key] = (monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        """حذف یک کلید از کش"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """پاک کردن کامل کش"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """آمار برخورد و عدم برخورد کش"""
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total > 0 else 0
+        }
+
+def _encode(value: Any) -> Any:
+    """تبدیل مقدار کش (سطرهای NamedTuple، لیست‌ها و تاریخ‌ها) به ساختار قابل ذخیره در JSON"""
+    if isinstance(value, tuple) and hasattr(value, '_asdict'):
+        return {'__row__': type(value).__name__, 'fields': {k: _encode(v) for k, v in value._asdict().items()}}
+    if isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+    if isinstance(value, date):
+        return {'__date__': value.isoformat()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _encode(item) for key, item in value.items()}
+    return value
+
+class RedisCache:
+    """کش مشترک بین فرآیندها روی Redis (یا هر کلاینتی با متدهای get/set/delete)
+    
+    مقادیر به صورت JSON ذخیره می‌شوند و فقط سطرهای از نوع row_types دوباره ساخته می‌شوند؛
+    داده‌ای که قابل بازسازی نباشد (مثلاً پس از تغییر فیلدهای یک سطر) عدم برخورد حساب می‌شود.
+    پس از هر خطا تا REDIS_RETRY_BACKOFF ثانیه سراغ Redis نمی‌رود تا فراخوانی‌ها منتظر سرور از دسترس خارج نمانند.
+    """
+
+    def __init__(self, client, ttl: float = CACHE_TIMEOUT, prefix: str = 'cache:',
+                 row_types: Iterable[Type[NamedTuple]] = (), backoff: float = REDIS_RETRY_BACKOFF):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.row_types = {row_type.__name__: row_type for row_type in row_types}
+        self.backoff = backoff
+        self._retry_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _key(self, key: Hashable) -> str:
+        return f'{self.prefix}{key}'
+
+    def _available(self) -> bool:
+        return monotonic() >= self._retry_at
+
+    def _failed(self, action: str, error: Exception) -> None:
+        self.errors += 1
+        self._retry_at = monotonic() + self.backoff
+        logger.warning("خطا در %s Redis؛ تا %s ثانیه فقط کش محلی استفاده می‌شود: %s", action, self.backoff, error)
+
+    def _decode_object(self, obj: Dict[str, Any]) -> Any:
+        if '__datetime__' in obj:
+            return datetime.fromisoformat(obj['__datetime__'])
+        if '__date__' in obj:
+            return date.fromisoformat(obj['__date__'])
+        if '__row__' in obj:
+            row_type = self.row_types.get(obj['__row__'])
+            if row_type is None:
+                raise ValueError(f"نوع سطر ناشناخته: {obj['__row__']}")
+            return row_type(**obj['fields'])
+        return obj
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """دریافت مقدار؛ خطای Redis یا داده نامعتبر مانند عدم برخورد در نظر گرفته می‌شود"""
+        data = None
+        if self._available():
+            try:
+                data = self.client.get(self._key(key))
+            except Exception as e:
+                self._failed('خواندن از', e)
+        if data is not None:
+            try:
+                value = json.loads(data, object_hook=self._decode_object)
+            except (TypeError, ValueError) as e:
+                logger.warning("داده نامعتبر در کش Redis برای %s: %s", key, e)
+            else:
+                self.hits += 1
+                return value
+        self.misses += 1
+        return default
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if not self._available():
+            return
+        try:
+            self.client.set(self._key(key), json.dumps(_encode(value), ensure_ascii=False),
+                            ex=max(1, int(self.ttl)))
+        except Exception as e:
+            self._failed('نوشتن در', e)
+
+    def invalidate(self, key: Hashable) -> None:
+        # در زمان قطعی حذف انجام نمی‌شود؛ مقدار قدیمی حداکثر تا پایان TTL در Redis می‌ماند
+        if not self._available():
+            return
+        try:
+            self.client.delete(self._key(key))
+        except Exception as e:
+            self._failed('حذف از', e)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """آمار برخورد، عدم برخورد و خطاهای Redis"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'errors': self.errors,
+            'hit_ratio': self.hits / total if total > 0 else 0
+        }
+
+def redis_cache(prefix: str, url: Optional[str] = REDIS_URL, ttl: float = CACHE_TIMEOUT,
+                row_types: Iterable[Type[NamedTuple]] = ()) -> Optional[RedisCache]:
+    """ساخت کش Redis در صورت تنظیم REDIS_URL و نصب بودن کتابخانه redis"""
+    if not url:
+        return None
+    if redis is None:
+        logger.warning("REDIS_URL تنظیم شده ولی کتابخانه redis نصب نیست؛ فقط کش محلی استفاده می‌شود")
+        return None
+    client = redis.Redis.from_url(
+        url, socket_timeout=REDIS_SOCKET_TIMEOUT, socket_connect_timeout=REDIS_SOCKET_TIMEOUT
+    )
+    return RedisCache(client, ttl=ttl, prefix=prefix, row_types=row_types)
+
+class TieredCache:
+    """کش دو لایه: L1 درون‌فرآیندی و L2 اختیاری مشترک بین فرآیندها"""
+
+    def __init__(self, l1: TTLCache, l2: Optional[RedisCache] = None):
+        self.l1 = l1
+        self.l2 = l2
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        missing = object()
+        value = self.l1.get(key, missing)
+        if value is not missing:
+            return value
+        if self.l2 is not None:
+            value = self.l2.get(key, missing)
+            if value is not missing:
+                self.l1.set(key, value)
+                return value
+        return default
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self.l1.set(key, value)
+        if self.l2 is not None:
+            self.l2.set(key, value)
+
+    def invalidate(self, key: Hashable) -> None:
+        self.l1.invalidate(key)
+        if self.l2 is not None:
+            self.l2.invalidate(key)
+
+    def clear(self) -> None:
+        """پاک کردن لایه محلی؛ داده‌های مشترک با TTL منقضی می‌شوند"""
+        self.l1.clear()
+
+    def __len__(self) -> int:
+        return len(self.l1)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """آمار هر لایه و نسبت برخورد کل"""
+        l1 = self.l1.get_stats()
+        stats = {**l1, 'l1': l1}
+        if self.l2 is not None:
+            l2 = self.l2.get_stats()
+            lookups = l1['hits'] + l1['misses']
+            stats['l2'] = l2
+            stats['hit_ratio'] = (l1['hits'] + l2['hits']) / lookups if lookups > 0 else 0
+        return stats
+
+def tiered_cache(prefix: str, maxsize: int = 1024, row_types: Iterable[Type[NamedTuple]] = ()) -> TieredCache:
+    """ساخت کش دو لایه؛ با REDIS_URL لایه مشترک فعال و عمر لایه محلی کوتاه می‌شود
+    
+    row_types نوع سطرهایی است که در کش ذخیره می‌شوند و از Redis دوباره ساخته می‌شوند.
+    """
+    l2 = redis_cache(prefix, row_types=row_types)
+    l1 = TTLCache(maxsize=maxsize, ttl=L1_CACHE_TIMEOUT if l2 is not None else CACHE_TIMEOUT)
+    return TieredCache(l1, l2)
@@ -1,6 +1,7 @@
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 from config import *
+from search import normalize_fa
 import os
 
 class ChatGroup:
@@ -147,10 +148,11 @@ class ChatManager:
         if not group:
             return []
         
+        query = normalize_fa(query)
         return [
             message
             for message in group.messages
-            if query.lower() in message['text'].lower()
+            if query in normalize_fa(message['text'])
         ]
     
     def get_file_info(self, group_id: str, file_id: str) -> Optional[Dict[str, Any]]:
@@ -7,6 +7,14 @@ load_dotenv()
 # تنظیمات اصلی
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 DATABASE_URL = 'sqlite:///tasks.db'
+SQLITE_BUSY_TIMEOUT = 5000  # به میلی‌ثانیه
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024  # 256 مگابایت
+SQLITE_CACHE_SIZE = -64000  # مقدار منفی به کیلوبایت (حدود 64 مگابایت)
+BULK_CHUNK_SIZE = 500  # تعداد سطرها در هر دستور درج/به‌روزرسانی گروهی
+COMMENTS_PAGE_SIZE = 50  # تعداد نظرات در هر صفحه
+DB_POOL_SIZE = 5  # تعداد اتصال‌های نگهداری شده در استخر
+DB_MAX_OVERFLOW = 10  # اتصال‌های اضافه مجاز هنگام اوج بار
+DB_POOL_TIMEOUT = 30  # به ثانیه
 
 # تنظیمات تحلیل
 ANALYTICS_UPDATE_INTERVAL = 3600  # به ثانیه
@@ -25,9 +33,19 @@ MIN_TASKS_FOR_PREDICTION = 10
 PREDICTION_CONFIDENCE_THRESHOLD = 0.7
 
 # تنظیمات گزارش‌گیری
-REPORT_FORMATS = ['pdf', 'excel']
-DEFAULT_REPORT_FORMAT = 'pdf'
+# فونت TTF فارسی برای PDF؛ ایمیج Docker آن را با بسته fonts-vazirmatn نصب می‌کند
+REPORT_FONT_PATH = os.getenv('REPORT_FONT_PATH', '/usr/share/fonts/truetype/vazirmatn/Vazirmatn-Regular.ttf')
+# بدون فونت فارسی، PDF فقط مربع‌های خالی نشان می‌دهد پس قالب PDF پیشنهاد نمی‌شود
+PDF_REPORTS_ENABLED = bool(REPORT_FONT_PATH) and os.path.isfile(REPORT_FONT_PATH)
+REPORT_FORMATS = ['pdf', 'excel'] if PDF_REPORTS_ENABLED else ['excel']
+DEFAULT_REPORT_FORMAT = REPORT_FORMATS[0]
+EXPORT_BATCH_SIZE = 1000  # تعداد سطرهای خوانده شده از دیتابیس در هر دسته هنگام خروجی گرفتن
+EXPORT_SPOOL_SIZE = 8 * 1024 * 1024  # فایل خروجی بزرگ‌تر از این اندازه روی دیسک نوشته می‌شود
+EXPORT_PDF_MAX_ROWS = 20000  # حدود 25 مگابایت حافظه؛ خروجی Excel محدودیتی ندارد
+EXPORT_SHAPE_CACHE_SIZE = 4096  # متن‌های تکراری (نام، وضعیت، تاریخ) فقط یک بار برای PDF شکل‌دهی می‌شوند
 REPORT_UPDATE_INTERVAL = 86400  # به ثانیه (24 ساعت)
+REPORT_CACHE_SIZE = 256  # تعداد حداکثر نمودارهای گزارش نگهداری شده در کش
+CHART_WORKERS = 2  # تعداد فرآیندهای رندر نمودار
 
 # تنظیمات امنیتی
 MAX_LOGIN_ATTEMPTS = 3
@@ -35,4 +53,47 @@ SESSION_TIMEOUT = 3600  # به ثانیه (1 ساعت)
 
 # تنظیمات عملکرد
 CACHE_TIMEOUT = 300  # به ثانیه (5 دقیقه)
-MAX_CONCURRENT_REQUESTS = 10 
\ No newline at end of file
+L1_CACHE_TIMEOUT = 30  # عمر کش درون‌فرآیندی وقتی Redis فعال است؛ کهنگی بین فرآیندها را محدود می‌کند
+REDIS_URL = os.getenv('REDIS_URL')  # مثلا redis://redis:6379/0؛ خالی یعنی فقط کش محلی
+REDIS_SOCKET_TIMEOUT = 0.2  # به ثانیه؛ کش نباید بیش از این منتظر Redis بماند
+REDIS_RETRY_BACKOFF = 30  # به ثانیه؛ پس از خطای Redis تا این مدت فقط کش محلی استفاده می‌شود
+DB_CACHE_SIZE = 4096  # تعداد اشیای نگهداری شده در کش خواندن Database
+MAX_CONCURRENT_REQUESTS = 10
+USER_CACHE_SIZE = 1024  # تعداد حداکثر کاربران نگهداری شده در کش هویت
+JALALI_CACHE_SIZE = 4096  # تعداد روزهای تبدیل شده به تاریخ شمسی در کش
+MAX_PENDING_UPDATES = 256  # حداکثر به‌روزرسانی‌های دریافت شده و در انتظار پردازش
+
+# تنظیمات ذخیره وضعیت گفتگو
+STATE_DB_PATH = os.getenv('STATE_DB_PATH', 'conversations.db')
+STATE_FLUSH_INTERVAL = 5  # به ثانیه
+
+# تنظیمات بایگانی داده‌های قدیمی
+ARCHIVE_DB_PATH = os.getenv('ARCHIVE_DB_PATH', 'archive.db')
+ARCHIVE_INTERVAL = 24 * 3600  # به ثانیه
+ARCHIVE_BATCH_SIZE = 500  # تعداد سطرهای منتقل شده در هر تراکنش
+TASK_RETENTION_DAYS = 180  # وظایف تکمیل یا لغو شده پس از این مدت بایگانی می‌شوند
+MESSAGE_RETENTION_DAYS = 90
+NOTIFICATION_RETENTION_DAYS = 30  # فقط اعلان‌های خوانده شده
+
+# تنظیمات دریافت به‌روزرسانی‌ها
+BOT_MODE = os.getenv('BOT_MODE', 'polling')  # polling یا webhook
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org/bot')
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', 'telegram')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')  # آدرس عمومی HTTPS؛ در حالت webhook الزامی است
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+
+# تنظیمات صف ارسال پیام (محدودیت‌های تلگرام)
+TELEGRAM_GLOBAL_RATE = 30  # پیام در ثانیه برای کل ربات
+TELEGRAM_CHAT_RATE = 1  # پیام در ثانیه برای هر چت
+SEND_QUEUE_SIZE = 1000  # ظرفیت صف ارسال پیش از منتظر ماندن تولیدکننده‌ها
+MAX_SEND_RETRIES = 3
+MAX_TRACKED_CHATS = 10000  # تعداد چت‌هایی که نرخ ارسالشان نگهداری می‌شود
+
+# تنظیمات نمایش وظایف
+TASKS_PAGE_SIZE = 5  # تعداد وظایف در هر صفحه
+TASK_TITLE_PREVIEW = 100  # حداکثر طول عنوان در لیست وظایف
+TASK_DESCRIPTION_PREVIEW = 200  # حداکثر طول توضیحات در لیست وظایف
+CALENDAR_MAX_TASKS = 100  # حداکثر وظایف نمایش داده شده در تقویم یک ماه
+SEARCH_PAGE_SIZE = 5  # تعداد نتایج جستجو در هر صفحه
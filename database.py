@@ -1,9 +1,19 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, ForeignKey, Float, JSON
+from sqlalchemy import create_engine, Column, Integer, String, Date, DateTime, Boolean, ForeignKey, Float, JSON, Index
+from sqlalchemy import and_, insert, update, bindparam, select, tuple_, text, true
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
-from datetime import datetime
-from typing import List, Optional
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlalchemy.util import greenlet_spawn
+import base64
+from datetime import date, datetime
+from collections import Counter
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Type
 from config import *
+from cache import TieredCache, TTLCache, tiered_cache
+from migrations import Migration, configure_sqlite, index_migration, run_migrations
 
 Base = declarative_base()
 
@@ -40,6 +50,11 @@ class Task(Base):
     assignee = relationship("User", back_populates="tasks")
     comments = relationship("Comment", back_populates="task")
     analytics = relationship("Analytics", back_populates="task")
+    
+    __table_args__ = (
+        Index('ix_tasks_assignee_status', 'assignee_id', 'status'),
+        Index('ix_tasks_status_completed', 'status', 'completed_at'),
+    )
 
 class Comment(Base):
     __tablename__ = 'comments'
@@ -53,6 +68,10 @@ class Comment(Base):
     
     user = relationship("User", back_populates="comments")
     task = relationship("Task", back_populates="comments")
+    
+    __table_args__ = (
+        Index('ix_comments_task_created_id', 'task_id', 'created_at', 'id'),
+    )
 
 class Analytics(Base):
     __tablename__ = 'analytics'
@@ -63,6 +82,10 @@ class Analytics(Base):
     data = Column(JSON)  # Store analytics data as JSON
     
     task = relationship("Task", back_populates="analytics")
+    
+    __table_args__ = (
+        Index('ix_analytics_task_created', 'task_id', 'created_at'),
+    )
 
 class Notification(Base):
     __tablename__ = 'notifications'
@@ -77,6 +100,88 @@ class Notification(Base):
     action_data = Column(JSON)
     
     user = relationship("User", back_populates="notifications")
+    
+    __table_args__ = (
+        Index('ix_notifications_user_read', 'user_id', 'read', 'created_at'),
+    )
+
+class NotificationCounter(Base):
+    """تعداد اعلان‌های خوانده نشده هر کاربر؛ همراه با درج و خواندن اعلان‌ها به‌روز می‌شود"""
+    __tablename__ = 'notification_counters'
+    
+    user_id = Column(String, ForeignKey('users.id'), primary_key=True)
+    unread = Column(Integer, nullable=False, default=0)
+
+class TaskRollup(Base):
+    """آمار تجمیعی وظایف به تفکیک کاربر، اولویت، وضعیت و روز ایجاد؛ همراه با تغییر وظایف به‌روز می‌شود"""
+    __tablename__ = 'task_rollups'
+    
+    user_id = Column(String, primary_key=True)
+    priority = Column(String, primary_key=True)
+    status = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+    task_count = Column(Integer, nullable=False, default=0)
+    duration_sum = Column(Float, nullable=False, default=0)  # ساعت، فقط وظایف دارای completed_at
+    duration_count = Column(Integer, nullable=False, default=0)
+    delay_sum = Column(Float, nullable=False, default=0)  # مدت انجام منهای زمان تخمینی
+    delay_count = Column(Integer, nullable=False, default=0)
+    on_time_count = Column(Integer, nullable=False, default=0)  # تاخیر صفر یا منفی
+    efficiency_sum = Column(Float, nullable=False, default=0)  # زمان تخمینی به مدت انجام
+    efficiency_count = Column(Integer, nullable=False, default=0)
+
+ROLLUP_VALUES = ('task_count', 'duration_sum', 'duration_count', 'delay_sum', 'delay_count',
+                 'on_time_count', 'efficiency_sum', 'efficiency_count')
+
+def _add_task_rollup(deltas: Dict[tuple, Dict[str, float]], task, sign: int = 1) -> None:
+    """افزودن (یا با sign=-1 کم کردن) سهم یک وظیفه به تغییرات جدول تجمیعی
+    
+    task هر شیئی با ویژگی‌های assignee_id، priority، status، created_at، completed_at
+    و estimated_duration است؛ مقادیر خالی در کلید به رشته خالی تبدیل می‌شوند.
+    """
+    created_at = task.created_at or datetime.now()
+    key = (task.assignee_id or '', task.priority or '', task.status or '', created_at.date())
+    values = deltas.setdefault(key, dict.fromkeys(ROLLUP_VALUES, 0))
+    values['task_count'] += sign
+    if task.completed_at is None:
+        return
+    duration = (task.completed_at - created_at).total_seconds() / 3600
+    values['duration_sum'] += sign * duration
+    values['duration_count'] += sign
+    if task.estimated_duration is not None:
+        delay = duration - task.estimated_duration
+        values['delay_sum'] += sign * delay
+        values['delay_count'] += sign
+        values['on_time_count'] += sign * (delay <= 0)
+        if duration > 0:
+            values['efficiency_sum'] += sign * task.estimated_duration / duration
+            values['efficiency_count'] += sign
+
+def _apply_task_rollups(executor, dialect_name: str, deltas: Dict[tuple, Dict[str, float]]) -> None:
+    """اعمال تغییرات روی جدول تجمیعی در تراکنش جاری (session یا connection)"""
+    rows = [
+        dict(zip(('user_id', 'priority', 'status', 'day'), key), **values)
+        for key, values in deltas.items() if any(values.values())
+    ]
+    if not rows:
+        return
+    dialect_insert = postgresql_insert if dialect_name == 'postgresql' else sqlite_insert
+    table = TaskRollup.__table__
+    statement = dialect_insert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=['user_id', 'priority', 'status', 'day'],
+        set_={name: table.c[name] + statement.excluded[name] for name in ROLLUP_VALUES}
+    )
+    executor.execute(statement, rows)
+
+def _begin_rollup_write(executor, dialect_name: str) -> None:
+    """قفل نوشتن پیش از خواندن وضعیت قبلی وظایف برای محاسبه تغییرات جدول تجمیعی
+    
+    SQLAlchemy روی SQLite عبارت FOR UPDATE را نمی‌فرستد؛ BEGIN IMMEDIATE قفل نوشتن را از ابتدای
+    تراکنش می‌گیرد تا نویسنده همزمان منتظر بماند و وضعیت به‌روز را بخواند. روی PostgreSQL
+    قفل سطرها با with_for_update گرفته می‌شود.
+    """
+    if dialect_name == 'sqlite':
+        executor.execute(text('BEGIN IMMEDIATE'))
 
 class ChatGroup(Base):
     __tablename__ = 'chat_groups'
@@ -97,13 +202,177 @@ class ChatMessage(Base):
     content = Column(String)
     type = Column(String)  # 'text', 'file', etc.
     created_at = Column(DateTime, default=datetime.now)
-    metadata = Column(JSON)  # Additional message data
+    # نام metadata در مدل‌های declarative رزرو شده است؛ ستون با همان نام باقی می‌ماند
+    message_metadata = Column('metadata', JSON)  # Additional message data
+    
+    __table_args__ = (
+        Index('ix_chat_messages_group_created_id', 'group_id', 'created_at', 'id'),
+    )
+
+def _backfill_notification_counters(connection) -> None:
+    """مقداردهی اولیه شمارنده‌ها از روی اعلان‌های خوانده نشده موجود"""
+    connection.execute(text('DELETE FROM notification_counters'))
+    connection.execute(text(
+        'INSERT INTO notification_counters (user_id, unread) '
+        'SELECT user_id, COUNT(*) FROM notifications '
+        'WHERE read = :unread AND user_id IS NOT NULL GROUP BY user_id'
+    ), {'unread': False})
+
+def _backfill_task_rollups(connection) -> None:
+    """ساخت جدول تجمیعی از روی وظایف موجود با خواندن دسته‌ای"""
+    connection.execute(text('DELETE FROM task_rollups'))
+    columns = Task.__table__.c
+    rows = connection.execution_options(yield_per=BULK_CHUNK_SIZE).execute(select(
+        columns.assignee_id, columns.priority, columns.status,
+        columns.created_at, columns.completed_at, columns.estimated_duration
+    ))
+    deltas: Dict[tuple, Dict[str, float]] = {}
+    for row in rows:
+        _add_task_rollup(deltas, row)
+    _apply_task_rollups(connection, connection.dialect.name, deltas)
+
+# مهاجرت‌ها به ترتیب اجرا می‌شوند؛ نام مهاجرت اعمال شده نباید تغییر کند
+MIGRATIONS = [
+    index_migration(
+        'db_0001_query_indexes',
+        Task.__table__, Comment.__table__, Analytics.__table__,
+        Notification.__table__, ChatMessage.__table__
+    ),
+    # صفحه‌بندی keyset روی (created_at, id) به id در انتهای ایندکس نیاز دارد
+    index_migration(
+        'db_0002_keyset_indexes',
+        Comment.__table__, ChatMessage.__table__,
+        replaces=('ix_comments_task_created', 'ix_chat_messages_group_created')
+    ),
+    Migration('db_0003_notification_counters', _backfill_notification_counters),
+    Migration('db_0004_task_rollups', _backfill_task_rollups),
+]
+
+# مدل‌های فقط‌خواندنی سبک؛ نام فیلدها همان نام ستون‌های جدول است
+class UserRow(NamedTuple):
+    id: str
+    username: str
+    role: str
+    created_at: datetime
+    last_active: Optional[datetime]
+    settings: Optional[dict]
+
+class TaskRow(NamedTuple):
+    id: str
+    title: str
+    description: Optional[str]
+    status: str
+    priority: str
+    created_at: datetime
+    updated_at: Optional[datetime]
+    completed_at: Optional[datetime]
+    estimated_duration: Optional[float]
+    actual_duration: Optional[float]
+    tags: Optional[str]
+    assignee_id: str
+
+class AnalyticsRow(NamedTuple):
+    id: str
+    task_id: str
+    created_at: datetime
+    data: Optional[dict]
+
+class CommentRow(NamedTuple):
+    id: str
+    task_id: str
+    user_id: str
+    content: str
+    created_at: datetime
+
+class NotificationRow(NamedTuple):
+    id: str
+    user_id: str
+    title: str
+    message: str
+    type: str
+    created_at: datetime
+    read: bool
+    action_data: Optional[dict]
+
+class ChatMessageRow(NamedTuple):
+    id: str
+    group_id: str
+    user_id: str
+    content: str
+    type: str
+    created_at: datetime
+    metadata: Optional[dict]
+
+class TaskRollupRow(NamedTuple):
+    user_id: str
+    priority: str
+    status: str
+    day: date
+    task_count: int
+    duration_sum: float
+    duration_count: int
+    delay_sum: float
+    delay_count: int
+    on_time_count: int
+    efficiency_sum: float
+    efficiency_count: int
+
+class Page(NamedTuple):
+    """یک صفحه از نتایج با نشانگرهای صفحه قدیمی‌تر و جدیدتر (None یعنی صفحه‌ای نیست)"""
+    items: list
+    older_cursor: Optional[str]
+    newer_cursor: Optional[str]
+
+def encode_cursor(row) -> str:
+    """ساخت نشانگر مات صفحه از (created_at, id) یک سطر"""
+    raw = f"{row.created_at.isoformat()}|{row.id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """بازگشایی نشانگر صفحه؛ در صورت نامعتبر بودن ValueError می‌دهد"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.split('|', 1)
+        return datetime.fromisoformat(created_at), row_id
+    except (UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"نشانگر صفحه نامعتبر است: {cursor}") from e
+
+def _select_row(model, row_type: Type[NamedTuple]):
+    """ساخت select فقط روی ستون‌های مورد نیاز مدل فقط‌خواندنی"""
+    columns = model.__table__.c
+    return select(*[columns[field] for field in row_type._fields])
+
+def _chunks(rows: List[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    """تقسیم سطرها به دسته‌های حداکثر size تایی"""
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+def engine_options(is_async: bool = False) -> Dict[str, Any]:
+    """تنظیمات مشترک استخر اتصال برای موتورهای همگام و ناهمگام"""
+    return {
+        'poolclass': AsyncAdaptedQueuePool if is_async else QueuePool,
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT
+    }
+
+def async_database_url(url: str) -> str:
+    """تبدیل آدرس دیتابیس به آدرس درایور ناهمگام متناظر"""
+    for prefix, async_prefix in (('sqlite://', 'sqlite+aiosqlite://'),
+                                 ('postgresql://', 'postgresql+asyncpg://')):
+        if url.startswith(prefix):
+            return async_prefix + url[len(prefix):]
+    return url
 
 class Database:
-    def __init__(self):
-        self.engine = create_engine(DATABASE_URL)
+    def __init__(self, engine=None, cache: Optional[TieredCache] = None):
+        self.engine = configure_sqlite(engine or create_engine(DATABASE_URL, **engine_options()))
         Base.metadata.create_all(self.engine)
+        run_migrations(self.engine, MIGRATIONS)
         self.Session = sessionmaker(bind=self.engine)
+        if cache is None:
+            cache = tiered_cache('db:', maxsize=DB_CACHE_SIZE, row_types=(UserRow, TaskRow, AnalyticsRow))
+        self.cache = cache
     
     def get_session(self):
         """دریافت یک جلسه دیتابیس جدید"""
@@ -120,13 +389,39 @@ class Database:
         finally:
             session.close()
     
-    def get_user(self, user_id: str) -> Optional[User]:
+    def _fetch_all(self, row_type: Type[NamedTuple], statement, connection=None) -> list:
+        """اجرای select و تبدیل نتیجه به مدل فقط‌خواندنی (در صورت نیاز روی اتصال تراکنش جاری)"""
+        if connection is not None:
+            return [row_type._make(row) for row in connection.execute(statement)]
+        with self.engine.connect() as connection:
+            return self._fetch_all(row_type, statement, connection)
+    
+    def _fetch_one(self, row_type: Type[NamedTuple], statement):
+        with self.engine.connect() as connection:
+            row = connection.execute(statement).first()
+        return row_type._make(row) if row is not None else None
+    
+    def _cached(self, key: str, load):
+        """خواندن از کش و در صورت نبودن، بارگذاری از دیتابیس و ذخیره در کش
+        
+        نتیجه خالی (None یا لیست خالی) کش نمی‌شود تا درج‌های بعدی نیازی به باطل کردن نداشته باشند.
+        """
+        value = self.cache.get(key)
+        if value is None:
+            value = load()
+            if value:
+                self.cache.set(key, value)
+        return value
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """آمار برخورد کش خواندن"""
+        return self.cache.get_stats()
+    
+    def get_user(self, user_id: str) -> Optional[UserRow]:
         """دریافت کاربر با شناسه"""
-        session = self.get_session()
-        try:
-            return session.query(User).filter(User.id == user_id).first()
-        finally:
-            session.close()
+        return self._cached(f'user:{user_id}', lambda: self._fetch_one(
+            UserRow, _select_row(User, UserRow).where(User.id == user_id)
+        ))
     
     def add_task(self, task_id: str, title: str, description: str, assignee_id: str,
                  priority: str = 'medium', estimated_duration: float = None) -> Task:
@@ -143,29 +438,38 @@ class Database:
                 status='pending'
             )
             session.add(task)
+            session.flush()
+            deltas: Dict[tuple, Dict[str, float]] = {}
+            _add_task_rollup(deltas, task)
+            _apply_task_rollups(session, self.engine.dialect.name, deltas)
             session.commit()
             return task
         finally:
             session.close()
     
-    def get_task(self, task_id: str) -> Optional[Task]:
+    def get_task(self, task_id: str) -> Optional[TaskRow]:
         """دریافت وظیفه با شناسه"""
-        session = self.get_session()
-        try:
-            return session.query(Task).filter(Task.id == task_id).first()
-        finally:
-            session.close()
+        return self._cached(f'task:{task_id}', lambda: self._fetch_one(
+            TaskRow, _select_row(Task, TaskRow).where(Task.id == task_id)
+        ))
     
     def update_task_status(self, task_id: str, status: str) -> bool:
         """به‌روزرسانی وضعیت وظیفه"""
         session = self.get_session()
         try:
-            task = session.query(Task).filter(Task.id == task_id).first()
+            # قفل تا تغییر همزمان وضعیت، سهم وضعیت قبلی را دو بار از جدول تجمیعی کم نکند
+            _begin_rollup_write(session, self.engine.dialect.name)
+            task = session.query(Task).filter(Task.id == task_id).with_for_update().first()
             if task:
+                deltas: Dict[tuple, Dict[str, float]] = {}
+                _add_task_rollup(deltas, task, -1)
                 task.status = status
                 if status == 'completed':
                     task.completed_at = datetime.now()
+                _add_task_rollup(deltas, task)
+                _apply_task_rollups(session, self.engine.dialect.name, deltas)
                 session.commit()
+                self.cache.invalidate(f'task:{task_id}')
                 return True
             return False
         finally:
@@ -183,17 +487,49 @@ class Database:
             )
             session.add(comment)
             session.commit()
+            self.cache.invalidate(f'task:{task_id}')
             return comment
         finally:
             session.close()
     
-    def get_task_comments(self, task_id: str) -> List[Comment]:
-        """دریافت نظرات یک وظیفه"""
-        session = self.get_session()
-        try:
-            return session.query(Comment).filter(Comment.task_id == task_id).all()
-        finally:
-            session.close()
+    def _keyset_page(self, model, row_type: Type[NamedTuple], condition, cursor: Optional[str],
+                     direction: str, limit: int, newest_first: bool) -> Page:
+        """واکشی یک صفحه با صفحه‌بندی keyset روی (created_at, id)؛ هزینه هر صفحه مستقل از عمق آن است"""
+        if direction not in ('older', 'newer'):
+            raise ValueError(f"جهت نامعتبر: {direction}")
+        columns = model.__table__.c
+        key = tuple_(columns.created_at, columns.id)
+        statement = _select_row(model, row_type).where(condition)
+        if cursor is not None:
+            position = tuple_(*decode_cursor(cursor))
+            statement = statement.where(key < position if direction == 'older' else key > position)
+        if direction == 'older':
+            statement = statement.order_by(columns.created_at.desc(), columns.id.desc())
+        else:
+            statement = statement.order_by(columns.created_at.asc(), columns.id.asc())
+        
+        rows = self._fetch_all(row_type, statement.limit(limit + 1))
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if direction == 'newer':
+            rows.reverse()
+        
+        # rows اکنون از جدید به قدیم است؛ سمت مقابل جهت حرکت فقط وقتی هست که از نشانگر آمده باشیم
+        has_older = has_more if direction == 'older' else cursor is not None
+        has_newer = has_more if direction == 'newer' else cursor is not None
+        older_cursor = encode_cursor(rows[-1]) if rows and has_older else None
+        newer_cursor = encode_cursor(rows[0]) if rows and has_newer else None
+        if not newest_first:
+            rows.reverse()
+        return Page(rows, older_cursor, newer_cursor)
+    
+    def get_task_comments(self, task_id: str, limit: int = COMMENTS_PAGE_SIZE,
+                          cursor: Optional[str] = None, direction: str = 'newer') -> Page:
+        """دریافت یک صفحه از نظرات یک وظیفه به ترتیب زمان؛ صفحه اول قدیمی‌ترین نظرات است"""
+        return self._keyset_page(
+            Comment, CommentRow, Comment.task_id == task_id,
+            cursor, direction, limit, newest_first=False
+        )
     
     def add_analytics(self, analytics_id: str, task_id: str, data: dict) -> Analytics:
         """افزودن داده‌های تحلیلی"""
@@ -206,17 +542,17 @@ class Database:
             )
             session.add(analytics)
             session.commit()
+            self.cache.invalidate(f'analytics:{task_id}')
             return analytics
         finally:
             session.close()
     
-    def get_task_analytics(self, task_id: str) -> List[Analytics]:
+    def get_task_analytics(self, task_id: str) -> List[AnalyticsRow]:
         """دریافت داده‌های تحلیلی یک وظیفه"""
-        session = self.get_session()
-        try:
-            return session.query(Analytics).filter(Analytics.task_id == task_id).all()
-        finally:
-            session.close()
+        return self._cached(f'analytics:{task_id}', lambda: self._fetch_all(
+            AnalyticsRow, _select_row(Analytics, AnalyticsRow)
+            .where(Analytics.task_id == task_id).order_by(Analytics.created_at)
+        ))
     
     def add_notification(self, notification_id: str, user_id: str, title: str,
                         message: str, notification_type: str, action_data: dict = None) -> Notification:
@@ -232,21 +568,71 @@ class Database:
                 action_data=action_data
             )
             session.add(notification)
+            self._add_unread(session, {user_id: 1})
             session.commit()
             return notification
         finally:
             session.close()
     
-    def get_user_notifications(self, user_id: str, unread_only: bool = False) -> List[Notification]:
+    def _add_unread(self, executor, deltas: Dict[str, int]) -> None:
+        """افزودن تغییرات به شمارنده خوانده نشده‌ها در تراکنش جاری (session یا connection)"""
+        rows = [{'user_id': user_id, 'unread': delta} for user_id, delta in deltas.items() if user_id and delta]
+        if not rows:
+            return
+        dialect_insert = postgresql_insert if self.engine.dialect.name == 'postgresql' else sqlite_insert
+        statement = dialect_insert(NotificationCounter.__table__)
+        statement = statement.on_conflict_do_update(
+            index_elements=['user_id'],
+            set_={'unread': NotificationCounter.__table__.c.unread + statement.excluded.unread}
+        )
+        executor.execute(statement, rows)
+    
+    def get_unread_count(self, user_id: str) -> int:
+        """تعداد اعلان‌های خوانده نشده کاربر با یک جستجوی کلید اصلی"""
+        with self.engine.connect() as connection:
+            unread = connection.execute(
+                select(NotificationCounter.unread).where(NotificationCounter.user_id == user_id)
+            ).scalar()
+        return unread or 0
+    
+    def _mark_read(self, user_id: str, condition) -> int:
+        notifications = Notification.__table__
+        with self.engine.begin() as connection:
+            changed = connection.execute(
+                update(notifications)
+                .where(notifications.c.user_id == user_id, notifications.c.read == False, condition)
+                .values(read=True)
+            ).rowcount
+            self._add_unread(connection, {user_id: -changed})
+        return changed
+    
+    def mark_notifications_read(self, user_id: str, notification_ids: List[str]) -> int:
+        """علامت‌گذاری اعلان‌های مشخص شده کاربر به عنوان خوانده شده"""
+        if not notification_ids:
+            return 0
+        return self._mark_read(user_id, Notification.__table__.c.id.in_(notification_ids))
+    
+    def mark_notifications_read_range(self, user_id: str, first_cursor: str, last_cursor: str) -> int:
+        """علامت‌گذاری اعلان‌های کاربر بین دو نشانگر (شامل هر دو) به عنوان خوانده شده
+        
+        بازه مثل صفحه‌بندی keyset روی (created_at, id) است نه مقایسه رشته‌ای شناسه‌ها؛
+        نشانگرها با encode_cursor از سطرهای ابتدا و انتهای بازه ساخته می‌شوند و ترتیبشان مهم نیست.
+        """
+        lower, upper = sorted((decode_cursor(first_cursor), decode_cursor(last_cursor)))
+        columns = Notification.__table__.c
+        key = tuple_(columns.created_at, columns.id)
+        return self._mark_read(user_id, and_(key >= tuple_(*lower), key <= tuple_(*upper)))
+    
+    def mark_all_notifications_read(self, user_id: str) -> int:
+        """علامت‌گذاری همه اعلان‌های کاربر به عنوان خوانده شده"""
+        return self._mark_read(user_id, true())
+    
+    def get_user_notifications(self, user_id: str, unread_only: bool = False) -> List[NotificationRow]:
         """دریافت اعلان‌های کاربر"""
-        session = self.get_session()
-        try:
-            query = session.query(Notification).filter(Notification.user_id == user_id)
-            if unread_only:
-                query = query.filter(Notification.read == False)
-            return query.all()
-        finally:
-            session.close()
+        statement = _select_row(Notification, NotificationRow).where(Notification.user_id == user_id)
+        if unread_only:
+            statement = statement.where(Notification.read == False)
+        return self._fetch_all(NotificationRow, statement)
     
     def create_chat_group(self, group_id: str, name: str, task_id: str = None,
                          members: List[str] = None) -> ChatGroup:
@@ -276,7 +662,7 @@ class Database:
                 user_id=user_id,
                 content=content,
                 type=message_type,
-                metadata=metadata
+                message_metadata=metadata
             )
             session.add(message)
             session.commit()
@@ -284,14 +670,186 @@ class Database:
         finally:
             session.close()
     
-    def get_group_messages(self, group_id: str, limit: int = 50) -> List[ChatMessage]:
-        """دریافت پیام‌های گروه"""
-        session = self.get_session()
-        try:
-            return session.query(ChatMessage)\
-                .filter(ChatMessage.group_id == group_id)\
-                .order_by(ChatMessage.created_at.desc())\
-                .limit(limit)\
-                .all()
-        finally:
-            session.close() 
\ No newline at end of file
+    def get_group_messages(self, group_id: str, limit: int = 50,
+                           cursor: Optional[str] = None, direction: str = 'older') -> Page:
+        """دریافت یک صفحه از پیام‌های گروه از جدید به قدیم؛ صفحه اول جدیدترین پیام‌هاست"""
+        return self._keyset_page(
+            ChatMessage, ChatMessageRow, ChatMessage.group_id == group_id,
+            cursor, direction, limit, newest_first=True
+        ) 
+    
+    def _bulk_insert(self, model, rows: List[Dict[str, Any]], chunk_size: int, connection=None) -> int:
+        """درج گروهی سطرها با executemany در یک تراکنش (یا در تراکنش connection داده شده)"""
+        if not rows:
+            return 0
+        if connection is None:
+            with self.engine.begin() as connection:
+                return self._bulk_insert(model, rows, chunk_size, connection)
+        statement = insert(model.__table__)
+        for chunk in _chunks(rows, chunk_size):
+            connection.execute(statement, chunk)
+        return len(rows)
+    
+    def add_tasks_bulk(self, tasks: Iterable[Dict[str, Any]], chunk_size: int = BULK_CHUNK_SIZE) -> int:
+        """افزودن گروهی وظایف؛ هر مورد شامل id، title و assignee_id است"""
+        now = datetime.now()
+        rows = [{
+            'id': task['id'],
+            'title': task['title'],
+            'description': task.get('description'),
+            'assignee_id': task['assignee_id'],
+            'priority': task.get('priority', 'medium'),
+            'estimated_duration': task.get('estimated_duration'),
+            'tags': task.get('tags'),
+            'status': 'pending',
+            'created_at': task.get('created_at', now)
+        } for task in tasks]
+        deltas: Dict[tuple, Dict[str, float]] = {}
+        for row in rows:
+            _add_task_rollup(deltas, TaskRow(**{field: row.get(field) for field in TaskRow._fields}))
+        with self.engine.begin() as connection:
+            count = self._bulk_insert(Task, rows, chunk_size, connection)
+            _apply_task_rollups(connection, self.engine.dialect.name, deltas)
+        return count
+    
+    def add_notifications_bulk(self, notifications: Iterable[Dict[str, Any]],
+                               chunk_size: int = BULK_CHUNK_SIZE) -> int:
+        """افزودن گروهی اعلان‌ها؛ هر مورد شامل id، user_id، title، message و type است"""
+        now = datetime.now()
+        rows = [{
+            'id': notification['id'],
+            'user_id': notification['user_id'],
+            'title': notification['title'],
+            'message': notification['message'],
+            'type': notification['type'],
+            'action_data': notification.get('action_data'),
+            'read': False,
+            'created_at': now
+        } for notification in notifications]
+        with self.engine.begin() as connection:
+            self._bulk_insert(Notification, rows, chunk_size, connection)
+            self._add_unread(connection, Counter(row['user_id'] for row in rows))
+        return len(rows)
+    
+    def add_chat_messages_bulk(self, messages: Iterable[Dict[str, Any]],
+                               chunk_size: int = BULK_CHUNK_SIZE) -> int:
+        """افزودن گروهی پیام‌های چت؛ هر مورد شامل id، group_id، user_id و content است"""
+        now = datetime.now()
+        rows = [{
+            'id': message['id'],
+            'group_id': message['group_id'],
+            'user_id': message['user_id'],
+            'content': message['content'],
+            'type': message.get('type', 'text'),
+            'metadata': message.get('metadata'),
+            'created_at': message.get('created_at', now)
+        } for message in messages]
+        return self._bulk_insert(ChatMessage, rows, chunk_size)
+    
+    def _status_rollup_deltas(self, connection, completed: List[Dict[str, str]], others: List[Dict[str, str]],
+                              now: datetime, chunk_size: int) -> Dict[tuple, Dict[str, float]]:
+        """تغییرات جدول تجمیعی برای به‌روزرسانی گروهی وضعیت‌ها، به همان ترتیب اجرای دستورها
+        
+        سطرهای خوانده شده تا پایان تراکنش قفل می‌مانند (روی SQLite کل دیتابیس، با _begin_rollup_write)
+        تا وضعیت قبلی تا اعمال تغییرات معتبر باشد.
+        """
+        ids = list(dict.fromkeys(row['task_id'] for row in completed + others))
+        current = {}
+        for chunk in _chunks(ids, chunk_size):
+            statement = _select_row(Task, TaskRow).where(Task.id.in_(chunk)).with_for_update()
+            for task in self._fetch_all(TaskRow, statement, connection):
+                current[task.id] = task
+        
+        deltas: Dict[tuple, Dict[str, float]] = {}
+        for task in current.values():
+            _add_task_rollup(deltas, task, -1)
+        for row in completed:
+            if row['task_id'] in current:
+                current[row['task_id']] = current[row['task_id']]._replace(status=row['new_status'], completed_at=now)
+        for row in others:
+            if row['task_id'] in current:
+                current[row['task_id']] = current[row['task_id']]._replace(status=row['new_status'])
+        for task in current.values():
+            _add_task_rollup(deltas, task)
+        return deltas
+    
+    def get_task_rollups(self, since: Optional[date] = None) -> List[TaskRollupRow]:
+        """گروه‌های غیرخالی جدول تجمیعی وظایف، در صورت نیاز فقط از روز since به بعد"""
+        statement = _select_row(TaskRollup, TaskRollupRow).where(TaskRollup.task_count > 0)
+        if since is not None:
+            statement = statement.where(TaskRollup.day >= since)
+        return self._fetch_all(TaskRollupRow, statement)
+    
+    def update_task_statuses_bulk(self, updates: Iterable[Tuple[str, str]],
+                                  chunk_size: int = BULK_CHUNK_SIZE) -> int:
+        """به‌روزرسانی گروهی وضعیت وظایف از روی جفت‌های (شناسه وظیفه، وضعیت)؛ تعداد سطرهای تغییر یافته را برمی‌گرداند"""
+        now = datetime.now()
+        completed, others = [], []
+        for task_id, status in updates:
+            row = {'task_id': task_id, 'new_status': status}
+            (completed if status == 'completed' else others).append(row)
+        
+        condition = Task.__table__.c.id == bindparam('task_id')
+        statements = [
+            (update(Task.__table__).where(condition)
+             .values(status=bindparam('new_status'), completed_at=now, updated_at=now), completed),
+            (update(Task.__table__).where(condition)
+             .values(status=bindparam('new_status'), updated_at=now), others)
+        ]
+        updated = 0
+        with self.engine.begin() as connection:
+            _begin_rollup_write(connection, self.engine.dialect.name)
+            deltas = self._status_rollup_deltas(connection, completed, others, now, chunk_size)
+            for statement, rows in statements:
+                for chunk in _chunks(rows, chunk_size):
+                    updated += connection.execute(statement, chunk).rowcount
+            _apply_task_rollups(connection, self.engine.dialect.name, deltas)
+        for rows in (completed, others):
+            for row in rows:
+                self.cache.invalidate(f"task:{row['task_id']}")
+        return updated
+
+class AsyncDatabase:
+    """نسخه ناهمگام Database با همان متدها روی درایور ناهمگام (مثلاً aiosqlite)
+    
+    هر متد همان پیاده‌سازی Database را داخل greenlet اجرا می‌کند؛ ورودی/خروجی
+    دیتابیس به جای مسدود کردن حلقه رویداد، روی درایور ناهمگام await می‌شود.
+    """
+    
+    def __init__(self, url: Optional[str] = None):
+        self.engine = create_async_engine(
+            url or async_database_url(DATABASE_URL), **engine_options(is_async=True)
+        )
+        self._database: Optional[Database] = None
+    
+    async def initialize(self) -> 'AsyncDatabase':
+        """ساخت جداول و اجرای مهاجرت‌ها؛ پیش از اولین استفاده فراخوانی شود"""
+        if self._database is None:
+            # کش Redis همگام است و داخل greenlet حلقه رویداد را مسدود می‌کند؛ اینجا فقط کش محلی
+            cache = TieredCache(TTLCache(maxsize=DB_CACHE_SIZE))
+            self._database = await greenlet_spawn(Database, self.engine.sync_engine, cache)
+        return self
+    
+    async def close(self) -> None:
+        await self.engine.dispose()
+    
+    async def _run(self, method: str, *args, **kwargs):
+        if self._database is None:
+            await self.initialize()
+        return await greenlet_spawn(getattr(self._database, method), *args, **kwargs)
+
+def _async_method(name: str):
+    method = getattr(Database, name)
+    
+    async def wrapper(self, *args, **kwargs):
+        return await self._run(name, *args, **kwargs)
+    
+    wrapper.__name__ = name
+    wrapper.__qualname__ = f'AsyncDatabase.{name}'
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+# همه متدهای عمومی Database به جز get_session که مخصوص مسیر همگام است
+for _name in dir(Database):
+    if not _name.startswith('_') and _name != 'get_session' and callable(getattr(Database, _name)):
+        setattr(AsyncDatabase, _name, _async_method(_name))
\ No newline at end of file
@@ -0,0 +1,135 @@
+import enum
+import re
+import tempfile
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Sequence
+from config import *
+from jalali import format_jalali
+
+# پسوند فایل خروجی برای هر قالب REPORT_FORMATS
+EXPORT_EXTENSIONS = {'pdf': 'pdf', 'excel': 'xlsx'}
+
+def export_cell(value: Any) -> Any:
+    """تبدیل مقدار سطر به مقدار قابل نمایش در گزارش (enum به متن و تاریخ به شمسی)"""
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (date, datetime)):
+        return format_jalali(value)
+    return value
+
+def write_xlsx(rows: Iterable[Sequence[Any]], headers: Sequence[str], output: BinaryIO, title: str) -> int:
+    """نوشتن سطرها در فایل Excel در حالت write-only؛ هر سطر بلافاصله روی دیسک نوشته می‌شود"""
+    from openpyxl import Workbook
+    
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=title[:31])
+    sheet.sheet_view.rightToLeft = True
+    sheet.append(list(headers))
+    count = 0
+    for row in rows:
+        sheet.append([export_cell(value) for value in row])
+        count += 1
+    workbook.save(output)
+    return count
+
+# لام آغازی/میانی و الف پایانی (ساده، مد، همزه بالا، همزه پایین) به فرم لیگاتور لا
+_LAM_ALEF = re.compile('([\uFEDF\uFEE0])([\uFE8E\uFE82\uFE84\uFE88])')
+_LAM_ALEF_FORMS = {'\uFE8E': 0xFEFB, '\uFE82': 0xFEF5, '\uFE84': 0xFEF7, '\uFE88': 0xFEF9}
+
+def _lam_alef(match: 're.Match') -> str:
+    # فرم تنها برای لام آغازی و فرم پایانی (کد بعدی) برای لام میانی
+    return chr(_LAM_ALEF_FORMS[match.group(2)] + (match.group(1) == '\uFEE0'))
+
+@lru_cache(maxsize=1)
+def _reshaper():
+    from arabic_reshaper import ArabicReshaper
+    
+    # با لیگاتورهای فعال، arabic_reshaper الگوی همه لیگاتورها را در هر فراخوانی دوباره می‌سازد
+    # (چند میلی‌ثانیه برای هر خانه)؛ لیگاتور لا که در فارسی لازم است در _shape اعمال می‌شود
+    return ArabicReshaper(configuration={'support_ligatures': False})
+
+@lru_cache(maxsize=EXPORT_SHAPE_CACHE_SIZE)
+def _shape(text: str) -> str:
+    """اتصال حروف و ترتیب راست به چپ متن فارسی برای رسم در PDF"""
+    from bidi.algorithm import get_display
+    
+    return get_display(_LAM_ALEF.sub(_lam_alef, _reshaper().reshape(text)))
+
+def write_pdf(rows: Iterable[Sequence[Any]], headers: Sequence[str], output: BinaryIO, title: str) -> int:
+    """رسم سطرها در PDF جدولی راست به چپ صفحه به صفحه
+    
+    reportlab محتوای صفحه‌ها را تا پایان در حافظه نگه می‌دارد، پس حداکثر
+    EXPORT_PDF_MAX_ROWS سطر رسم می‌شود و برای خروجی کامل باید Excel را انتخاب کرد.
+    """
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+    
+    if not PDF_REPORTS_ENABLED:
+        raise ValueError(f"فونت فارسی PDF در {REPORT_FONT_PATH!r} پیدا نشد")
+    font = 'ReportFont'
+    pdfmetrics.registerFont(TTFont(font, REPORT_FONT_PATH))
+    
+    width, height = landscape(A4)
+    margin, line_height, font_size = 30, 16, 8
+    column_width = (width - 2 * margin) / len(headers)
+    max_chars = int(column_width / (font_size * 0.55))
+    
+    pdf = canvas.Canvas(output, pagesize=(width, height), pageCompression=1)
+    pdf.setTitle(title)
+    
+    def draw_row(values: Sequence[Any], y: float) -> None:
+        # ستون اول در سمت راست صفحه قرار می‌گیرد
+        for index, value in enumerate(values):
+            text = '' if value is None else str(value)
+            if len(text) > max_chars:
+                text = text[:max_chars - 1] + '…'
+            x = width - margin - index * column_width - 2
+            pdf.drawRightString(x, y, _shape(text))
+    
+    def new_page() -> float:
+        pdf.setFont(font, font_size + 4)
+        pdf.drawRightString(width - margin, height - margin, _shape(title))
+        pdf.setFont(font, font_size)
+        y = height - margin - 2 * line_height
+        draw_row(headers, y)
+        pdf.line(margin, y - 4, width - margin, y - 4)
+        return y - line_height
+    
+    y = new_page()
+    count = 0
+    for row in rows:
+        if y < margin:
+            pdf.showPage()
+            y = new_page()
+        if count == EXPORT_PDF_MAX_ROWS:
+            pdf.drawRightString(width - margin, y, _shape(
+                f'فقط {EXPORT_PDF_MAX_ROWS} سطر اول نمایش داده شده است؛ برای گزارش کامل قالب Excel را انتخاب کنید.'
+            ))
+            break
+        draw_row([export_cell(value) for value in row], y)
+        y -= line_height
+        count += 1
+    pdf.save()
+    return count
+
+WRITERS: Dict[str, Callable[..., int]] = {'excel': write_xlsx, 'pdf': write_pdf}
+
+def export_rows(rows: Iterable[Sequence[Any]], headers: Sequence[str],
+                report_format: str = DEFAULT_REPORT_FORMAT, title: str = 'گزارش'):
+    """نوشتن گزارش در یک فایل موقت که بالای EXPORT_SPOOL_SIZE به دیسک منتقل می‌شود
+    
+    فایل برگشتی از ابتدا قابل خواندن است و پس از بستن حذف می‌شود.
+    """
+    if report_format not in REPORT_FORMATS:
+        raise ValueError(f"قالب گزارش نامعتبر: {report_format}")
+    output = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE)
+    try:
+        WRITERS[report_format](rows, headers, output, title)
+    except Exception:
+        output.close()
+        raise
+    output.seek(0)
+    return output
@@ -0,0 +1,70 @@
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Tuple, Union, TYPE_CHECKING
+import jdatetime
+from config import *
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+DateLike = Union[date, datetime]
+
+@lru_cache(maxsize=JALALI_CACHE_SIZE)
+def jalali_ymd(gregorian: date) -> Tuple[int, int, int]:
+    """تبدیل یک روز میلادی به (سال، ماه، روز) شمسی با کش"""
+    jalali = jdatetime.date.fromgregorian(date=gregorian)
+    return jalali.year, jalali.month, jalali.day
+
+def format_jalali(value: DateLike, with_time: bool = False) -> str:
+    """نمایش تاریخ شمسی به فرمت YYYY/MM/DD و در صورت نیاز HH:MM"""
+    day = value.date() if isinstance(value, datetime) else value
+    year, month, day_of_month = jalali_ymd(day)
+    text = f'{year:04d}/{month:02d}/{day_of_month:02d}'
+    if with_time and isinstance(value, datetime):
+        text += f' {value.hour:02d}:{value.minute:02d}'
+    return text
+
+def jalali_parts(values) -> Tuple['np.ndarray', 'np.ndarray', 'np.ndarray']:
+    """تبدیل برداری آرایه یا سری تاریخ‌ها به آرایه‌های سال، ماه و روز شمسی
+    
+    هر روز یکتا فقط یک بار تبدیل می‌شود و نتیجه با اندیس‌گذاری آرایه‌ای
+    به همه سطرها گسترش می‌یابد؛ مقادیر خالی به صفر تبدیل می‌شوند.
+    """
+    import numpy as np
+    import pandas as pd
+    
+    days = pd.to_datetime(pd.Series(values)).to_numpy(dtype='datetime64[ns]').astype('datetime64[D]')
+    missing = np.isnat(days)
+    unique_days, inverse = np.unique(days[~missing], return_inverse=True)
+    
+    table = np.zeros((len(unique_days), 3), dtype=np.int32)
+    for i, day in enumerate(unique_days.astype(date)):
+        table[i] = jalali_ymd(day)
+    
+    parts = np.zeros((len(days), 3), dtype=np.int32)
+    parts[~missing] = table[inverse]
+    return parts[:, 0], parts[:, 1], parts[:, 2]
+
+def jalali_period(values, freq: str = 'day') -> 'pd.Series':
+    """کلید دوره شمسی (روز YYYY/MM/DD یا ماه YYYY/MM) برای گروه‌بندی"""
+    import numpy as np
+    import pandas as pd
+    
+    series = pd.Series(values)
+    years, months, days = jalali_parts(series)
+    if freq == 'month':
+        keys = years * 100 + months
+        label = lambda key: f'{key // 100:04d}/{key % 100:02d}'
+    elif freq == 'day':
+        keys = (years * 100 + months) * 100 + days
+        label = lambda key: f'{key // 10000:04d}/{key // 100 % 100:02d}/{key % 100:02d}'
+    else:
+        raise ValueError(f"دوره نامعتبر: {freq}")
+    
+    # ساخت رشته فقط برای کلیدهای یکتا و گسترش آن با اندیس‌گذاری
+    present = years > 0
+    unique_keys = np.unique(keys[present])
+    labels = np.array([label(key) for key in unique_keys] + [None], dtype=object)
+    codes = np.where(present, np.searchsorted(unique_keys, keys), len(unique_keys))
+    return pd.Series(labels[codes], index=series.index)
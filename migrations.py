@@ -0,0 +1,106 @@
+import logging
+from datetime import datetime
+from typing import Callable, Iterable, NamedTuple
+from sqlalchemy import event, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import CreateTable, Table
+from config import *
+
+logger = logging.getLogger(__name__)
+
+class Migration(NamedTuple):
+    """یک مهاجرت نام‌گذاری شده که فقط یک بار روی هر دیتابیس اجرا می‌شود"""
+    name: str
+    upgrade: Callable[[Connection], None]
+
+def configure_sqlite(engine: Engine) -> Engine:
+    """اعمال تنظیمات کارایی SQLite روی هر اتصال جدید"""
+    if engine.dialect.name != 'sqlite':
+        return engine
+    
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute('PRAGMA synchronous=NORMAL')
+            cursor.execute(f'PRAGMA busy_timeout={int(SQLITE_BUSY_TIMEOUT)}')
+            cursor.execute(f'PRAGMA mmap_size={int(SQLITE_MMAP_SIZE)}')
+            cursor.execute(f'PRAGMA cache_size={int(SQLITE_CACHE_SIZE)}')
+            cursor.execute('PRAGMA temp_store=MEMORY')
+        finally:
+            cursor.close()
+    
+    return engine
+
+def index_migration(name: str, *tables: Table, replaces: Iterable[str] = ()) -> Migration:
+    """مهاجرتی که ایندکس‌های تعریف شده روی جداول را در صورت نبودن می‌سازد
+    
+    ایندکس‌های نام برده شده در replaces پیش از ساخت حذف می‌شوند.
+    """
+    replaced = tuple(replaces)
+    
+    def upgrade(connection: Connection) -> None:
+        for index_name in replaced:
+            connection.execute(text(f'DROP INDEX IF EXISTS {index_name}'))
+        for table in tables:
+            for index in sorted(table.indexes, key=lambda i: i.name):
+                index.create(connection, checkfirst=True)
+    return Migration(name, upgrade)
+
+def rebuild_sqlite_table(connection: Connection, table: Table) -> bool:
+    """بازسازی یک جدول SQLite موجود با تعریف فعلی آن (مثلاً برای افزودن AUTOINCREMENT)
+    
+    سطرها با همان شناسه کپی می‌شوند و ایندکس‌ها و تریگرهای جدول قدیمی دوباره ساخته می‌شوند.
+    اگر جدول وجود نداشته باشد False برمی‌گردد.
+    """
+    exists = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table.name,)
+    ).scalar()
+    if not exists:
+        return False
+    
+    dependents = list(connection.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE tbl_name = ? AND type IN ('index', 'trigger') "
+        "AND sql IS NOT NULL ORDER BY type", (table.name,)
+    ).scalars())
+    existing = {row[1] for row in connection.exec_driver_sql(f'PRAGMA table_info({table.name})')}
+    names = ', '.join(c.name for c in table.columns if c.name in existing)
+    
+    # بدون حالت قدیمی، تغییر نام نماهای موقت all_* را که به این جدول اشاره می‌کنند بررسی و رد می‌کند
+    connection.exec_driver_sql('PRAGMA legacy_alter_table=ON')
+    try:
+        connection.exec_driver_sql(f'ALTER TABLE {table.name} RENAME TO _rebuild_{table.name}')
+        connection.exec_driver_sql(str(CreateTable(table).compile(dialect=connection.dialect)))
+        connection.exec_driver_sql(
+            f'INSERT INTO {table.name} ({names}) SELECT {names} FROM _rebuild_{table.name}'
+        )
+        connection.exec_driver_sql(f'DROP TABLE _rebuild_{table.name}')
+        for statement in dependents:
+            connection.exec_driver_sql(statement)
+    finally:
+        connection.exec_driver_sql('PRAGMA legacy_alter_table=OFF')
+    return True
+
+def run_migrations(engine: Engine, migrations: Iterable[Migration]) -> int:
+    """اجرای مهاجرت‌های اجرا نشده به ترتیب؛ هر مهاجرت در تراکنش خودش ثبت می‌شود"""
+    with engine.begin() as connection:
+        connection.execute(text(
+            'CREATE TABLE IF NOT EXISTS schema_migrations ('
+            'name VARCHAR PRIMARY KEY, applied_at TIMESTAMP NOT NULL)'
+        ))
+        applied = set(connection.execute(text('SELECT name FROM schema_migrations')).scalars())
+    
+    count = 0
+    for migration in migrations:
+        if migration.name in applied:
+            continue
+        with engine.begin() as connection:
+            migration.upgrade(connection)
+            connection.execute(
+                text('INSERT INTO schema_migrations (name, applied_at) VALUES (:name, :applied_at)'),
+                {'name': migration.name, 'applied_at': datetime.now()}
+            )
+        logger.info("مهاجرت %s اعمال شد", migration.name)
+        count += 1
+    return count
@@ -0,0 +1,154 @@
+import asyncio
+import hashlib
+import logging
+import pickle
+import sqlite3
+from threading import Lock
+from time import time
+from typing import Dict, Iterable, Optional, Set
+from telegram import Update
+from telegram.ext import Application, ContextTypes, TypeHandler
+from config import *
+
+logger = logging.getLogger(__name__)
+
+class ConversationStore:
+    """ذخیره‌ساز وضعیت گفتگوی کاربران در SQLite با حالت WAL"""
+
+    def __init__(self, path: str = STATE_DB_PATH):
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = Lock()
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS conversation_state ('
+                'user_id INTEGER PRIMARY KEY, data BLOB NOT NULL, updated_at REAL NOT NULL)'
+            )
+
+    def load(self, user_id: int) -> Optional[bytes]:
+        """خواندن وضعیت ذخیره شده یک کاربر"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT data FROM conversation_state WHERE user_id = ?', (user_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def write(self, changed: Dict[int, bytes], removed: Iterable[int]) -> None:
+        """ثبت تغییرات چند کاربر در یک تراکنش"""
+        now = time()
+        with self._lock:
+            self._conn.execute('BEGIN')
+            try:
+                self._conn.executemany(
+                    'INSERT INTO conversation_state (user_id, data, updated_at) VALUES (?, ?, ?) '
+                    'ON CONFLICT(user_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at',
+                    [(user_id, data, now) for user_id, data in changed.items()]
+                )
+                self._conn.executemany(
+                    'DELETE FROM conversation_state WHERE user_id = ?',
+                    [(user_id,) for user_id in removed]
+                )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+class ConversationPersistence:
+    """بارگذاری تنبل و ذخیره تجمیعی context.user_data هر کاربر"""
+
+    def __init__(self, store: Optional[ConversationStore] = None,
+                 flush_interval: float = STATE_FLUSH_INTERVAL):
+        self.store = store or ConversationStore()
+        self.flush_interval = flush_interval
+        self._loaded: Set[int] = set()
+        self._dirty: Set[int] = set()
+        # هش آخرین وضعیت ذخیره شده برای جلوگیری از نوشتن داده‌های تکراری
+        self._saved: Dict[int, str] = {}
+        self._application: Optional[Application] = None
+        self._flush_lock = asyncio.Lock()
+        self.stats = {'loaded': 0, 'restored': 0, 'flushes': 0, 'written': 0}
+
+    def register(self, application: Application) -> None:
+        """افزودن هندلرهای بارگذاری (پیش از همه) و علامت‌گذاری (پس از همه) به برنامه"""
+        self._application = application
+        application.add_handler(TypeHandler(Update, self._load_user_state), group=-1)
+        application.add_handler(TypeHandler(Update, self._mark_dirty), group=1)
+
+    async def _load_user_state(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        user = update.effective_user
+        if user is None or user.id in self._loaded:
+            return
+        data = await asyncio.to_thread(self.store.load, user.id)
+        self._loaded.add(user.id)
+        self.stats['loaded'] += 1
+        if data is None:
+            return
+        try:
+            state = pickle.loads(data)
+        except Exception:
+            logger.warning("وضعیت ذخیره شده کاربر %s قابل بازیابی نیست", user.id)
+            return
+        self._saved[user.id] = hashlib.sha1(data).hexdigest()
+        context.user_data.update(state)
+        self.stats['restored'] += 1
+
+    async def _mark_dirty(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if update.effective_user is not None:
+            self._dirty.add(update.effective_user.id)
+
+    async def flush(self) -> None:
+        """نوشتن وضعیت کاربران تغییر یافته در یک تراکنش"""
+        if not self._dirty or self._application is None:
+            return
+        async with self._flush_lock:
+            dirty, self._dirty = self._dirty, set()
+            changed: Dict[int, bytes] = {}
+            removed = []
+            for user_id in dirty:
+                state = self._application.user_data.get(user_id)
+                if not state:
+                    if self._saved.pop(user_id, None) is not None:
+                        removed.append(user_id)
+                    continue
+                data = pickle.dumps(dict(state), protocol=pickle.HIGHEST_PROTOCOL)
+                digest = hashlib.sha1(data).hexdigest()
+                if self._saved.get(user_id) != digest:
+                    changed[user_id] = data
+                    self._saved[user_id] = digest
+            if not changed and not removed:
+                return
+            try:
+                await asyncio.to_thread(self.store.write, changed, removed)
+            except Exception:
+                # بازگرداندن کاربران به فهرست تغییرات تا در دور بعد دوباره نوشته شوند
+                for user_id in changed:
+                    self._saved.pop(user_id, None)
+                for user_id in removed:
+                    self._saved[user_id] = ''
+                self._dirty |= dirty
+                raise
+            self.stats['flushes'] += 1
+            self.stats['written'] += len(changed) + len(removed)
+
+    async def run_flush_job(self) -> None:
+        """ذخیره دوره‌ای وضعیت‌های تغییر یافته"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("خطا در ذخیره وضعیت گفتگوها: %s", e)
+
+    async def close(self) -> None:
+        """ذخیره نهایی و بستن پایگاه داده وضعیت"""
+        await self.flush()
+        self.store.close()
+
+    def get_stats(self) -> Dict[str, int]:
+        """آمار بارگذاری و ذخیره وضعیت گفتگوها"""
+        return {**self.stats, 'dirty': len(self._dirty), 'cached_users': len(self._loaded)}
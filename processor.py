@@ -0,0 +1,75 @@
+import asyncio
+from typing import Any, Awaitable, Dict, Optional
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+from config import *
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """پردازش همزمان به‌روزرسانی‌ها با حفظ ترتیب برای هر کاربر"""
+
+    def __init__(self, max_concurrent_updates: int = MAX_CONCURRENT_REQUESTS,
+                 max_pending_updates: int = MAX_PENDING_UPDATES):
+        # سمافور کلاس پایه فقط تعداد به‌روزرسانی‌های در انتظار را محدود می‌کند؛
+        # محدودیت اجرای همزمان پس از گرفتن قفل کاربر اعمال می‌شود تا پیام‌های
+        # پشت سر هم یک کاربر ظرفیت اجرای کاربران دیگر را اشغال نکنند
+        super().__init__(max(max_pending_updates, max_concurrent_updates))
+        self.concurrency = max_concurrent_updates
+        self._running: Optional[asyncio.Semaphore] = None
+        self._user_locks: Dict[int, asyncio.Lock] = {}
+        self._waiters: Dict[int, int] = {}
+        self.stats = {'processed': 0, 'serialized': 0, 'max_active': 0}
+        self._active = 0
+
+    async def initialize(self) -> None:
+        self._running = asyncio.Semaphore(self.concurrency)
+
+    async def shutdown(self) -> None:
+        self._user_locks.clear()
+        self._waiters.clear()
+
+    @staticmethod
+    def _user_key(update: object) -> Optional[int]:
+        if isinstance(update, Update) and update.effective_user:
+            return update.effective_user.id
+        return None
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        user_id = self._user_key(update)
+        if user_id is None:
+            async with self._running:
+                await self._run(coroutine)
+            return
+
+        lock = self._user_locks.get(user_id)
+        if lock is None:
+            lock = self._user_locks[user_id] = asyncio.Lock()
+        if lock.locked():
+            self.stats['serialized'] += 1
+        self._waiters[user_id] = self._waiters.get(user_id, 0) + 1
+        try:
+            async with lock:
+                async with self._running:
+                    await self._run(coroutine)
+        finally:
+            # حذف قفل کاربرانی که به‌روزرسانی دیگری در انتظار ندارند
+            self._waiters[user_id] -= 1
+            if not self._waiters[user_id]:
+                del self._waiters[user_id]
+                del self._user_locks[user_id]
+
+    async def _run(self, coroutine: Awaitable[Any]) -> None:
+        self._active += 1
+        self.stats['max_active'] = max(self.stats['max_active'], self._active)
+        try:
+            await coroutine
+        finally:
+            self._active -= 1
+            self.stats['processed'] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """آمار پردازش همزمان به‌روزرسانی‌ها"""
+        return {
+            **self.stats,
+            'active': self._active,
+            'waiting_users': len(self._user_locks)
+        }
@@ -0,0 +1,100 @@
+import logging
+from time import perf_counter
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[..., Awaitable[Any]]
+
+class Route:
+    """یک مسیر ثبت شده به همراه آمار اجرای آن"""
+
+    def __init__(self, name: str, handler: Handler, converter: Optional[Callable[[str], Any]] = None):
+        self.name = name
+        self.handler = handler
+        self.converter = converter
+        self.count = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def record(self, elapsed: float, failed: bool = False) -> None:
+        """ثبت یک بار اجرای مسیر"""
+        self.count += 1
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+        if failed:
+            self.errors += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        """تبدیل آمار مسیر به دیکشنری"""
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'total_ms': self.total_time * 1000,
+            'avg_ms': self.total_time * 1000 / self.count if self.count else 0,
+            'max_ms': self.max_time * 1000
+        }
+
+class Router:
+    """مسیریاب جدول‌محور برای داده‌های callback و وضعیت‌های گفتگو"""
+
+    def __init__(self, separator: str = '_'):
+        self.separator = separator
+        self._exact: Dict[str, Route] = {}
+        self._prefixes: Dict[str, Route] = {}
+
+    def add(self, key: str, handler: Handler) -> None:
+        """ثبت مسیر با کلید ثابت"""
+        self._exact[key] = Route(key, handler)
+
+    def add_prefix(self, prefix: str, handler: Handler,
+                   converter: Callable[[str], Any] = str) -> None:
+        """ثبت مسیر پیشوندی که ادامه کلید به عنوان آرگومان ارسال می‌شود"""
+        if not prefix.endswith(self.separator):
+            raise ValueError(f"پیشوند باید به '{self.separator}' ختم شود: {prefix}")
+        self._prefixes[prefix] = Route(prefix + '*', handler, converter)
+
+    def resolve(self, key: str) -> Optional[Tuple[Route, Tuple[Any, ...]]]:
+        """یافتن مسیر و آرگومان‌های تبدیل شده برای یک کلید"""
+        route = self._exact.get(key)
+        if route is not None:
+            return route, ()
+
+        # طولانی‌ترین پیشوند ثبت شده که به جداکننده ختم شود (مثلاً approve_user_)
+        end = key.rfind(self.separator)
+        while end != -1:
+            route = self._prefixes.get(key[:end + 1])
+            if route is not None:
+                try:
+                    return route, (route.converter(key[end + 1:]),)
+                except (ValueError, KeyError):
+                    logger.warning("آرگومان نامعتبر برای مسیر %s: %s", route.name, key)
+                    return None
+            end = key.rfind(self.separator, 0, end)
+        return None
+
+    async def dispatch(self, key: str, *args: Any) -> bool:
+        """اجرای هندلر مسیر متناظر با کلید؛ در صورت نبود مسیر False برمی‌گرداند"""
+        resolved = self.resolve(key)
+        if resolved is None:
+            return False
+
+        route, params = resolved
+        start = perf_counter()
+        failed = True
+        try:
+            await route.handler(*args, *params)
+            failed = False
+        finally:
+            route.record(perf_counter() - start, failed)
+        return True
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """آمار تعداد و زمان اجرای مسیرهایی که حداقل یک بار اجرا شده‌اند"""
+        routes = list(self._exact.values()) + list(self._prefixes.values())
+        return {
+            route.name: route.to_dict()
+            for route in sorted(routes, key=lambda r: r.total_time, reverse=True)
+            if route.count
+        }
@@ -0,0 +1,131 @@
+import re
+from typing import Optional
+from sqlalchemy import Float, Integer, event, inspect, text
+from sqlalchemy.engine import Connection
+from migrations import Migration
+
+# یکسان‌سازی حروف عربی/فارسی، حذف نیم‌فاصله، کشیده و اعراب و تبدیل ارقام به لاتین
+_NORMALIZE = str.maketrans({
+    'ي': 'ی', 'ى': 'ی', 'ك': 'ک', 'ۀ': 'ه', 'ة': 'ه',
+    'أ': 'ا', 'إ': 'ا', 'ٱ': 'ا',
+    '\u200c': None, '\u200d': None, '\u0640': None,
+    **{chr(code): None for code in range(0x064B, 0x0660)},
+    '\u0670': None,
+    **{digit: str(value) for value, digit in enumerate('۰۱۲۳۴۵۶۷۸۹')},
+    **{digit: str(value) for value, digit in enumerate('٠١٢٣٤٥٦٧٨٩')},
+})
+
+_TOKEN = re.compile(r'\w+')
+
+def normalize_fa(value: Optional[str]) -> str:
+    """نرمال‌سازی متن فارسی برای نمایه‌سازی و جستجو"""
+    if not value:
+        return ''
+    return value.translate(_NORMALIZE).lower()
+
+def match_query(query: str) -> Optional[str]:
+    """تبدیل عبارت کاربر به عبارت MATCH در FTS5؛ همه کلمات به صورت پیشوندی باید وجود داشته باشند"""
+    tokens = _TOKEN.findall(normalize_fa(query))
+    if not tokens:
+        return None
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+# حذف از نمایه به تابع سفارشی نیاز ندارد و روی هر اتصالی (حتی sqlite3 خط فرمان) کار می‌کند؛
+# درج و ویرایش با متن نرمال شده از مسیر ORM پایتون انجام می‌شود (register_search_index)
+_SEARCH_SCHEMA = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS task_search USING fts5("
+    "title, description, tokenize='unicode61 remove_diacritics 2')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS comment_search USING fts5("
+    "content, tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS tasks_search_delete AFTER DELETE ON tasks BEGIN "
+    "DELETE FROM task_search WHERE rowid = old.rowid; END",
+    "CREATE TRIGGER IF NOT EXISTS comments_search_delete AFTER DELETE ON comments BEGIN "
+    "DELETE FROM comment_search WHERE rowid = old.rowid; END",
+]
+
+# نسخه‌های قبلی این تریگرها normalize_fa را صدا می‌زدند و روی اتصال‌های دیگر خطا می‌دادند
+_LEGACY_TRIGGERS = [
+    'tasks_search_insert', 'tasks_search_update', 'comments_search_insert', 'comments_search_update'
+]
+
+_INDEX_TASK = text("INSERT INTO task_search (rowid, title, description) VALUES (:rowid, :title, :description)")
+_INDEX_COMMENT = text("INSERT INTO comment_search (rowid, content) VALUES (:rowid, :content)")
+
+def _task_entry(rowid: int, title: Optional[str], description: Optional[str]) -> dict:
+    return {'rowid': rowid, 'title': normalize_fa(title), 'description': normalize_fa(description)}
+
+def _comment_entry(rowid: int, content: Optional[str]) -> dict:
+    return {'rowid': rowid, 'content': normalize_fa(content)}
+
+def _rebuild_index(connection: Connection) -> None:
+    """پر کردن دوباره نمایه از روی همه وظایف و نظرات موجود"""
+    connection.exec_driver_sql('DELETE FROM task_search')
+    connection.exec_driver_sql('DELETE FROM comment_search')
+    rows = connection.exec_driver_sql('SELECT rowid, title, description FROM tasks').all()
+    if rows:
+        connection.execute(_INDEX_TASK, [_task_entry(*row) for row in rows])
+    rows = connection.exec_driver_sql('SELECT rowid, content FROM comments').all()
+    if rows:
+        connection.execute(_INDEX_COMMENT, [_comment_entry(*row) for row in rows])
+
+def search_migration(name: str) -> Migration:
+    """مهاجرت ساخت نمایه FTS5 روی وظایف و نظرات"""
+    def upgrade(connection: Connection) -> None:
+        for statement in _SEARCH_SCHEMA:
+            connection.exec_driver_sql(statement)
+        _rebuild_index(connection)
+    return Migration(name, upgrade)
+
+def python_index_migration(name: str) -> Migration:
+    """مهاجرت حذف تریگرهای وابسته به normalize_fa و بازسازی نمایه با نرمال‌سازی پایتون"""
+    def upgrade(connection: Connection) -> None:
+        for trigger in _LEGACY_TRIGGERS:
+            connection.exec_driver_sql(f'DROP TRIGGER IF EXISTS {trigger}')
+        for statement in _SEARCH_SCHEMA:
+            connection.exec_driver_sql(statement)
+        _rebuild_index(connection)
+    return Migration(name, upgrade)
+
+def register_search_index(task_model, comment_model) -> None:
+    """همگام نگه داشتن نمایه با درج و ویرایش وظایف و نظرات از طریق ORM
+    
+    نوشتن‌هایی که از ORM نمی‌گذرند (مثلاً خط فرمان sqlite3) تا اجرای بعدی
+    _rebuild_index در نمایه دیده نمی‌شوند ولی خطایی هم نمی‌دهند.
+    """
+    def index_task(mapper, connection, target):
+        connection.execute(text('DELETE FROM task_search WHERE rowid = :rowid'), {'rowid': target.id})
+        connection.execute(_INDEX_TASK, _task_entry(target.id, target.title, target.description))
+    
+    def index_comment(mapper, connection, target):
+        connection.execute(text('DELETE FROM comment_search WHERE rowid = :rowid'), {'rowid': target.id})
+        connection.execute(_INDEX_COMMENT, _comment_entry(target.id, target.content))
+    
+    def task_changed(mapper, connection, target):
+        state = inspect(target)
+        if state.attrs.title.history.has_changes() or state.attrs.description.history.has_changes():
+            index_task(mapper, connection, target)
+    
+    def comment_changed(mapper, connection, target):
+        if inspect(target).attrs.content.history.has_changes():
+            index_comment(mapper, connection, target)
+    
+    event.listen(task_model, 'after_insert', index_task)
+    event.listen(task_model, 'after_update', task_changed)
+    event.listen(comment_model, 'after_insert', index_comment)
+    event.listen(comment_model, 'after_update', comment_changed)
+
+def ranked_tasks(match: str):
+    """شناسه وظایف منطبق با امتیاز bm25 (کمتر یعنی مرتبط‌تر)؛ تطابق در عنوان وزن بیشتری دارد
+    
+    وظیفه‌ای که فقط در نظراتش منطبق باشد هم برگردانده می‌شود.
+    """
+    return text(
+        "SELECT task_id, MIN(score) AS score FROM ("
+        "SELECT rowid AS task_id, bm25(task_search, 10.0, 1.0) AS score "
+        "FROM task_search WHERE task_search MATCH :match "
+        "UNION ALL "
+        "SELECT comments.task_id AS task_id, bm25(comment_search) AS score "
+        "FROM comment_search JOIN comments ON comments.rowid = comment_search.rowid "
+        "WHERE comment_search MATCH :match"
+        ") GROUP BY task_id"
+    ).bindparams(match=match).columns(task_id=Integer, score=Float).subquery('search_hits')
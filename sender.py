@@ -0,0 +1,249 @@
+import asyncio
+import itertools
+import logging
+from collections import deque
+from time import monotonic
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+from telegram.error import BadRequest, NetworkError, RetryAfter, TimedOut
+from config import *
+
+logger = logging.getLogger(__name__)
+
+# اولویت‌های ارسال (عدد کمتر زودتر ارسال می‌شود)
+PRIORITY_URGENT = 0
+PRIORITY_HIGH = 1
+PRIORITY_NORMAL = 2
+PRIORITY_LOW = 3
+
+class TokenBucket:
+    """محدودکننده نرخ سطل توکن"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.updated = monotonic()
+
+    def _refill(self) -> None:
+        now = monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """زمان انتظار تا در دسترس بودن یک توکن (بدون مصرف آن)"""
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self) -> None:
+        """مصرف یک توکن"""
+        self._refill()
+        self.tokens -= 1
+
+class _SendItem:
+    __slots__ = ('priority', 'seq', 'chat_id', 'factory', 'future', 'enqueued_at', 'attempts')
+
+    def __init__(self, priority: int, seq: int, chat_id: int,
+                 factory: Callable[[], Awaitable[Any]], future: asyncio.Future):
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        self.factory = factory
+        self.future = future
+        self.enqueued_at = monotonic()
+        self.attempts = 0
+
+    def __lt__(self, other: '_SendItem') -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+class SendQueue:
+    """صف مرکزی ارسال پیام‌های تلگرام با کنترل نرخ سراسری و به ازای هر چت"""
+
+    def __init__(self, global_rate: float = TELEGRAM_GLOBAL_RATE,
+                 chat_rate: float = TELEGRAM_CHAT_RATE, maxsize: int = SEND_QUEUE_SIZE,
+                 max_retries: int = MAX_SEND_RETRIES):
+        self.bot = None
+        self.global_bucket = TokenBucket(global_rate)
+        self.chat_rate = chat_rate
+        self.max_retries = max_retries
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+        # پیام‌های ارسال نشده هر چت به ترتیب ورود؛ فقط اولی در صف اولویت است تا
+        # تاخیر یا تلاش مجدد یک پیام، پیام‌های بعدی همان چت را جلو نیندازد
+        self._chats: Dict[int, Deque[_SendItem]] = {}
+        self._held = 0
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        # ظرفیت صف؛ تولیدکننده‌ها هنگام پر بودن صف منتظر می‌مانند
+        self._capacity: Optional[asyncio.Semaphore] = None
+        self.maxsize = maxsize
+        self._seq = itertools.count()
+        self._paused_until = 0.0
+        self._deferred = 0
+        self._in_flight = set()
+        self._worker: Optional[asyncio.Task] = None
+        self.stats = {
+            'enqueued': 0,
+            'sent': 0,
+            'failed': 0,
+            'retried': 0,
+            'flood_waits': 0,
+            'max_depth': 0,
+            'total_wait': 0.0
+        }
+
+    async def start(self, bot) -> None:
+        """شروع پردازش صف با نمونه ربات تلگرام"""
+        self.bot = bot
+        self._queue = asyncio.PriorityQueue()
+        self._capacity = asyncio.Semaphore(self.maxsize)
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 10) -> None:
+        """توقف صف پس از ارسال پیام‌های باقی‌مانده (حداکثر تا timeout ثانیه)"""
+        if self._worker is None:
+            return
+        try:
+            await asyncio.wait_for(self._drain(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("%d پیام در صف ارسال باقی ماند", self.depth)
+        self._worker.cancel()
+        await asyncio.gather(self._worker, return_exceptions=True)
+        self._worker = None
+
+    async def _drain(self) -> None:
+        while self.depth or self._in_flight:
+            await asyncio.sleep(0.1)
+
+    @property
+    def depth(self) -> int:
+        """تعداد پیام‌های منتظر ارسال"""
+        return (self._queue.qsize() if self._queue else 0) + self._deferred + self._held
+
+    async def submit(self, chat_id: int, factory: Callable[[], Awaitable[Any]],
+                     priority: int = PRIORITY_NORMAL) -> asyncio.Future:
+        """افزودن یک فراخوانی API به صف؛ Future نتیجه ارسال را برمی‌گرداند"""
+        await self._capacity.acquire()
+        future = asyncio.get_running_loop().create_future()
+        item = _SendItem(priority, next(self._seq), chat_id, factory, future)
+        pending = self._chats.setdefault(chat_id, deque())
+        pending.append(item)
+        if len(pending) == 1:
+            self._queue.put_nowait(item)
+        else:
+            self._held += 1
+        self.stats['enqueued'] += 1
+        self.stats['max_depth'] = max(self.stats['max_depth'], self.depth)
+        return future
+
+    async def send_message(self, chat_id: int, text: str, priority: int = PRIORITY_NORMAL,
+                           **kwargs: Any) -> asyncio.Future:
+        """ارسال پیام متنی از طریق صف"""
+        return await self.submit(
+            chat_id,
+            lambda: self.bot.send_message(chat_id=chat_id, text=text, **kwargs),
+            priority
+        )
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= MAX_TRACKED_CHATS:
+                # حذف سطل چت‌هایی که پر شده‌اند و دیگر محدودیتی ندارند
+                self._chat_buckets = {
+                    key: value for key, value in self._chat_buckets.items() if value.delay() > 0
+                }
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, 1)
+        return bucket
+
+    def _defer(self, item: _SendItem, delay: float) -> None:
+        # بازگرداندن پیام به صف پس از delay بدون مسدود کردن پیام‌های چت‌های دیگر
+        self._deferred += 1
+
+        def requeue():
+            self._deferred -= 1
+            self._queue.put_nowait(item)
+
+        asyncio.get_running_loop().call_later(delay, requeue)
+
+    async def _run(self) -> None:
+        while True:
+            item = await self._queue.get()
+
+            chat_delay = self._chat_bucket(item.chat_id).delay()
+            if chat_delay > 0:
+                self._defer(item, chat_delay)
+                continue
+
+            while True:
+                wait = max(self._paused_until - monotonic(), self.global_bucket.delay())
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+
+            self.global_bucket.consume()
+            self._chat_bucket(item.chat_id).consume()
+            task = asyncio.create_task(self._send(item))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _send(self, item: _SendItem) -> None:
+        item.attempts += 1
+        try:
+            result = await item.factory()
+        except RetryAfter as e:
+            # محدودیت flood تلگرام: توقف کل صف و ارسال مجدد همین پیام
+            retry_after = getattr(e.retry_after, 'total_seconds', lambda: e.retry_after)()
+            self._paused_until = max(self._paused_until, monotonic() + retry_after)
+            self.stats['flood_waits'] += 1
+            self._retry(item, e, retry_after)
+        except BadRequest as e:
+            # BadRequest زیرکلاس NetworkError است ولی با تکرار درست نمی‌شود
+            self._finish(item, error=e)
+        except (TimedOut, NetworkError) as e:
+            self._retry(item, e, 2 ** item.attempts)
+        except Exception as e:
+            self._finish(item, error=e)
+        else:
+            self._finish(item, result=result)
+
+    def _retry(self, item: _SendItem, error: Exception, delay: float) -> None:
+        if item.attempts > self.max_retries:
+            self._finish(item, error=error)
+            return
+        self.stats['retried'] += 1
+        self._defer(item, delay)
+
+    def _release_next(self, chat_id: int) -> None:
+        """پس از پایان پیام اول یک چت، پیام بعدی همان چت وارد صف اولویت می‌شود"""
+        pending = self._chats[chat_id]
+        pending.popleft()
+        if pending:
+            self._held -= 1
+            self._queue.put_nowait(pending[0])
+        else:
+            del self._chats[chat_id]
+
+    def _finish(self, item: _SendItem, result: Any = None, error: Optional[Exception] = None) -> None:
+        self._capacity.release()
+        self._release_next(item.chat_id)
+        self.stats['total_wait'] += monotonic() - item.enqueued_at
+        if error is not None:
+            self.stats['failed'] += 1
+            logger.warning("ارسال پیام به %s ناموفق بود: %s", item.chat_id, error)
+            if not item.future.done():
+                item.future.set_exception(error)
+                # جلوگیری از هشدار «exception never retrieved» برای ارسال‌های بدون انتظار
+                item.future.exception()
+        else:
+            self.stats['sent'] += 1
+            if not item.future.done():
+                item.future.set_result(result)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """آمار صف ارسال و فشار برگشتی"""
+        finished = self.stats['sent'] + self.stats['failed']
+        return {
+            **self.stats,
+            'depth': self.depth,
+            'in_flight': len(self._in_flight),
+            'avg_wait': self.stats['total_wait'] / finished if finished else 0,
+            'paused_for': max(0.0, self._paused_until - monotonic())
+        }
@@ -0,0 +1,15 @@
+import pytest
+
+@pytest.fixture
+def bot(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    import bot
+
+    bot.engine.dispose()
+    bot.init_db()
+    # مسیر tasks.db هنگام اولین import ثابت می‌شود؛ هر تست با جداول خالی شروع می‌کند
+    with bot.engine.begin() as connection:
+        for table in reversed(bot.Base.metadata.sorted_tables):
+            connection.execute(table.delete())
+    yield bot
+    bot.engine.dispose()
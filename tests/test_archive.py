@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import Boolean, Column, DateTime, Integer, MetaData, String, Table, create_engine, text
+from sqlalchemy.exc import IntegrityError
+
+from archive import Archiver, ArchivePolicy
+from migrations import run_migrations
+
+NOW = datetime(2026, 1, 1)
+OLD = NOW - timedelta(days=60)
+
+def notifications_table(metadata: MetaData, **kwargs) -> Table:
+    return Table(
+        'notifications', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('title', String),
+        Column('is_read', Boolean, default=False),
+        Column('created_at', DateTime),
+        **kwargs
+    )
+
+@pytest.fixture
+def setup(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'main.db'}")
+    metadata = MetaData()
+    table = notifications_table(metadata, sqlite_autoincrement=True)
+    archiver = Archiver(engine, [ArchivePolicy(table, 'is_read = 1 AND created_at < :cutoff', 30)],
+                        path=str(tmp_path / 'archive.db'))
+    metadata.create_all(engine)
+    yield engine, table, archiver
+    engine.dispose()
+
+def insert(engine, table, title):
+    with engine.begin() as connection:
+        return connection.execute(
+            table.insert().values(title=title, is_read=True, created_at=OLD)
+        ).inserted_primary_key[0]
+
+def test_archived_id_is_not_reused(setup):
+    engine, table, archiver = setup
+    first = insert(engine, table, 'first')
+    assert archiver.run(NOW) == {'notifications': 1}
+
+    second = insert(engine, table, 'second')
+    assert second != first
+    assert archiver.run(NOW) == {'notifications': 1}
+
+    with engine.connect() as connection:
+        titles = connection.execute(text('SELECT id, title FROM all_notifications ORDER BY id')).all()
+    assert titles == [(first, 'first'), (second, 'second')]
+
+def test_conflicting_id_fails_without_deleting(setup):
+    engine, table, archiver = setup
+    insert(engine, table, 'first')
+    archiver.run(NOW)
+    with engine.begin() as connection:
+        connection.execute(table.insert().values(id=1, title='reused', is_read=True, created_at=OLD))
+
+    with pytest.raises(IntegrityError):
+        archiver.run(NOW)
+    with engine.connect() as connection:
+        assert connection.execute(text('SELECT title FROM main.notifications')).scalars().all() == ['reused']
+
+def test_migration_adds_autoincrement_and_skips_archived_ids(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'main.db'}")
+    notifications_table(MetaData()).create(engine)
+    with engine.begin() as connection:
+        connection.execute(text("INSERT INTO notifications (id, title, is_read, created_at) "
+                                "VALUES (1, 'a', 1, :old), (2, 'b', 1, :old)"), {'old': OLD})
+
+    metadata = MetaData()
+    table = notifications_table(metadata, sqlite_autoincrement=True)
+    archiver = Archiver(engine, [ArchivePolicy(table, 'is_read = 1 AND created_at < :cutoff', 30)],
+                        path=str(tmp_path / 'archive.db'))
+    engine.dispose()
+    archiver.run(NOW)
+    run_migrations(engine, [archiver.autoincrement_migration('archive_autoincrement')])
+
+    assert insert(engine, table, 'c') == 3
+    engine.dispose()
+
+def test_table_without_autoincrement_is_rejected(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'main.db'}")
+    table = notifications_table(MetaData())
+    with pytest.raises(ValueError):
+        Archiver(engine, [ArchivePolicy(table, 'created_at < :cutoff', 30)], path=str(tmp_path / 'archive.db'))
@@ -0,0 +1,33 @@
+import inspect
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from database import AsyncDatabase, Database
+
+@pytest.fixture
+def db(tmp_path):
+    return AsyncDatabase(f"sqlite+aiosqlite:///{tmp_path / 'tasks.db'}")
+
+def test_public_methods_are_wrapped():
+    assert inspect.iscoroutinefunction(AsyncDatabase.get_task)
+    assert AsyncDatabase.get_task.__doc__ == Database.get_task.__doc__
+    assert not hasattr(AsyncDatabase, 'get_session')
+
+async def test_wrapped_methods_initialize_and_return_rows(db):
+    await db.add_user('u1', 'first', 'employee')
+    await db.add_task('t1', 'one', '', 'u1')
+    assert (await db.get_task('t1')).title == 'one'
+    assert await db.update_task_status('t1', 'completed')
+    assert (await db.get_task('t1')).status == 'completed'
+    assert await db.get_task('missing') is None
+    await db.close()
+
+async def test_errors_propagate(db):
+    await db.add_user('u1', 'first', 'employee')
+    with pytest.raises(IntegrityError):
+        await db.add_user('u1', 'again', 'employee')
+    with pytest.raises(ValueError):
+        await db.get_group_messages('g1', cursor='not-a-cursor')
+    assert (await db.get_user('u1')).username == 'first'
+    await db.close()
@@ -0,0 +1,104 @@
+import pickle
+
+import pytest
+from sqlalchemy import create_engine
+
+from cache import RedisCache, TieredCache, TTLCache
+from database import AnalyticsRow, Database, TaskRow, UserRow
+
+ROW_TYPES = (UserRow, TaskRow, AnalyticsRow)
+
+class FakeRedis:
+    """جایگزین درون‌حافظه‌ای Redis با همان متدهای get/set/delete"""
+
+    def __init__(self):
+        self.data = {}
+        self.fail = False
+        self.calls = 0
+
+    def _check(self):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError('redis down')
+
+    def get(self, key):
+        self._check()
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self._check()
+        self.data[key] = value.encode() if isinstance(value, str) else value
+
+    def delete(self, key):
+        self._check()
+        self.data.pop(key, None)
+
+def make_db(path, l2=None):
+    return Database(create_engine(f"sqlite:///{path}"), cache=TieredCache(TTLCache(), l2))
+
+@pytest.fixture(params=['l1', 'l2'])
+def setup(request, tmp_path):
+    redis = FakeRedis()
+    l2 = RedisCache(redis, row_types=ROW_TYPES) if request.param == 'l2' else None
+    db = make_db(tmp_path / 'tasks.db', l2)
+    db.add_user('u1', 'first', 'employee')
+    db.add_task('t1', 'one', '', 'u1')
+    db.add_task('t2', 'two', '', 'u1')
+    yield db, redis
+    db.engine.dispose()
+
+def test_read_through_and_invalidation(setup):
+    db, _ = setup
+    assert db.get_task('t1').status == 'pending'
+    assert db.get_task('t1').status == 'pending'
+    assert db.get_cache_stats()['l1']['hits'] == 1
+
+    db.update_task_status('t1', 'in_progress')
+    assert db.get_task('t1').status == 'in_progress'
+
+    db.get_task('t2')
+    db.update_task_statuses_bulk([('t1', 'completed'), ('t2', 'in_progress')])
+    assert db.get_task('t1').status == 'completed'
+    assert db.get_task('t2').status == 'in_progress'
+
+def test_add_comment_invalidates_task(setup):
+    db, _ = setup
+    db.get_task('t1')
+    db.cache.set('task:t1', 'stale')
+    db.add_comment('c1', 't1', 'u1', 'نظر')
+    assert db.get_task('t1').title == 'one'
+
+def test_l2_shares_rows_as_json(tmp_path):
+    redis = FakeRedis()
+    first = make_db(tmp_path / 'tasks.db', RedisCache(redis, row_types=ROW_TYPES))
+    first.add_user('u1', 'first', 'employee')
+    first.add_task('t1', 'one', '', 'u1')
+    row = first.get_task('t1')
+
+    payload = redis.data['cache:task:t1']
+    assert payload.startswith(b'{')
+    second = TieredCache(TTLCache(), RedisCache(redis, row_types=ROW_TYPES))
+    assert second.get('task:t1') == row
+    assert isinstance(second.get('task:t1'), TaskRow)
+    first.engine.dispose()
+
+def test_l2_ignores_pickle_and_unknown_rows():
+    redis = FakeRedis()
+    cache = RedisCache(redis, row_types=(UserRow,))
+    redis.data['cache:p'] = pickle.dumps({'a': 1})
+    redis.data['cache:r'] = b'{"__row__": "Evil", "fields": {}}'
+    assert cache.get('p') is None
+    assert cache.get('r') is None
+    assert cache.get_stats()['misses'] == 2
+
+def test_l2_backs_off_after_failure():
+    redis = FakeRedis()
+    cache = RedisCache(redis, backoff=60)
+    redis.fail = True
+    assert cache.get('k', 'default') == 'default'
+    calls = redis.calls
+    redis.fail = False
+    cache.set('k', 1)
+    assert cache.get('k') is None
+    assert redis.calls == calls
+    assert cache.get_stats()['errors'] == 1
@@ -0,0 +1,16 @@
+import io
+
+import pytest
+from arabic_reshaper import ArabicReshaper
+from bidi.algorithm import get_display
+
+import export
+
+@pytest.mark.parametrize('text', ['لا', 'سلام', 'کلاس علا بلا', 'لأ لإ لآ'])
+def test_shape_keeps_lam_alef_ligature(text):
+    assert export._shape(text) == get_display(ArabicReshaper().reshape(text))
+
+def test_pdf_requires_font(monkeypatch, tmp_path):
+    monkeypatch.setattr(export, 'PDF_REPORTS_ENABLED', False)
+    with pytest.raises(ValueError):
+        export.write_pdf([(1, 'وظیفه')], ['شناسه', 'عنوان'], io.BytesIO(), 'گزارش')
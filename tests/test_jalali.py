@@ -0,0 +1,44 @@
+from datetime import date, datetime
+
+import pandas as pd
+import pytest
+
+from jalali import format_jalali, jalali_parts, jalali_period
+
+# مرز سال (نوروز)، مرز ماه ۳۱ روزه به ۳۰ روزه و اسفند سال کبیسه
+BOUNDARIES = [
+    (date(2024, 3, 19), '1402/12/29'),
+    (date(2024, 3, 20), '1403/01/01'),
+    (date(2024, 9, 21), '1403/06/31'),
+    (date(2024, 9, 22), '1403/07/01'),
+    (date(2025, 3, 20), '1403/12/30'),
+    (date(2025, 3, 21), '1404/01/01'),
+]
+
+@pytest.mark.parametrize('gregorian, expected', BOUNDARIES)
+def test_format_jalali_boundaries(gregorian, expected):
+    assert format_jalali(gregorian) == expected
+
+def test_format_jalali_with_time():
+    assert format_jalali(datetime(2024, 3, 20, 23, 59), with_time=True) == '1403/01/01 23:59'
+    assert format_jalali(date(2024, 3, 20), with_time=True) == '1403/01/01'
+
+def test_period_keys_across_boundaries():
+    values = [datetime.combine(day, datetime.min.time()) for day, _ in BOUNDARIES] + [None]
+    assert jalali_period(values).tolist() == [label for _, label in BOUNDARIES] + [None]
+    assert jalali_period(values, freq='month').tolist() == [
+        '1402/12', '1403/01', '1403/06', '1403/07', '1403/12', '1404/01', None
+    ]
+
+def test_period_keeps_index_and_rejects_unknown_freq():
+    series = pd.Series([datetime(2024, 3, 20, 12), datetime(2024, 3, 20, 8)], index=[10, 20])
+    periods = jalali_period(series, freq='month')
+    assert periods.to_dict() == {10: '1403/01', 20: '1403/01'}
+    with pytest.raises(ValueError):
+        jalali_period(series, freq='week')
+
+def test_parts_fill_missing_with_zero():
+    years, months, days = jalali_parts([datetime(2025, 3, 21), None])
+    assert years.tolist() == [1404, 0]
+    assert months.tolist() == [1, 0]
+    assert days.tolist() == [1, 0]
@@ -0,0 +1,72 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, insert
+
+from database import ChatMessage, Comment, Database, decode_cursor, encode_cursor
+
+TIED = datetime(2026, 1, 1, 9)
+
+@pytest.fixture
+def db(tmp_path):
+    database = Database(create_engine(f"sqlite:///{tmp_path / 'tasks.db'}"))
+    database.add_user('u1', 'first', 'employee')
+    database.add_task('t1', 'task', '', 'u1')
+    database.create_chat_group('g1', 'group')
+    # m1..m5 زمان یکسان دارند تا ترتیب فقط با شناسه تعیین شود
+    stamps = [datetime(2025, 12, 31)] + [TIED] * 5 + [datetime(2026, 1, 2)]
+    with database.engine.begin() as connection:
+        connection.execute(insert(ChatMessage.__table__), [
+            {'id': f'm{i}', 'group_id': 'g1', 'user_id': 'u1', 'content': f'{i}', 'type': 'text', 'created_at': stamp}
+            for i, stamp in enumerate(stamps)
+        ])
+        connection.execute(insert(Comment.__table__), [
+            {'id': f'c{i}', 'task_id': 't1', 'user_id': 'u1', 'content': f'{i}', 'created_at': stamp}
+            for i, stamp in enumerate(stamps)
+        ])
+    yield database
+    database.engine.dispose()
+
+def ids(page):
+    return [row.id for row in page.items]
+
+def test_cursor_round_trip():
+    row = ChatMessage(id='m|1', created_at=TIED)
+    assert decode_cursor(encode_cursor(row)) == (TIED, 'm|1')
+
+@pytest.mark.parametrize('cursor', ['', '!!!', 'bm90LWEtY3Vyc29y', encode_cursor(ChatMessage(id='x', created_at=TIED))[:-4]])
+def test_invalid_cursor_raises_value_error(db, cursor):
+    with pytest.raises(ValueError):
+        db.get_group_messages('g1', limit=2, cursor=cursor)
+
+def test_invalid_direction_raises_value_error(db):
+    with pytest.raises(ValueError):
+        db.get_group_messages('g1', direction='sideways')
+
+def test_group_messages_page_through_ties(db):
+    first = db.get_group_messages('g1', limit=3)
+    assert ids(first) == ['m6', 'm5', 'm4']
+    assert first.newer_cursor is None
+
+    second = db.get_group_messages('g1', limit=3, cursor=first.older_cursor)
+    assert ids(second) == ['m3', 'm2', 'm1']
+    third = db.get_group_messages('g1', limit=3, cursor=second.older_cursor)
+    assert ids(third) == ['m0']
+    assert third.older_cursor is None
+
+    back = db.get_group_messages('g1', limit=3, cursor=second.newer_cursor, direction='newer')
+    assert ids(back) == ids(first)
+    assert back.newer_cursor is None
+    assert db.get_group_messages('g1', limit=3, cursor=third.newer_cursor, direction='newer') == second
+
+def test_task_comments_start_from_oldest(db):
+    first = db.get_task_comments('t1', limit=4)
+    assert ids(first) == ['c0', 'c1', 'c2', 'c3']
+    assert first.older_cursor is None
+
+    second = db.get_task_comments('t1', limit=4, cursor=first.newer_cursor)
+    assert ids(second) == ['c4', 'c5', 'c6']
+    assert second.newer_cursor is None
+
+    back = db.get_task_comments('t1', limit=4, cursor=second.older_cursor, direction='older')
+    assert ids(back) == ids(first)
@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, update
+
+from database import Database, Notification, encode_cursor
+
+START = datetime(2026, 1, 1)
+
+@pytest.fixture
+def db(tmp_path):
+    database = Database(create_engine(f"sqlite:///{tmp_path / 'tasks.db'}"))
+    database.add_user('u1', 'first', 'employee')
+    database.add_user('u2', 'second', 'employee')
+    yield database
+    database.engine.dispose()
+
+def add_ordered(db, user_id, ids):
+    """افزودن اعلان‌ها با created_at صعودی به ترتیب ids"""
+    for offset, notification_id in enumerate(ids):
+        db.add_notification(notification_id, user_id, notification_id, '', 'info')
+        with db.engine.begin() as connection:
+            connection.execute(
+                update(Notification.__table__)
+                .where(Notification.__table__.c.id == notification_id)
+                .values(created_at=START + timedelta(minutes=offset))
+            )
+
+def unread_ids(db, user_id):
+    return sorted(row.id for row in db.get_user_notifications(user_id, unread_only=True))
+
+def cursor(db, user_id, notification_id):
+    [row] = [row for row in db.get_user_notifications(user_id) if row.id == notification_id]
+    return encode_cursor(row)
+
+def test_counter_follows_inserts(db):
+    db.add_notification('a', 'u1', 'a', '', 'info')
+    db.add_notifications_bulk([
+        {'id': 'b', 'user_id': 'u1', 'title': 'b', 'message': '', 'type': 'info'},
+        {'id': 'c', 'user_id': 'u2', 'title': 'c', 'message': '', 'type': 'info'},
+    ])
+    assert db.get_unread_count('u1') == 2
+    assert db.get_unread_count('u2') == 1
+    assert db.get_unread_count('missing') == 0
+
+def test_range_follows_creation_order_not_id_order(db):
+    add_ordered(db, 'u1', ['n1', 'n2', 'n10', 'n3'])
+    add_ordered(db, 'u2', ['n1x'])
+
+    assert db.mark_notifications_read_range('u1', cursor(db, 'u1', 'n2'), cursor(db, 'u1', 'n1')) == 2
+    assert unread_ids(db, 'u1') == ['n10', 'n3']
+    assert db.get_unread_count('u1') == 2
+    assert db.get_unread_count('u2') == 1
+
+def test_mark_all_and_zero_floor(db):
+    add_ordered(db, 'u1', ['a', 'b', 'c'])
+    assert db.mark_notifications_read('u1', ['a', 'missing']) == 1
+    assert db.mark_notifications_read('u1', ['a']) == 0
+    assert db.get_unread_count('u1') == 2
+
+    assert db.mark_all_notifications_read('u1') == 2
+    assert db.mark_all_notifications_read('u1') == 0
+    assert db.mark_notifications_read_range('u1', cursor(db, 'u1', 'a'), cursor(db, 'u1', 'c')) == 0
+    assert db.get_unread_count('u1') == 0
+
+def test_range_rejects_invalid_cursor(db):
+    with pytest.raises(ValueError):
+        db.mark_notifications_read_range('u1', 'not-a-cursor', 'x')
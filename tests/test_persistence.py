@@ -0,0 +1,93 @@
+from types import SimpleNamespace
+
+import pytest
+
+from persistence import ConversationPersistence, ConversationStore
+
+class FakeApplication:
+    def __init__(self):
+        self.user_data = {}
+        self.handlers = []
+
+    def add_handler(self, handler, group=0):
+        self.handlers.append((group, handler))
+
+class CountingStore(ConversationStore):
+    def __init__(self, path):
+        super().__init__(str(path))
+        self.writes = []
+        self.fail = False
+
+    def write(self, changed, removed):
+        if self.fail:
+            raise OSError('disk full')
+        self.writes.append((dict(changed), list(removed)))
+        super().write(changed, removed)
+
+def update_from(user_id):
+    return SimpleNamespace(effective_user=SimpleNamespace(id=user_id))
+
+def make(path):
+    application = FakeApplication()
+    persistence = ConversationPersistence(CountingStore(path))
+    persistence.register(application)
+    return persistence, application
+
+async def restore(path, user_id):
+    persistence, _ = make(path)
+    context = SimpleNamespace(user_data={})
+    await persistence._load_user_state(update_from(user_id), context)
+    persistence.store.close()
+    return context.user_data
+
+async def test_round_trip_coalesces_updates(tmp_path):
+    path = tmp_path / 'state.db'
+    persistence, application = make(path)
+    assert [group for group, _ in application.handlers] == [-1, 1]
+
+    for step in range(3):
+        application.user_data[1] = {'state': 'title', 'step': step}
+        await persistence._mark_dirty(update_from(1), None)
+    application.user_data[2] = {'state': 'comment'}
+    await persistence._mark_dirty(update_from(2), None)
+    await persistence.flush()
+
+    assert len(persistence.store.writes) == 1
+    assert sorted(persistence.store.writes[0][0]) == [1, 2]
+    assert persistence.get_stats()['written'] == 2
+
+    # وضعیت بدون تغییر دوباره نوشته نمی‌شود
+    await persistence._mark_dirty(update_from(1), None)
+    await persistence.flush()
+    assert len(persistence.store.writes) == 1
+    await persistence.close()
+
+    assert await restore(path, 1) == {'state': 'title', 'step': 2}
+    assert await restore(path, 3) == {}
+
+async def test_cleared_state_is_deleted(tmp_path):
+    path = tmp_path / 'state.db'
+    persistence, application = make(path)
+    application.user_data[1] = {'state': 'title'}
+    await persistence._mark_dirty(update_from(1), None)
+    await persistence.flush()
+
+    application.user_data[1] = {}
+    await persistence._mark_dirty(update_from(1), None)
+    await persistence.close()
+    assert persistence.store.writes[-1] == ({}, [1])
+    assert await restore(path, 1) == {}
+
+async def test_failed_write_is_retried(tmp_path):
+    persistence, application = make(tmp_path / 'state.db')
+    application.user_data[1] = {'state': 'title'}
+    await persistence._mark_dirty(update_from(1), None)
+    persistence.store.fail = True
+    with pytest.raises(OSError):
+        await persistence.flush()
+    assert persistence.get_stats()['dirty'] == 1
+
+    persistence.store.fail = False
+    await persistence.flush()
+    assert persistence.store.writes == [({1: persistence.store.load(1)}, [])]
+    await persistence.close()
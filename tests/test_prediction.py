@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+
+NOW = datetime(2026, 1, 1, 9)
+
+def add_completed(bot, session, user, count, created_at):
+    for i in range(count):
+        task = bot.Task(title=f'done {i}', description='گزارش هفتگی تیم', user=user,
+                        status=bot.TaskStatus.COMPLETED, estimated_hours=i % 4 + 1,
+                        created_at=created_at, completed_at=created_at + timedelta(hours=i % 4 + 1))
+        session.add(task)
+        session.add(bot.Comment(task=task, user=user, content='انجام شد'))
+
+def test_training_data_includes_archived_tasks(bot):
+    with bot.session_scope() as session:
+        user = bot.User(telegram_id=1, first_name='a', last_name='b', role=bot.UserRole.DORMITORY_CARETAKER)
+        add_completed(bot, session, user, 3, NOW - timedelta(days=400))
+        add_completed(bot, session, user, 2, NOW)
+        session.commit()
+    assert bot.archiver.run(NOW)['tasks'] == 3
+
+    task_bot = bot.TaskBot.__new__(bot.TaskBot)
+    with bot.session_scope() as session:
+        rows = task_bot._load_training_data(session)
+    assert len(rows) == 5
+    assert {row.comment_count for row in rows} == {1}
+    assert {row.priority for row in rows} == {bot.TaskPriority.MEDIUM}
+
+def test_task_list_shows_predicted_duration_for_open_tasks(bot):
+    with bot.session_scope() as session:
+        user = bot.User(telegram_id=1, first_name='a', last_name='b', role=bot.UserRole.DORMITORY_CARETAKER)
+        add_completed(bot, session, user, bot.MIN_TASKS_FOR_PREDICTION, NOW)
+        session.add(bot.Task(title='open', description='گزارش', user=user, estimated_hours=2, created_at=NOW))
+        session.commit()
+        user_id = user.id
+
+    task_bot = bot.TaskBot.__new__(bot.TaskBot)
+    task_bot.model = None
+    with bot.session_scope() as session:
+        tasks, _ = task_bot._get_tasks_page(session, user_id)
+        assert task_bot._predict_durations(session, tasks) == {}
+        task_bot.train_prediction_model()
+        predictions = task_bot._predict_durations(session, tasks)
+
+    [open_task] = [task for task in tasks if task.completed_at is None]
+    assert list(predictions) == [open_task.id]
+    message, _ = task_bot._render_task_page(tasks, 'وظایف شما:', 'tasks', False, False, predictions=predictions)
+    assert message.count('⏳ زمان پیش‌بینی شده') == 1
@@ -0,0 +1,70 @@
+import asyncio
+from datetime import datetime
+
+from telegram import Chat, Message, Update, User
+
+from processor import PerUserUpdateProcessor
+
+def make_update(update_id, user_id):
+    user = User(id=user_id, first_name='u', is_bot=False)
+    message = Message(message_id=update_id, date=datetime.now(), chat=Chat(user_id, Chat.PRIVATE), from_user=user)
+    return Update(update_id, message=message)
+
+class Recorder:
+    """ثبت شروع و پایان هر به‌روزرسانی و بیشترین اجرای همزمان"""
+
+    def __init__(self):
+        self.events = []
+        self.active = 0
+        self.max_active = 0
+
+    async def handle(self, name, delay=0.01):
+        self.events.append(('start', name))
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(delay)
+        self.active -= 1
+        self.events.append(('end', name))
+
+async def run_updates(processor, recorder, updates):
+    await processor.initialize()
+    await asyncio.gather(*(
+        processor.process_update(make_update(number, user_id), recorder.handle((user_id, number)))
+        for number, user_id in enumerate(updates)
+    ))
+    await processor.shutdown()
+
+async def test_same_user_updates_run_in_order():
+    processor = PerUserUpdateProcessor(max_concurrent_updates=4)
+    recorder = Recorder()
+    await run_updates(processor, recorder, [7, 7, 7])
+
+    assert recorder.max_active == 1
+    assert recorder.events == [
+        (event, (7, number)) for number in range(3) for event in ('start', 'end')
+    ]
+    stats = processor.get_stats()
+    assert stats['processed'] == 3
+    assert stats['serialized'] == 2
+    assert stats['waiting_users'] == 0
+
+async def test_different_users_run_concurrently_up_to_limit():
+    processor = PerUserUpdateProcessor(max_concurrent_updates=2)
+    recorder = Recorder()
+    await run_updates(processor, recorder, [1, 2, 3, 4])
+
+    assert recorder.max_active == 2
+    stats = processor.get_stats()
+    assert stats['processed'] == 4
+    assert stats['max_active'] == 2
+    assert stats['serialized'] == 0
+    assert stats['active'] == 0
+
+async def test_updates_without_user_share_the_limit():
+    processor = PerUserUpdateProcessor(max_concurrent_updates=1)
+    recorder = Recorder()
+    await processor.initialize()
+    await asyncio.gather(*(processor.process_update(object(), recorder.handle(number)) for number in range(3)))
+
+    assert recorder.max_active == 1
+    assert processor.get_stats()['processed'] == 3
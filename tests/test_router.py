@@ -0,0 +1,69 @@
+import logging
+
+import pytest
+
+from router import Router
+
+def make_router():
+    calls = []
+    router = Router()
+
+    def handler(name):
+        async def handle(*args):
+            calls.append((name, args))
+        return handle
+
+    router.add('calendar_settings', handler('settings'))
+    router.add_prefix('approve_', handler('approve'), int)
+    router.add_prefix('approve_user_', handler('approve_user'), int)
+    router.add_prefix('calendar_', handler('month'), lambda value: tuple(int(part) for part in value.split('_')))
+    return router, calls
+
+def test_exact_route_wins_over_prefix():
+    router, _ = make_router()
+    route, params = router.resolve('calendar_settings')
+    assert route.name == 'calendar_settings'
+    assert params == ()
+
+def test_longest_prefix_wins():
+    router, _ = make_router()
+    route, params = router.resolve('approve_user_42')
+    assert route.name == 'approve_user_*'
+    assert params == (42,)
+    route, params = router.resolve('approve_7')
+    assert route.name == 'approve_*'
+    assert params == (7,)
+
+def test_prefix_argument_can_contain_separator():
+    router, _ = make_router()
+    route, params = router.resolve('calendar_1403_7')
+    assert route.name == 'calendar_*'
+    assert params == ((1403, 7),)
+
+def test_converter_failure_is_logged_and_unresolved(caplog):
+    router, _ = make_router()
+    with caplog.at_level(logging.WARNING, logger='router'):
+        assert router.resolve('approve_user_abc') is None
+    assert 'approve_user_*' in caplog.text
+    assert router.resolve('unknown') is None
+
+def test_prefix_must_end_with_separator():
+    with pytest.raises(ValueError):
+        Router().add_prefix('approve', lambda: None)
+
+async def test_dispatch_records_stats():
+    router, calls = make_router()
+    assert await router.dispatch('approve_user_5', 'update')
+    assert not await router.dispatch('missing', 'update')
+    assert calls == [('approve_user', ('update', 5))]
+    assert router.get_stats()['approve_user_*']['count'] == 1
+
+def test_bot_settings_buttons_do_not_hit_calendar_months(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    import bot
+
+    task_bot = bot.TaskBot.__new__(bot.TaskBot)
+    task_bot._build_routers()
+    assert task_bot.callback_router.resolve('calendar_settings') is None
+    route, params = task_bot.callback_router.resolve('calmonth_1403_12')
+    assert params == ((1403, 12),)
@@ -0,0 +1,93 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import Column, ForeignKey, Integer, String, create_engine, select
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+from migrations import run_migrations
+from search import match_query, normalize_fa, ranked_tasks, register_search_index, search_migration
+
+Base = declarative_base()
+
+class Task(Base):
+    __tablename__ = 'tasks'
+
+    id = Column(Integer, primary_key=True)
+    title = Column(String)
+    description = Column(String)
+    user_id = Column(Integer)
+
+class Comment(Base):
+    __tablename__ = 'comments'
+
+    id = Column(Integer, primary_key=True)
+    task_id = Column(Integer, ForeignKey('tasks.id'))
+    content = Column(String)
+
+register_search_index(Task, Comment)
+
+def test_normalize_fa_folds_arabic_letters_and_digits():
+    assert normalize_fa('كتاب علي') == 'کتاب علی'
+    assert normalize_fa('می‌خواهم') == 'میخواهم'
+    assert normalize_fa('گزارش ۱۴۰۳') == 'گزارش 1403'
+    assert normalize_fa('ABC') == 'abc'
+    assert normalize_fa(None) == ''
+
+def test_match_query_uses_prefix_tokens():
+    assert match_query('گزارش  ماهانه') == '"گزارش"* "ماهانه"*'
+    assert match_query('كار') == '"کار"*'
+    assert match_query(' !? ') is None
+
+@pytest.fixture
+def session(tmp_path):
+    path = tmp_path / 'tasks.db'
+    engine = create_engine(f'sqlite:///{path}')
+    Base.metadata.create_all(engine)
+    run_migrations(engine, [search_migration('search')])
+    session = sessionmaker(bind=engine)()
+    session.add_all([
+        Task(id=1, title='گزارش ماهانه', description='', user_id=1),
+        Task(id=2, title='جلسه', description='تهیه گزارش', user_id=2),
+        Task(id=3, title='خرید', description='', user_id=3),
+        Comment(id=1, task_id=3, content='گزارشها ارسال شد'),
+        Task(id=4, title='گزارش دیگران', description='', user_id=4),
+    ])
+    session.commit()
+    yield session, path
+    session.close()
+    engine.dispose()
+
+def search(session, terms, user_ids=None):
+    hits = ranked_tasks(match_query(terms))
+    statement = select(Task.id).join(hits, hits.c.task_id == Task.id).order_by(hits.c.score, Task.id)
+    if user_ids is not None:
+        statement = statement.where(Task.user_id.in_(user_ids))
+    return session.execute(statement).scalars().all()
+
+def test_ranked_tasks_prefers_title_and_includes_comments(session):
+    session, _ = session
+    results = search(session, 'گزار')
+    assert set(results) == {1, 2, 3, 4}
+    assert results.index(1) < results.index(2)
+
+def test_ranked_tasks_respects_scope(session):
+    session, _ = session
+    assert sorted(search(session, 'گزارش', user_ids=[1, 3])) == [1, 3]
+    assert search(session, 'خرید', user_ids=[1]) == []
+
+def test_index_follows_orm_updates_with_folding(session):
+    session, _ = session
+    task = session.get(Task, 3)
+    task.title = 'كتابخانه'
+    session.commit()
+    assert search(session, 'کتاب') == [3]
+
+def test_plain_sqlite_connections_can_write(session):
+    session, path = session
+    connection = sqlite3.connect(path)
+    connection.execute("INSERT INTO tasks (id, title) VALUES (10, 'cli')")
+    connection.execute("UPDATE tasks SET title = 'cli2' WHERE id = 10")
+    connection.execute("DELETE FROM tasks WHERE id = 1")
+    connection.commit()
+    connection.close()
+    assert 1 not in search(session, 'گزارش')
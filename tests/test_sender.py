@@ -0,0 +1,93 @@
+import asyncio
+from time import monotonic
+
+import pytest
+from telegram.error import BadRequest, RetryAfter
+
+import sender
+from sender import PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_URGENT, SendQueue, TokenBucket
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+def test_token_bucket_rate(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(sender, 'monotonic', clock)
+    bucket = TokenBucket(rate=10, capacity=2)
+    bucket.consume()
+    bucket.consume()
+    assert bucket.delay() == pytest.approx(0.1)
+    clock.now += 0.05
+    assert bucket.delay() == pytest.approx(0.05)
+    clock.now += 1
+    assert bucket.delay() == 0
+    assert bucket.tokens == 2
+
+def recorder(sent, name, failures=()):
+    """فراخوانی جعلی API که ابتدا خطاهای failures را می‌دهد و سپس نام را ثبت می‌کند"""
+    failures = list(failures)
+
+    async def call():
+        if failures:
+            raise failures.pop(0)
+        sent.append(name)
+        return name
+    return call
+
+async def test_priority_order_across_chats():
+    queue = SendQueue(global_rate=100, chat_rate=100)
+    sent = []
+    await queue.start(bot=None)
+    futures = [
+        await queue.submit(1, recorder(sent, 'low'), PRIORITY_LOW),
+        await queue.submit(2, recorder(sent, 'high'), PRIORITY_HIGH),
+        await queue.submit(3, recorder(sent, 'urgent'), PRIORITY_URGENT),
+    ]
+    await asyncio.gather(*futures)
+    await queue.stop()
+    assert sent == ['urgent', 'high', 'low']
+
+async def test_retry_after_pauses_queue_and_keeps_chat_order():
+    queue = SendQueue(global_rate=100, chat_rate=100)
+    sent = []
+    await queue.start(bot=None)
+    started = monotonic()
+    first = await queue.submit(1, recorder(sent, 'first', [RetryAfter(0.2)]))
+    second = await queue.submit(1, recorder(sent, 'second'))
+    other = await queue.submit(2, recorder(sent, 'other'))
+    await asyncio.gather(first, second, other)
+    await queue.stop()
+
+    assert sent.index('first') < sent.index('second')
+    assert monotonic() - started >= 0.2
+    stats = queue.get_stats()
+    assert stats['flood_waits'] == 1
+    assert stats['retried'] == 1
+    assert stats['sent'] == 3
+
+async def test_failure_releases_next_message_of_chat():
+    queue = SendQueue(global_rate=100, chat_rate=100)
+    sent = []
+    await queue.start(bot=None)
+    failed = await queue.submit(1, recorder(sent, 'bad', [BadRequest('chat not found')]))
+    following = await queue.submit(1, recorder(sent, 'next'))
+    assert await following == 'next'
+    with pytest.raises(BadRequest):
+        await failed
+    await queue.stop()
+    assert queue.get_stats()['failed'] == 1
+
+async def test_stop_drains_pending_messages():
+    queue = SendQueue(global_rate=100, chat_rate=20)
+    sent = []
+    await queue.start(bot=None)
+    for number in range(3):
+        await queue.submit(1, recorder(sent, number))
+    assert queue.depth == 3
+    await queue.stop()
+    assert sent == [0, 1, 2]
+    assert queue.depth == 0
@@ -0,0 +1,55 @@
+from datetime import datetime
+
+import pytest
+
+TIED = datetime(2026, 1, 1, 9)
+
+@pytest.fixture
+def tasks(bot):
+    """هفت وظیفه که پنج‌تای وسطی created_at یکسان دارند"""
+    with bot.session_scope() as session:
+        user = bot.User(telegram_id=1, first_name='a', last_name='b', role=bot.UserRole.DORMITORY_CARETAKER)
+        session.add(bot.Task(title='oldest', user=user, created_at=datetime(2025, 12, 31)))
+        session.add_all(bot.Task(title=f'tied {i}', user=user, created_at=TIED) for i in range(5))
+        session.add(bot.Task(title='newest', user=user, created_at=datetime(2026, 1, 2)))
+        session.commit()
+        user_id = user.id
+    return bot, user_id
+
+def page(bot, user_id, cursor=None, direction='older'):
+    with bot.session_scope() as session:
+        task_bot = bot.TaskBot.__new__(bot.TaskBot)
+        rows, has_more = task_bot._get_tasks_page(session, user_id, cursor, direction)
+    return [task.title for task in rows], rows, has_more
+
+def cursor_of(bot, task):
+    return bot.parse_task_cursor(bot.encode_task_cursor(task))
+
+def test_pages_cover_tied_timestamps_without_gaps(tasks, monkeypatch):
+    bot, user_id = tasks
+    monkeypatch.setattr(bot, 'TASKS_PAGE_SIZE', 3)
+    seen = []
+    cursor = None
+    while True:
+        titles, rows, has_more = page(bot, user_id, cursor)
+        seen.extend(titles)
+        if not has_more:
+            break
+        cursor = cursor_of(bot, rows[-1])
+    assert seen == ['newest', 'tied 4', 'tied 3', 'tied 2', 'tied 1', 'tied 0', 'oldest']
+
+def test_newer_page_returns_previous_page(tasks, monkeypatch):
+    bot, user_id = tasks
+    monkeypatch.setattr(bot, 'TASKS_PAGE_SIZE', 3)
+    first, rows, _ = page(bot, user_id)
+    second, rows, _ = page(bot, user_id, cursor_of(bot, rows[-1]))
+    assert second == ['tied 2', 'tied 1', 'tied 0']
+
+    back, _, has_more = page(bot, user_id, cursor_of(bot, rows[0]), 'newer')
+    assert back == first
+    assert not has_more
+
+@pytest.mark.parametrize('value', ['', '20260101', 'abc_1', '20260101090000000000_x', '1_2_3'])
+def test_invalid_cursor_raises_value_error(bot, value):
+    with pytest.raises(ValueError):
+        bot.parse_task_cursor(value)
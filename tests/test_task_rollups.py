@@ -0,0 +1,85 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from database import Database
+
+@pytest.fixture
+def db(tmp_path):
+    database = Database(create_engine(f"sqlite:///{tmp_path / 'tasks.db'}"))
+    database.add_user('u1', 'first', 'employee')
+    database.add_user('u2', 'second', 'employee')
+    yield database
+    database.engine.dispose()
+
+def expected_rollups(db):
+    """شمارش مستقیم وظایف با GROUP BY برای مقایسه با جدول تجمیعی"""
+    with db.engine.connect() as connection:
+        rows = connection.execute(text(
+            "SELECT assignee_id, priority, status, date(created_at), COUNT(*), COUNT(completed_at) "
+            "FROM tasks GROUP BY assignee_id, priority, status, date(created_at)"
+        ))
+        return {tuple(row) for row in rows}
+
+def actual_rollups(db):
+    return {
+        (row.user_id, row.priority, row.status, row.day.isoformat(), row.task_count, row.duration_count)
+        for row in db.get_task_rollups()
+    }
+
+def test_rollups_match_tasks_after_updates(db):
+    yesterday = datetime.now() - timedelta(days=1)
+    db.add_task('t1', 'one', '', 'u1', priority='high', estimated_duration=2)
+    db.add_task('t2', 'two', '', 'u2')
+    db.add_tasks_bulk([
+        {'id': f'b{i}', 'title': f'bulk {i}', 'assignee_id': 'u1' if i % 2 else 'u2',
+         'priority': 'low', 'estimated_duration': 1, 'created_at': yesterday}
+        for i in range(6)
+    ])
+    assert actual_rollups(db) == expected_rollups(db)
+
+    assert db.update_task_status('t1', 'in_progress')
+    assert db.update_task_status('t1', 'completed')
+    assert not db.update_task_status('missing', 'completed')
+    assert actual_rollups(db) == expected_rollups(db)
+
+    db.update_task_statuses_bulk([('b0', 'completed'), ('b1', 'in_progress'), ('b1', 'completed'),
+                                  ('t2', 'in_progress'), ('missing', 'completed')])
+    assert actual_rollups(db) == expected_rollups(db)
+
+    db.update_task_statuses_bulk([('b0', 'pending'), ('b2', 'completed')])
+    assert actual_rollups(db) == expected_rollups(db)
+
+def run_concurrently(*jobs):
+    errors = []
+
+    def run(job):
+        try:
+            job()
+        except Exception as e:  # خطای هر نخ در نخ اصلی بررسی می‌شود
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(job,)) for job in jobs]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+def test_concurrent_status_changes_keep_rollups_consistent(db):
+    db.add_tasks_bulk({'id': f't{i}', 'title': f'task {i}', 'assignee_id': 'u1'} for i in range(4))
+    statuses = ['in_progress', 'completed', 'pending']
+
+    def single(offset):
+        return lambda: [db.update_task_status(f't{i % 4}', statuses[(i + offset) % 3]) for i in range(30)]
+
+    def bulk(offset):
+        return lambda: [
+            db.update_task_statuses_bulk([(f't{j}', statuses[(i + j + offset) % 3]) for j in range(4)])
+            for i in range(15)
+        ]
+
+    run_concurrently(single(0), single(1), bulk(0), bulk(2))
+    assert actual_rollups(db) == expected_rollups(db)
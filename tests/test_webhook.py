@@ -0,0 +1,81 @@
+import asyncio
+import socket
+
+import httpx
+import pytest
+from tornado.httpserver import HTTPServer
+from tornado.web import Application as WebApplication, RequestHandler
+
+BOT_USER = {'id': 1000, 'is_bot': True, 'first_name': 'tasks', 'username': 'tasks_bot'}
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+class StubBotApi(RequestHandler):
+    """Bot API جعلی که درخواست‌ها را ثبت و پاسخ حداقلی برمی‌گرداند"""
+
+    def initialize(self, calls):
+        self.calls = calls
+
+    def post(self, token, method):
+        params = {key: values[0].decode() for key, values in self.request.body_arguments.items()}
+        self.calls.append((method, params))
+        if method == 'getMe':
+            result = BOT_USER
+        elif method == 'sendMessage':
+            result = {'message_id': len(self.calls), 'date': 0, 'chat': {'id': int(params['chat_id']), 'type': 'private'},
+                      'from': BOT_USER, 'text': params['text']}
+        else:
+            result = True
+        self.write({'ok': True, 'result': result})
+
+@pytest.fixture
+def stub_api():
+    calls = []
+    server = HTTPServer(WebApplication([(r'/bot([^/]+)/(\w+)', StubBotApi, {'calls': calls})]))
+    port = free_port()
+    server.listen(port, '127.0.0.1')
+    yield f'http://127.0.0.1:{port}/bot', calls
+    server.stop()
+
+async def test_webhook_start_reaches_stub_api(stub_api, bot, monkeypatch):
+    base_url, calls = stub_api
+    monkeypatch.setenv('ADMIN_TELEGRAM_ID', '1')
+    task_bot = bot.TaskBot()
+    application = bot.build_application(task_bot, 'TOKEN', base_url)
+    port = free_port()
+    update = {
+        'update_id': 1,
+        'message': {
+            'message_id': 1, 'date': 0, 'text': '/start',
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': 6}],
+            'chat': {'id': 42, 'type': 'private'},
+            'from': {'id': 42, 'is_bot': False, 'first_name': 'user'}
+        }
+    }
+
+    async with application:
+        await application.updater.start_webhook(
+            listen='127.0.0.1', port=port, url_path='telegram',
+            webhook_url=f'http://127.0.0.1:{port}/telegram', secret_token='secret'
+        )
+        await application.start()
+        async with httpx.AsyncClient() as client:
+            rejected = await client.post(f'http://127.0.0.1:{port}/telegram', json=update)
+            response = await client.post(f'http://127.0.0.1:{port}/telegram', json=update,
+                                         headers={'X-Telegram-Bot-Api-Secret-Token': 'secret'})
+        for _ in range(100):
+            if any(method == 'sendMessage' for method, _ in calls):
+                break
+            await asyncio.sleep(0.05)
+        await application.updater.stop()
+        await application.stop()
+
+    assert rejected.status_code == 403
+    assert response.status_code == 200
+    assert [method for method, _ in calls if method == 'setWebhook'] == ['setWebhook']
+    [reply] = [params for method, params in calls if method == 'sendMessage']
+    assert int(reply['chat_id']) == 42
+    assert task_bot.update_processor.get_stats()['processed'] == 1
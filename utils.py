@@ -6,7 +6,7 @@ from plotly.subplots import make_subplots
 import io
 import base64
 from typing import List, Dict, Any, Optional
-import jdatetime
+from jalali import format_jalali, jalali_period
 from config import *
 
 def create_task_chart(tasks_data: List[Dict[str, Any]]) -> str:
@@ -34,7 +34,7 @@ def create_task_chart(tasks_data: List[Dict[str, Any]]) -> str:
     # نمودار روند تکمیل
     df['created_at'] = pd.to_datetime(df['created_at'])
     df['completed_at'] = pd.to_datetime(df['completed_at'])
-    daily_completion = df.groupby(df['completed_at'].dt.date).size()
+    daily_completion = df.groupby(jalali_period(df['completed_at'])).size()
     fig.add_trace(
         go.Scatter(x=daily_completion.index, y=daily_completion.values),
         row=2, col=1
@@ -54,6 +54,16 @@ def create_task_chart(tasks_data: List[Dict[str, Any]]) -> str:
     img_str = base64.b64encode(img_bytes).decode()
     return f"data:image/png;base64,{img_str}"
 
+def render_progress_chart(created_at: List[datetime], progress: List[int]) -> bytes:
+    """رندر نمودار پیشرفت وظایف به تصویر PNG (در فرآیند جداگانه اجرا می‌شود)"""
+    fig = go.Figure()
+    fig.add_trace(go.Bar(
+        x=created_at,
+        y=progress,
+        name='پیشرفت وظایف'
+    ))
+    return fig.to_image(format='png')
+
 def generate_analytics_report(tasks_data: List[Dict[str, Any]]) -> Dict[str, Any]:
     """تولید گزارش تحلیلی از داده‌های وظایف"""
     df = pd.DataFrame(tasks_data)
@@ -93,7 +103,7 @@ def predict_task_duration(task_features: Dict[str, Any], model) -> float:
 
 def convert_to_jalali(date: datetime) -> str:
     """تبدیل تاریخ میلادی به شمسی"""
-    return jdatetime.date.fromgregorian(date=date).strftime('%Y/%m/%d')
+    return format_jalali(date)
 
 def format_duration(seconds: float) -> str:
     """تبدیل ثانیه به فرمت خوانا"""